@@ -37,11 +37,57 @@ class Config:
     # Face Recognition
     FACE_RECOGNITION_TOLERANCE = float(os.getenv("FACE_MATCH_THRESHOLD", 0.6))
     FACE_ENCODING_MODEL = 'hog'  # 'hog' for CPU, 'cnn' for GPU
+    
+    # Streaming face verification (Socket.IO)
+    FACE_STREAM_REQUIRED_MATCHES = int(os.getenv("FACE_STREAM_REQUIRED_MATCHES", 2))  # consecutive matching frames
+    FACE_STREAM_INSTANT_ACCEPT = float(os.getenv("FACE_STREAM_INSTANT_ACCEPT", 0.90))  # single-frame accept confidence
+    FACE_STREAM_MAX_FRAMES = int(os.getenv("FACE_STREAM_MAX_FRAMES", 20))
+    FACE_STREAM_MAX_SECONDS = float(os.getenv("FACE_STREAM_MAX_SECONDS", 15))
+    FACE_STREAM_MAX_FRAME_BYTES = 256 * 1024
+    
+    # Polling-station kiosk bundles (HMAC signing key shared with the kiosks).
+    # Must be its own secret: kiosks holding SECRET_KEY could forge sessions. Export is refused while unset.
+    EDGE_BUNDLE_SIGNING_KEY = os.getenv("EDGE_BUNDLE_SIGNING_KEY")
+
+    # Per-request MongoDB query accounting
+    MONGO_QUERY_BUDGET = int(os.getenv("MONGO_QUERY_BUDGET", 50))  # default queries per request
+    MONGO_QUERY_BUDGETS = {  # endpoint -> queries per request
+        'dashboard.get_dashboard_data': 40,
+    }
+    MONGO_N_PLUS_ONE_THRESHOLD = int(os.getenv("MONGO_N_PLUS_ONE_THRESHOLD", 10))  # same command+collection
+    MONGO_QUERY_HEADERS = False  # X-Mongo-* response headers
+
+    # "mongo", or "memory" for benchmarks/load tests without a mongod (not persisted)
+    STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "mongo")
+
+    # MongoClient connection pool (see /api/admin/metrics/pool for checkout waits)
+    MONGO_POOL_PROFILE = os.getenv("MONGO_POOL_PROFILE", "default")
+    MONGO_POOL_PROFILES = {
+        'default': {},  # driver defaults: maxPoolSize 100, minPoolSize 0
+        'small': {'maxPoolSize': 20, 'minPoolSize': 0, 'maxIdleTimeMS': 60000, 'waitQueueTimeoutMS': 5000},
+        # threading Socket.IO worker: one thread per connected client
+        'socketio': {'maxPoolSize': 200, 'minPoolSize': 20, 'maxIdleTimeMS': 300000,
+                     'waitQueueTimeoutMS': 2000, 'compressors': 'zstd,snappy,zlib'},
+        'election_day': {'maxPoolSize': 400, 'minPoolSize': 50, 'maxIdleTimeMS': 600000,
+                         'waitQueueTimeoutMS': 1000, 'compressors': 'zstd,snappy,zlib'},
+    }
+    MONGO_COMPRESSORS = os.getenv("MONGO_COMPRESSORS", "")  # overrides the profile, e.g. "zstd,zlib"
+
+    # Reporting/analytics reads (secondaryPreferred falls back to the primary without secondaries)
+    MONGO_REPORTING_READ_PREFERENCE = os.getenv("MONGO_REPORTING_READ_PREFERENCE", "secondaryPreferred")
+    MONGO_REPORTING_MAX_STALENESS = int(os.getenv("MONGO_REPORTING_MAX_STALENESS", 120))  # seconds, >= 90
+
+    # Write-behind audit log buffer
+    AUDIT_LOG_BUFFERED = os.getenv("AUDIT_LOG_BUFFERED", "true").lower() == "true"
+    AUDIT_LOG_QUEUE_SIZE = int(os.getenv("AUDIT_LOG_QUEUE_SIZE", 10000))
+    AUDIT_LOG_BATCH_SIZE = int(os.getenv("AUDIT_LOG_BATCH_SIZE", 200))
+    AUDIT_LOG_FLUSH_MS = int(os.getenv("AUDIT_LOG_FLUSH_MS", 500))
 
     DASHBOARD_CACHE_TIMEOUT = 300  # 5 minutes
     MAX_DASHBOARD_RECORDS = 1000
 class DevelopmentConfig(Config):
     DEBUG = True
+    MONGO_QUERY_HEADERS = True
     # Use SQLite for development for easier setup
     # SQLITE_PATH = os.path.join(BASE_DIR, 'smart_voting_dev.db')
     # SQLALCHEMY_DATABASE_URI = f"sqlite:///{SQLITE_PATH}"
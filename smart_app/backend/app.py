@@ -5,8 +5,12 @@ import os
 from dotenv import load_dotenv
 from config import config_map 
 from flask_socketio import SocketIO
-from smart_app.backend.extensions import mongo, jwt, mail, bcrypt, socketio
+from smart_app.backend.extensions import jwt, mail, bcrypt, socketio
 from smart_app.backend.create_mongo_collections import create_collections
+from smart_app.backend.services.query_monitor import query_monitor
+from smart_app.backend.services.pool_monitor import pool_monitor
+from smart_app.backend.storage import init_storage
+from smart_app.backend.services.audit_writer import audit_writer
 
 # Register Blueprints
 from smart_app.backend.routes.auth import auth_bp
@@ -51,7 +55,10 @@ def create_app():
         supports_credentials=True)
 
     # Initialize extensions
-    mongo.init_app(app)
+    init_storage(app, event_listeners=[query_monitor.listener, pool_monitor.listener],
+                 **pool_monitor.client_options(app.config))
+    query_monitor.init_app(app)
+    audit_writer.init_app(app)
     jwt.init_app(app)
     mail.init_app(app)
     bcrypt.init_app(app)
@@ -148,11 +155,10 @@ def create_app():
     # Create tables
     with app.app_context():
         try:
-            create_collections(app)
-            # Test MongoDB connection
-            mongo.db.command('ping')
-            collections = mongo.db.list_collection_names()
-            print(f"MongoDB connected. Available collections: {collections}")
+            # One round trip when the schema is already up to date
+            schema = create_collections(app)
+            if schema is not None:
+                print(f"MongoDB connected. Schema version: {schema['version']}")
         except Exception as e:
             print(f"MongoDB connection issue: {str(e)}")
             print("Continuing without MongoDB collections - some features may not work")
@@ -0,0 +1,298 @@
+# smart_app/backend/benchmarks/face_pipeline_benchmark.py
+"""
+Face pipeline benchmark with a per-stage latency breakdown.
+
+Runs a corpus of frames through every stage of the hybrid face pipeline and
+KNN search at several index sizes, then writes p50/p95/p99 latency,
+throughput per wall second and per CPU second (with the cores each stage kept
+busy) and per-stage RSS deltas as JSON that can be diffed between releases.
+
+Frames are generated synthetically (seeded) or loaded from a local directory;
+nothing is fetched over the network.
+
+Usage:
+    python -m smart_app.backend.benchmarks.face_pipeline_benchmark --output bench.json
+    python -m smart_app.backend.benchmarks.face_pipeline_benchmark --frames-dir ./faces
+    python -m smart_app.backend.benchmarks.face_pipeline_benchmark --compare old.json new.json
+"""
+import argparse
+import base64
+import glob
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from smart_app.backend.services.face_recognition_service import (
+    MultiMethodFaceService,
+    KNNFaceService,
+    MEDIAPIPE_AVAILABLE,
+    DLIB_AVAILABLE,
+    FACE_RECOGNITION_AVAILABLE
+)
+
+DEFAULT_KNN_SIZES = [1000, 10000, 100000, 1000000]
+ENCODING_DIM = 128
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB"""
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS and kilobytes on Linux
+    if sys.platform == 'darwin':
+        return usage / (1024 * 1024)
+    return usage / 1024
+
+
+def current_rss_mb():
+    """Current resident set size in MB (the peak where /proc is not available)"""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * resource.getpagesize() / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return peak_rss_mb()
+
+
+def cores_available():
+    """CPUs this process may run on"""
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count()
+
+
+class StageSamples:
+    """Wall time, process CPU time and RSS change of every call of one stage"""
+
+    def __init__(self):
+        self.wall = []
+        self.cpu = []
+        self.rss_delta = []
+
+
+def summarize(samples):
+    """Latency, throughput and memory summary of one stage"""
+    if not samples.wall:
+        return {'count': 0}
+    values = np.array(samples.wall) * 1000.0
+    count = len(samples.wall)
+    wall_seconds = float(sum(samples.wall))
+    cpu_seconds = float(sum(samples.cpu))
+    return {
+        'count': count,
+        'mean_ms': round(float(values.mean()), 4),
+        'p50_ms': round(float(np.percentile(values, 50)), 4),
+        'p95_ms': round(float(np.percentile(values, 95)), 4),
+        'p99_ms': round(float(np.percentile(values, 99)), 4),
+        'max_ms': round(float(values.max()), 4),
+        # Calls run one after another, so this is the throughput of one caller
+        'ops_per_sec': round(count / wall_seconds, 2) if wall_seconds > 0 else None,
+        # CPU seconds per wall second: above 1 when the stage uses several cores (KNN n_jobs=-1)
+        'cores_used': round(cpu_seconds / wall_seconds, 2) if wall_seconds > 0 else None,
+        'ops_per_core_sec': round(count / cpu_seconds, 2) if cpu_seconds > 0 else None,
+        # Net RSS change over all calls, and the largest change a single call left behind
+        'rss_delta_mb': round(float(sum(samples.rss_delta)), 2),
+        'max_call_rss_delta_mb': round(float(max(samples.rss_delta)), 2)
+    }
+
+
+def synthetic_frame(rng, width=640, height=480):
+    """Draw a face-like frame: skin ellipse with eyes and mouth on a noisy background"""
+    frame = rng.integers(40, 90, size=(height, width, 3), dtype=np.uint8)
+    cx = width // 2 + int(rng.integers(-40, 40))
+    cy = height // 2 + int(rng.integers(-30, 30))
+    face_w = int(rng.integers(90, 130))
+    face_h = int(face_w * 1.3)
+    skin = tuple(int(c) for c in rng.integers([170, 120, 90], [230, 170, 140]))
+
+    cv2.ellipse(frame, (cx, cy), (face_w, face_h), 0, 0, 360, skin, -1)
+    eye_y = cy - face_h // 4
+    for dx in (-face_w // 2.5, face_w // 2.5):
+        cv2.ellipse(frame, (int(cx + dx), eye_y), (face_w // 6, face_h // 12), 0, 0, 360, (250, 250, 250), -1)
+        cv2.circle(frame, (int(cx + dx), eye_y), face_w // 14, (40, 30, 20), -1)
+    cv2.line(frame, (cx, eye_y + 10), (cx - 8, cy + face_h // 8), (150, 100, 80), 3)
+    cv2.ellipse(frame, (cx, cy + face_h // 2), (face_w // 3, face_h // 10), 0, 0, 180, (120, 40, 40), 4)
+
+    noise = rng.normal(0, 6, size=frame.shape)
+    return np.clip(frame + noise, 0, 255).astype(np.uint8)
+
+
+def load_corpus(frames_dir=None, count=50, seed=42):
+    """Return the frames as base64 JPEG strings, the form the API receives"""
+    images = []
+    if frames_dir:
+        paths = sorted(
+            p for ext in ('*.jpg', '*.jpeg', '*.png')
+            for p in glob.glob(os.path.join(frames_dir, ext))
+        )
+        for path in paths[:count]:
+            with open(path, 'rb') as f:
+                images.append(base64.b64encode(f.read()).decode('ascii'))
+    else:
+        rng = np.random.default_rng(seed)
+        for _ in range(count):
+            frame = synthetic_frame(rng)
+            ok, buf = cv2.imencode('.jpg', cv2.cvtColor(frame, cv2.COLOR_RGB2BGR))
+            if ok:
+                images.append(base64.b64encode(buf.tobytes()).decode('ascii'))
+    return images
+
+
+def timed(samples, func, *args):
+    """Call func, recording its wall time, CPU time and RSS change in samples"""
+    rss_before = current_rss_mb()
+    cpu_start = time.process_time()
+    start = time.perf_counter()
+    result = func(*args)
+    samples.wall.append(time.perf_counter() - start)
+    samples.cpu.append(time.process_time() - cpu_start)
+    samples.rss_delta.append(current_rss_mb() - rss_before)
+    return result
+
+
+def benchmark_pipeline(service, corpus):
+    """Time every per-frame stage of the hybrid pipeline"""
+    stages = {}
+    frames_without_face = 0
+
+    def stage(name):
+        if name not in stages:
+            stages[name] = StageSamples()
+        return stages[name]
+
+    detectors = [('opencv', service._detect_with_opencv, False)]
+    if MEDIAPIPE_AVAILABLE:
+        detectors.append(('mediapipe', service._detect_with_mediapipe, True))
+    if DLIB_AVAILABLE:
+        detectors.append(('dlib', service._detect_with_dlib, True))
+    if FACE_RECOGNITION_AVAILABLE:
+        detectors.append(('face_recognition', service._detect_with_face_recognition, True))
+
+    for image_data in corpus:
+        image_array = timed(stage('base64_to_image'), service.base64_to_image, image_data)
+        image_array = timed(stage('preprocess_image'), service.preprocess_image, image_array)
+        rgb_image = cv2.cvtColor(image_array, cv2.COLOR_BGR2RGB)
+
+        faces = []
+        for name, detect, wants_rgb in detectors:
+            faces.extend(timed(stage(f'detect.{name}'), detect, rgb_image if wants_rgb else image_array))
+
+        # The merge sorts in place, so give it its own list
+        merged = timed(stage('merge_face_detections'), service._merge_face_detections, list(faces))
+        if not merged:
+            frames_without_face += 1
+            continue
+
+        bbox = tuple(int(v) for v in merged[0]['bbox'])
+        timed(stage('calculate_face_quality_score'), service.calculate_face_quality_score, image_array, bbox)
+
+        for method in service.get_available_encoders():
+            timed(stage(f'encode.{method}'), service.extract_face_encoding, image_array, bbox, method)
+
+    return {name: summarize(samples) for name, samples in stages.items()}, frames_without_face
+
+
+def benchmark_knn(sizes, queries=200, seed=7):
+    """Time KNN search against synthetic indexes of each size"""
+    results = {}
+    rng = np.random.default_rng(seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            encodings = rng.standard_normal((size, ENCODING_DIM), dtype=np.float32)
+            voter_ids = [f'BENCH{i:08d}' for i in range(size)]
+
+            knn = KNNFaceService(model_path=os.path.join(tmp, f'knn_{size}.pkl'))
+            build = StageSamples()
+            # Synthetic voters are not in the database; skip the partition lookup
+            timed(build, knn.load_encodings, encodings, voter_ids, [''] * len(voter_ids))
+            del encodings
+
+            samples = StageSamples()
+            for query in rng.standard_normal((queries, ENCODING_DIM), dtype=np.float32):
+                timed(samples, knn.find_similar_faces, query)
+
+            results[f'knn_search.{size}'] = {
+                **summarize(samples),
+                'index_size': size,
+                'build_seconds': round(build.wall[0], 3),
+                'build_rss_delta_mb': round(build.rss_delta[0], 2)
+            }
+            del knn
+    return results
+
+
+def run_benchmark(frames_dir=None, frame_count=50, knn_sizes=None, knn_queries=200, seed=42):
+    service = MultiMethodFaceService()
+    corpus = load_corpus(frames_dir, frame_count, seed)
+
+    pipeline, frames_without_face = benchmark_pipeline(service, corpus)
+    knn = benchmark_knn(knn_sizes if knn_sizes is not None else DEFAULT_KNN_SIZES, knn_queries, seed)
+
+    return {
+        'meta': {
+            'timestamp': datetime.utcnow().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'cores_available': cores_available(),
+            'numpy': np.__version__,
+            'opencv': cv2.__version__,
+            'available_methods': service.methods_available,
+            'encoders': service.get_available_encoders(),
+            'corpus': frames_dir or f'synthetic(seed={seed})',
+            'frames': len(corpus),
+            'frames_without_face': frames_without_face
+        },
+        'stages': {**pipeline, **knn},
+        'peak_rss_mb': round(peak_rss_mb(), 1)
+    }
+
+
+def compare_reports(old, new, metric='p95_ms'):
+    """Per-stage ratio new/old for one latency metric"""
+    rows = {}
+    for name, stats in new['stages'].items():
+        before = old['stages'].get(name, {}).get(metric)
+        after = stats.get(metric)
+        if before and after:
+            rows[name] = {'old': before, 'new': after, 'ratio': round(after / before, 3)}
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Face pipeline per-stage benchmark')
+    parser.add_argument('--frames-dir', help='Directory of local .jpg/.png frames (default: synthetic)')
+    parser.add_argument('--frames', type=int, default=50, help='Number of frames to run')
+    parser.add_argument('--knn-sizes', default=','.join(str(s) for s in DEFAULT_KNN_SIZES),
+                        help='Comma separated index sizes, empty to skip KNN')
+    parser.add_argument('--knn-queries', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='Write the JSON report to this file')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'),
+                        help='Compare two saved reports instead of running')
+    parser.add_argument('--metric', default='p95_ms', help='Metric used by --compare')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        with open(args.compare[0]) as f_old, open(args.compare[1]) as f_new:
+            report = compare_reports(json.load(f_old), json.load(f_new), args.metric)
+    else:
+        sizes = [int(s) for s in args.knn_sizes.split(',') if s.strip()]
+        report = run_benchmark(args.frames_dir, args.frames, sizes, args.knn_queries, args.seed)
+
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == '__main__':
+    main()
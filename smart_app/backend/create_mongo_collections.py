@@ -1,109 +1,240 @@
+from datetime import datetime, timedelta
 from flask import current_app
+from pymongo import ReturnDocument, UpdateOne
 from smart_app.backend.extensions import mongo
+from smart_app.backend.indexes import reconcile_indexes, index_manifest
+from smart_app.backend.mongo_models import ENCODING_FORMAT_INVALID, FaceEncoding, Voter, VoterProfile
+import hashlib
+import uuid
+
+# Bump when a migration is added below
+SCHEMA_VERSION = 5
+SCHEMA_META_COLLECTION = "schema_meta"
+SCHEMA_DOC_ID = "schema"
+# How long one process may hold the migration lock before another can take over
+SCHEMA_LOCK_SECONDS = 300
+
+# List of ALL collections needed
+COLLECTIONS = [
+    # Main application collections
+    "users",
+    "voters",
+    "voter_profiles",
+    "elections",
+    "candidates",
+    "votes",
+    "admins",
+    "otps",
+    "login_sessions",
+    "voter_eligibility",
+    "election_results",
+    "system_stats",
+
+    # Face recognition collections
+    "user_face_encodings",
+    "voter_face_encodings",
+
+    # Analytics collections
+    "vote_transactions",
+    "election_analytics",
+    "system_analytics",
+    "audit_logs",
+    "security_events",
+
+    # ID allocator sequences
+    "counters"
+]
+
+def index_manifest_digest():
+    """Digest of the declared indexes, so manifest edits re-run reconciliation"""
+    manifest = index_manifest()
+    text = repr(sorted(
+        (name, sorted(repr(sorted(index.document.items(), key=lambda item: item[0])) for index in indexes))
+        for name, indexes in manifest.items()
+    ))
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def migrate_create_collections(db):
+    """Create collections that do not exist yet"""
+    existing = set(db.list_collection_names())
+    wanted = list(dict.fromkeys(COLLECTIONS + list(index_manifest())))
+    created = []
+    for collection_name in wanted:
+        if collection_name not in existing:
+            db.create_collection(collection_name)
+            created.append(collection_name)
+    current_app.logger.info(f"Created collections: {created}")
+
+def migrate_indexes(db):
+    """Bring indexes in line with the model manifests"""
+    reconcile_indexes(db)
+
+def migrate_binary_encodings(db):
+    """Repack face encodings as float32 binary (resumable)"""
+    FaceEncoding.migrate_to_binary_format()
+    # Whatever could not be repacked is set aside like non-numeric data, rather
+    # than holding back the later migrations and the app start over bad rows
+    encodings = db[FaceEncoding.collection_name]
+    remaining = list(encodings.find(FaceEncoding.unpacked_query(), {"_id": 1, "encoding_data": 1}))
+    if not remaining:
+        return
+    current_app.logger.warning(
+        f"{len(remaining)} face encodings could not be repacked, marking invalid: "
+        f"{[str(enc['_id']) for enc in remaining[:20]]}"
+    )
+    encodings.bulk_write([
+        UpdateOne({"_id": enc["_id"]}, {"$set": {
+            "encoding_data": None,
+            "legacy_encoding_data": enc.get("encoding_data"),
+            "encoding_format": ENCODING_FORMAT_INVALID
+        }})
+        for enc in remaining
+    ], ordered=False)
+
+def migrate_split_voter_profiles(db, batch_size=500):
+    """Move voter profile fields from voters into voter_profiles (resumable)"""
+    voters = db[Voter.collection_name]
+    profiles = db[VoterProfile.collection_name]
+    cold_fields = sorted(Voter.COLD_FIELDS)
+    
+    pending = {"voter_id": {"$type": "string"}, "$or": [{field: {"$exists": True}} for field in cold_fields]}
+    projection = {"voter_id": 1, "created_at": 1, **{field: 1 for field in cold_fields}}
+    moved = 0
+    while True:
+        batch = list(voters.find(pending, projection, limit=batch_size))
+        if not batch:
+            break
+        voter_ids = [voter['voter_id'] for voter in batch]
+        # Fields already written to the profile since the split are newer than the voters copy
+        written = {profile['voter_id']: profile for profile in profiles.find({"voter_id": {"$in": voter_ids}})}
+        now = datetime.utcnow()
+        operations = []
+        for voter in batch:
+            current = written.get(voter['voter_id'], {})
+            fields = {k: v for k, v in voter.items() if k in Voter.COLD_FIELDS and k not in current}
+            operations.append(UpdateOne(
+                {"voter_id": voter['voter_id']},
+                {"$set": {**fields, "updated_at": now},
+                 "$setOnInsert": {"created_at": voter.get('created_at', now)}},
+                upsert=True
+            ))
+        profiles.bulk_write(operations, ordered=False)
+        voters.update_many({"_id": {"$in": [voter['_id'] for voter in batch]}},
+                           {"$unset": {field: "" for field in cold_fields}})
+        moved += len(batch)
+    current_app.logger.info(f"Moved profile fields of {moved} voters to voter_profiles")
+
+def convert_voter_national_id_index(db):
+    """Make the voters national_id_number unique index partial
+    
+    New voters keep their national ID in voter_profiles, so a plain unique
+    index on voters rejects the second of them as a duplicate null. Runs
+    ahead of the versioned migrations so registration never depends on how
+    far they got.
+    """
+    voters = db[Voter.collection_name]
+    wanted = Voter.NATIONAL_ID_INDEX.document
+    for name, info in voters.index_information().items():
+        if [key for key, _ in info['key']] == ['national_id_number'] \
+                and info.get('partialFilterExpression') != wanted['partialFilterExpression']:
+            voters.drop_index(name)
+            voters.create_indexes([Voter.NATIONAL_ID_INDEX])
+            current_app.logger.info(f"Replaced voters index {name} with a partial unique index")
+
+def migrate_face_encoding_id_to_voters(db, batch_size=500):
+    """Move face_encoding_id back from voter_profiles to voters (face login reads it)"""
+    voters = db[Voter.collection_name]
+    profiles = db[VoterProfile.collection_name]
+    pending = {"face_encoding_id": {"$exists": True}}
+    while True:
+        batch = list(profiles.find(pending, {"voter_id": 1, "face_encoding_id": 1}, limit=batch_size))
+        if not batch:
+            break
+        voters.bulk_write([
+            UpdateOne({"voter_id": profile['voter_id']}, {"$set": {"face_encoding_id": profile['face_encoding_id']}})
+            for profile in batch
+        ], ordered=False)
+        profiles.update_many({"_id": {"$in": [profile['_id'] for profile in batch]}},
+                             {"$unset": {"face_encoding_id": ""}})
+
+# Ordered migrations: (version, name, function). Each one must be safe to re-run.
+MIGRATIONS = [
+    (1, "create_collections", migrate_create_collections),
+    (2, "reconcile_indexes", migrate_indexes),
+    (3, "binary_face_encodings", migrate_binary_encodings),
+    (4, "split_voter_profiles", migrate_split_voter_profiles),
+    (5, "hot_face_encoding_id", migrate_face_encoding_id_to_voters),
+]
+
+def _acquire_lock(meta, owner):
+    """Take the migration lock unless another process holds an unexpired one"""
+    now = datetime.utcnow()
+    return meta.find_one_and_update(
+        {"_id": SCHEMA_DOC_ID, "$or": [{"locked_until": {"$lt": now}}, {"locked_until": None}]},
+        {"$set": {"locked_until": now + timedelta(seconds=SCHEMA_LOCK_SECONDS), "locked_by": owner}},
+        return_document=ReturnDocument.AFTER
+    )
 
 def create_collections(app):
-    """Create ALL MongoDB collections"""
+    """Bring the database schema up to SCHEMA_VERSION
+
+    Reads the schema_meta document once; when the recorded version and index
+    digest match the code nothing else is sent to the server. Otherwise the
+    pending migrations run in order and each one is recorded as it finishes,
+    so an interrupted bootstrap resumes where it stopped.
+    """
     with app.app_context():
         try:
-            # Test connection first
-            mongo.db.command('ping')
-            current_app.logger.info("MongoDB connection successful")
-            
-            # Get database instance
             db = mongo.db
-            
-            # List of ALL collections needed
-            collections = [
-                # Main application collections
-                "users",
-                "voters", 
-                "elections",
-                "candidates",
-                "votes",
-                "admins",
-                "otps",
-                "login_sessions",
-                "voter_eligibility",
-                "election_results",
-                "system_stats",
-                
-                # Face recognition collections
-                "user_face_encodings",
-                "voter_face_encodings", 
-                
-                # Analytics collections
-                "vote_transactions",
-                "election_analytics",
-                "system_analytics",
-                "audit_logs",
-                "security_events"
-            ]
-            
-            created_collections = []
-            existing_collections = []
-            
-            for collection_name in collections:
-                if collection_name not in db.list_collection_names():
-                    # Create collection
-                    db.create_collection(collection_name)
-                    created_collections.append(collection_name)
-                    current_app.logger.info(f"Created MongoDB collection: {collection_name}")
-                else:
-                    existing_collections.append(collection_name)
-            
-            # Create indexes for better performance
-            create_indexes(db)
-            
-            current_app.logger.info(f"MongoDB initialization complete.")
-            current_app.logger.info(f"Created collections: {created_collections}")
-            current_app.logger.info(f"Existing collections: {existing_collections}")
-            
+            meta = db[SCHEMA_META_COLLECTION]
+            digest = index_manifest_digest()
+
+            state = meta.find_one({"_id": SCHEMA_DOC_ID}) or {}
+            version = state.get("version", 0)
+            if version >= SCHEMA_VERSION and state.get("index_digest") == digest:
+                current_app.logger.info(f"MongoDB schema up to date (version {version})")
+                return {"version": version, "applied": []}
+
+            meta.update_one({"_id": SCHEMA_DOC_ID}, {"$setOnInsert": {"version": 0}}, upsert=True)
+            owner = str(uuid.uuid4())
+            state = _acquire_lock(meta, owner)
+            if not state:
+                current_app.logger.info("Schema migration running in another process, skipping")
+                return {"version": version, "applied": [], "skipped": True}
+
+            applied = []
+            try:
+                convert_voter_national_id_index(db)
+                version = state.get("version", 0)
+                for migration_version, name, migrate in MIGRATIONS:
+                    if migration_version <= version:
+                        continue
+                    current_app.logger.info(f"Applying schema migration {migration_version}: {name}")
+                    migrate(db)
+                    meta.update_one(
+                        {"_id": SCHEMA_DOC_ID},
+                        {
+                            "$set": {"version": migration_version, "updated_at": datetime.utcnow()},
+                            "$push": {"history": {"version": migration_version, "name": name,
+                                                  "applied_at": datetime.utcnow()}}
+                        }
+                    )
+                    version = migration_version
+                    applied.append(name)
+
+                # Index manifest changed without a version bump
+                if state.get("index_digest") != digest and "reconcile_indexes" not in applied:
+                    migrate_indexes(db)
+                    applied.append("reconcile_indexes")
+                meta.update_one({"_id": SCHEMA_DOC_ID}, {"$set": {"index_digest": digest}})
+            finally:
+                meta.update_one({"_id": SCHEMA_DOC_ID, "locked_by": owner},
+                                {"$set": {"locked_until": None}})
+
+            current_app.logger.info(f"MongoDB schema at version {version}, applied: {applied}")
+            return {"version": version, "applied": applied}
+
         except Exception as e:
             current_app.logger.error(f"Error creating MongoDB collections: {str(e)}")
             current_app.logger.warning("Continuing without MongoDB collections")
-
-def create_indexes(db):
-    """Create indexes for MongoDB collections"""
-    try:
-        # Users indexes
-        db.users.create_index([("username", 1)], unique=True)
-        db.users.create_index([("email", 1)], unique=True)
-        
-        # Voters indexes
-        db.voters.create_index([("voter_id", 1)], unique=True)
-        db.voters.create_index([("email", 1)], unique=True)
-        db.voters.create_index([("phone", 1)], unique=True)
-        db.voters.create_index([("national_id_number", 1)], unique=True)
-        db.voters.create_index([("district", 1), ("state", 1)])
-        
-        # Elections indexes
-        db.elections.create_index([("election_id", 1)], unique=True)
-        db.elections.create_index([("status", 1)])
-        db.elections.create_index([("voting_start", 1), ("voting_end", 1)])
-        
-        # Candidates indexes
-        db.candidates.create_index([("candidate_id", 1)], unique=True)
-        db.candidates.create_index([("election_id", 1)])
-        
-        # Votes indexes
-        db.votes.create_index([("vote_id", 1)], unique=True)
-        db.votes.create_index([("election_id", 1), ("voter_id", 1)], unique=True)
-        db.votes.create_index([("election_id", 1)])
-        
-        # Admins indexes
-        db.admins.create_index([("admin_id", 1)], unique=True)
-        db.admins.create_index([("username", 1)], unique=True)
-        db.admins.create_index([("email", 1)], unique=True)
-        
-        # OTP indexes
-        db.otps.create_index([("email", 1)])
-        db.otps.create_index([("phone", 1)])
-        db.otps.create_index([("expires_at", 1)], expireAfterSeconds=3600)  # Auto-expire after 1 hour
-        
-        # Face encoding indexes
-        db.user_face_encodings.create_index([("user_id", 1)], unique=True)
-        db.voter_face_encodings.create_index([("voter_id", 1)], unique=True)
-        
-        current_app.logger.info("MongoDB indexes created successfully")
-    except Exception as e:
-        current_app.logger.error(f"Error creating MongoDB indexes: {str(e)}")
\ No newline at end of file
+            return None
@@ -0,0 +1,150 @@
+# smart_app/backend/indexes.py
+"""
+Index manifest reconciliation and query plan checks.
+
+Every model declares its indexes in `INDEXES` (pymongo IndexModel) and the
+query shapes it issues in `QUERY_SHAPES`. `reconcile_indexes` creates the
+missing indexes and reports extras and option conflicts without dropping
+anything; `assert_no_collscans` runs explain() on every declared shape and
+fails if one scans a whole collection above a size threshold.
+"""
+import logging
+from typing import Dict, List
+
+from pymongo import IndexModel, ASCENDING
+
+from smart_app.backend import mongo_models
+from smart_app.backend.mongo_models import MongoBase
+
+logger = logging.getLogger(__name__)
+
+# Legacy collections that predate the models
+UNMODELED_INDEXES = {
+    "user_face_encodings": [IndexModel([("user_id", ASCENDING)], unique=True)],
+    "voter_face_encodings": [IndexModel([("voter_id", ASCENDING)], unique=True)],
+}
+
+# Options that make two indexes on the same keys different
+_COMPARED_OPTIONS = ('unique', 'sparse', 'expireAfterSeconds', 'partialFilterExpression')
+
+
+def all_models() -> List[type]:
+    """Model classes defined in mongo_models that own a collection"""
+    models = []
+    pending = list(MongoBase.__subclasses__())
+    while pending:
+        model = pending.pop(0)
+        pending.extend(model.__subclasses__())
+        if model.collection_name and model.__module__ == mongo_models.__name__:
+            models.append(model)
+    return models
+
+
+def index_manifest() -> Dict[str, List[IndexModel]]:
+    """collection name -> declared indexes"""
+    manifest = {name: list(indexes) for name, indexes in UNMODELED_INDEXES.items()}
+    for model in all_models():
+        manifest.setdefault(model.collection_name, []).extend(model.INDEXES)
+    return manifest
+
+
+def _key(spec) -> tuple:
+    return tuple((field, direction) for field, direction in spec.items()) if isinstance(spec, dict) \
+        else tuple((field, direction) for field, direction in spec)
+
+
+def reconcile_indexes(db, drop_extras: bool = False) -> Dict:
+    """Create declared indexes that are missing and report the ones nobody declared"""
+    report = {'created': [], 'extras': [], 'conflicts': [], 'dropped': [], 'failed': []}
+
+    for collection_name, declared in index_manifest().items():
+        collection = db[collection_name]
+        existing = {
+            _key(info['key']): (name, info)
+            for name, info in collection.index_information().items()
+        }
+
+        missing = []
+        declared_keys = set()
+        for index in declared:
+            document = index.document
+            key = _key(document['key'])
+            declared_keys.add(key)
+            if key not in existing:
+                missing.append(index)
+                continue
+            name, info = existing[key]
+            differs = [opt for opt in _COMPARED_OPTIONS if document.get(opt) != info.get(opt)]
+            if differs:
+                report['conflicts'].append({'collection': collection_name, 'index': name, 'options': differs})
+
+        if missing:
+            try:
+                report['created'].extend(
+                    f"{collection_name}.{name}" for name in collection.create_indexes(missing)
+                )
+            except Exception as e:
+                # e.g. duplicate values under a new unique index; keep reconciling the rest
+                logger.error(f"Failed to create indexes on {collection_name}: {str(e)}")
+                report['failed'].append(collection_name)
+
+        for key, (name, _) in existing.items():
+            if name == '_id_' or key in declared_keys:
+                continue
+            if drop_extras:
+                collection.drop_index(name)
+                report['dropped'].append(f"{collection_name}.{name}")
+            else:
+                report['extras'].append(f"{collection_name}.{name}")
+
+    if report['created']:
+        logger.info(f"Created indexes: {report['created']}")
+    if report['extras']:
+        logger.warning(f"Indexes not in the manifest: {report['extras']}")
+    if report['conflicts']:
+        logger.warning(f"Indexes whose options differ from the manifest: {report['conflicts']}")
+    return report
+
+
+def _plan_stages(plan) -> List[str]:
+    stages = [plan.get('stage')]
+    for child in ('inputStage', 'queryPlan'):
+        if child in plan:
+            stages.extend(_plan_stages(plan[child]))
+    for child in plan.get('inputStages', []):
+        stages.extend(_plan_stages(child))
+    return stages
+
+
+def find_collscans(db, min_documents: int = 1000) -> List[Dict]:
+    """Declared query shapes whose winning plan is a COLLSCAN on a collection of at least min_documents"""
+    failures = []
+    for model in all_models():
+        if not model.QUERY_SHAPES:
+            continue
+        collection = db[model.collection_name]
+        size = collection.estimated_document_count()
+        if size < min_documents:
+            continue
+        for query, sort in model.QUERY_SHAPES:
+            cursor = collection.find(query)
+            if sort:
+                cursor = cursor.sort(sort)
+            winning_plan = cursor.explain().get('queryPlanner', {}).get('winningPlan', {})
+            if 'COLLSCAN' in _plan_stages(winning_plan):
+                failures.append({
+                    'model': model.__name__,
+                    'collection': model.collection_name,
+                    'documents': size,
+                    'query': query,
+                    'sort': sort
+                })
+    return failures
+
+
+def assert_no_collscans(db, min_documents: int = 1000):
+    """Fail if any declared query shape scans a whole collection; for use in tests"""
+    failures = find_collscans(db, min_documents)
+    if failures:
+        lines = [f"{f['model']} {f['query']} sort={f['sort']} ({f['documents']} docs)" for f in failures]
+        raise AssertionError("Query shapes without a usable index:\n  " + "\n  ".join(lines))
@@ -1,45 +1,206 @@
 from datetime import datetime, date, timedelta
 from venv import logger
 from bson import ObjectId
-from flask import current_app
-from smart_app.backend.extensions import mongo
+from bson.binary import Binary, USER_DEFINED_SUBTYPE
+from pymongo import UpdateOne, ReturnDocument, IndexModel, ASCENDING, DESCENDING
+from pymongo.read_preferences import Primary, PrimaryPreferred, Secondary, SecondaryPreferred, Nearest
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from flask import current_app, g, has_request_context
+from smart_app.backend.storage import get_database
 import random
 import string
 import bcrypt
 import uuid
-import hashlib
 import logging
 import numpy as np
+import struct
+import copy
+import os
+import time
+import threading
+from contextlib import contextmanager
+from functools import wraps
+
+# Max operations sent per insert_many / bulk_write call
+BULK_BATCH_SIZE = 1000
+
+def _projection_covers(cached, wanted):
+    """True if a document loaded with the cached projection has every field of the wanted one"""
+    if cached is None:
+        return True
+    if wanted is None:
+        return False
+    cached_excludes = not any(v for k, v in cached.items() if k != '_id')
+    wanted_excludes = not any(v for k, v in wanted.items() if k != '_id')
+    if cached_excludes:
+        excluded = {k for k, v in cached.items() if not v}
+        if wanted_excludes:
+            return excluded <= {k for k, v in wanted.items() if not v}
+        return not excluded & {k for k, v in wanted.items() if v}
+    return not wanted_excludes and {k for k, v in wanted.items() if v} <= {k for k, v in cached.items() if v}
+
+def invalidate_identity_map(collection_name=None):
+    """Forget documents and batch loader results cached for the current request (one collection or all)"""
+    if not has_request_context():
+        return
+    identity_map = g.get('identity_map')
+    if identity_map is not None:
+        if collection_name is None:
+            identity_map.clear()
+        else:
+            identity_map.pop(collection_name, None)
+    # services/loaders.py registry, keyed (kind, collection, field, ...)
+    for key, loader in (g.get('loaders') or {}).items():
+        if collection_name is None or key[1] == collection_name:
+            loader.clear()
+
+READ_PREFERENCE_MODES = {
+    'primary': Primary,
+    'primaryPreferred': PrimaryPreferred,
+    'secondary': Secondary,
+    'secondaryPreferred': SecondaryPreferred,
+    'nearest': Nearest,
+}
+
+_read_scope = threading.local()
+
+def reporting_read_preference():
+    """Read preference for reporting queries (MONGO_REPORTING_READ_PREFERENCE / MONGO_REPORTING_MAX_STALENESS)"""
+    mode = current_app.config.get('MONGO_REPORTING_READ_PREFERENCE', 'secondaryPreferred')
+    max_staleness = current_app.config.get('MONGO_REPORTING_MAX_STALENESS', 120)
+    preference_class = READ_PREFERENCE_MODES.get(mode, SecondaryPreferred)
+    if preference_class is Primary:
+        return Primary()
+    return preference_class(max_staleness=max_staleness)
+
+@contextmanager
+def reads_from(read_preference):
+    """Route MongoBase reads on this thread to read_preference inside the block (writes still go to the primary)"""
+    previous = getattr(_read_scope, 'preference', None)
+    _read_scope.preference = read_preference
+    try:
+        yield
+    finally:
+        _read_scope.preference = previous
+
+def reporting_reads(f):
+    """Run a reporting route or helper against secondaries (primary when none is available)"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        with reads_from(reporting_read_preference()):
+            return f(*args, **kwargs)
+    return decorated_function
+
 class MongoBase:
     """Base class for MongoDB models"""
     
     collection_name = None
+    # Index manifest reconciled at startup (see smart_app/backend/indexes.py)
+    INDEXES = []
+    # Representative (filter, sort) pairs of the queries the model issues, checked with explain()
+    QUERY_SHAPES = []
+    # Default read preference for the model; None uses the client's (primary)
+    READ_PREFERENCE = None
     
     @classmethod
-    def get_collection(cls):
+    def get_collection(cls, read_preference=None):
         if not cls.collection_name:
             raise ValueError("Collection name must be defined")
-        return mongo.db[cls.collection_name]
+        collection = get_database()[cls.collection_name]
+        # Per call, then the enclosing reads_from() block, then the model default
+        read_preference = read_preference or getattr(_read_scope, 'preference', None) or cls.READ_PREFERENCE
+        if read_preference is not None:
+            collection = collection.with_options(read_preference=read_preference)
+        return collection
+    
+    @classmethod
+    def find_cached(cls, field, value, projection=None):
+        """find_one({field: value}) through the request's identity map
+        
+        A document loaded earlier in the same request (with a projection that
+        covers this one) is returned instead of querying again. Writes through
+        MongoBase drop the collection's entries. Outside a request this is a
+        plain find_one, and so are reads routed to secondaries by reads_from().
+        """
+        if not has_request_context() or getattr(_read_scope, 'preference', None) is not None:
+            return cls.find_one({field: value}, projection)
+        
+        identity_map = g.get('identity_map')
+        if identity_map is None:
+            identity_map = g.identity_map = {}
+        entries = identity_map.setdefault(cls.collection_name, {}).setdefault((field, value), [])
+        for cached_projection, doc in entries:
+            if _projection_covers(cached_projection, projection):
+                # Shallow copy so callers that tweak fields do not affect later lookups
+                return copy.copy(doc)
+        
+        doc = cls.find_one({field: value}, projection)
+        entries.append((projection, doc))
+        return copy.copy(doc)
+
+    @classmethod
+    def find_many_cached(cls, field, values, projection=None):
+        """Batch form of find_cached: {value: doc or None} with one $in query for the misses"""
+        values = list(dict.fromkeys(v for v in values if v is not None))
+        if not values:
+            return {}
+
+        query_projection = projection
+        if projection is not None and any(v for k, v in projection.items() if k != '_id'):
+            # Inclusion projections need the key field to map results back
+            query_projection = {**projection, field: 1}
+
+        identity_map = None
+        if has_request_context() and getattr(_read_scope, 'preference', None) is None:
+            identity_map = g.get('identity_map')
+            if identity_map is None:
+                identity_map = g.identity_map = {}
+            identity_map = identity_map.setdefault(cls.collection_name, {})
+
+        found = {}
+        missing = []
+        for value in values:
+            entries = identity_map.get((field, value), []) if identity_map is not None else []
+            for cached_projection, doc in entries:
+                if _projection_covers(cached_projection, projection):
+                    found[value] = copy.copy(doc)
+                    break
+            else:
+                missing.append(value)
+
+        if missing:
+            loaded = {doc.get(field): doc for doc in cls.get_collection().find({field: {"$in": missing}}, query_projection)}
+            for value in missing:
+                doc = loaded.get(value)
+                if identity_map is not None:
+                    identity_map.setdefault((field, value), []).append((query_projection, doc))
+                found[value] = copy.copy(doc)
+        return found
+
+    @classmethod
+    def invalidate_cache(cls):
+        """Drop this collection's documents from the request's identity map"""
+        invalidate_identity_map(cls.collection_name)
     
     @classmethod
-    def find_by_id(cls, doc_id):
+    def find_by_id(cls, doc_id, projection=None):
         """Find document by MongoDB ObjectId"""
         if isinstance(doc_id, str):
             try:
                 doc_id = ObjectId(doc_id)
             except:
                 return None
-        return cls.get_collection().find_one({"_id": doc_id})
+        return cls.get_collection().find_one({"_id": doc_id}, projection)
     
     @classmethod
-    def find_one(cls, query):
-        """Find one document by query"""
-        return cls.get_collection().find_one(query)
+    def find_one(cls, query, projection=None):
+        """Find one document by query, optionally returning only the projected fields"""
+        return cls.get_collection().find_one(query, projection)
     
     @classmethod
-    def find_all(cls, query=None, sort=None, limit=0, skip=0):
-        """Find all documents matching query"""
-        cursor = cls.get_collection().find(query or {})
+    def find_all(cls, query=None, sort=None, limit=0, skip=0, projection=None):
+        """Find all documents matching query, optionally returning only the projected fields"""
+        cursor = cls.get_collection().find(query or {}, projection)
         if sort:
             cursor = cursor.sort(sort)
         if skip > 0:
@@ -47,7 +208,35 @@ class MongoBase:
         if limit > 0:
             cursor = cursor.limit(limit)
         return list(cursor)
-    
+
+    @classmethod
+    def iter_all(cls, query=None, sort=None, projection=None, batch_size=500, limit=0, skip=0):
+        """Yield documents matching query one at a time, fetching batch_size per round trip"""
+        cursor = cls.get_collection().find(query or {}, projection, batch_size=batch_size)
+        if sort:
+            cursor = cursor.sort(sort)
+        if skip > 0:
+            cursor = cursor.skip(skip)
+        if limit > 0:
+            cursor = cursor.limit(limit)
+        try:
+            for doc in cursor:
+                yield doc
+        finally:
+            cursor.close()
+
+    @classmethod
+    def iter_chunks(cls, query=None, chunk_size=500, sort=None, projection=None):
+        """Yield lists of up to chunk_size documents matching query"""
+        chunk = []
+        for doc in cls.iter_all(query, sort=sort, projection=projection, batch_size=chunk_size):
+            chunk.append(doc)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
     @classmethod
     def create(cls, data):
         """Create new document"""
@@ -56,6 +245,7 @@ class MongoBase:
         if 'updated_at' not in data:
             data['updated_at'] = datetime.utcnow()
         result = cls.get_collection().insert_one(data)
+        cls.invalidate_cache()
         return str(result.inserted_id)
     
     @classmethod
@@ -64,6 +254,7 @@ class MongoBase:
         if '$set' not in data:
             data = {'$set': data}
         data['$set']['updated_at'] = datetime.utcnow()
+        cls.invalidate_cache()
         return cls.get_collection().update_many(query, data)
     
     @classmethod
@@ -72,11 +263,100 @@ class MongoBase:
         if '$set' not in data:
             data = {'$set': data}
         data['$set']['updated_at'] = datetime.utcnow()
+        cls.invalidate_cache()
         return cls.get_collection().update_one(query, data)
     
+    @staticmethod
+    def _bulk_errors(error, offset):
+        """Per-item errors of a BulkWriteError, indexed into the caller's list"""
+        return [{
+            "index": offset + err.get("index", 0),
+            "code": err.get("code"),
+            "message": err.get("errmsg")
+        } for err in error.details.get("writeErrors", [])]
+    
+    @classmethod
+    def bulk_create(cls, documents, batch_size=BULK_BATCH_SIZE):
+        """Insert many documents with unordered insert_many batches
+        
+        Returns {"inserted_ids": [...], "errors": [{"index", "code", "message"}]}.
+        """
+        documents = list(documents)
+        now = datetime.utcnow()
+        for data in documents:
+            data.setdefault('created_at', now)
+            data.setdefault('updated_at', now)
+        
+        cls.invalidate_cache()
+        result = {"inserted_ids": [], "errors": []}
+        for offset in range(0, len(documents), batch_size):
+            batch = documents[offset:offset + batch_size]
+            failed = set()
+            try:
+                cls.get_collection().insert_many(batch, ordered=False)
+            except BulkWriteError as e:
+                errors = cls._bulk_errors(e, offset)
+                failed = {err["index"] for err in errors}
+                result["errors"].extend(errors)
+            result["inserted_ids"].extend(
+                str(doc["_id"]) for i, doc in enumerate(batch, offset) if i not in failed
+            )
+        return result
+    
+    @classmethod
+    def _bulk_write(cls, operations, batch_size):
+        cls.invalidate_cache()
+        result = {"matched": 0, "modified": 0, "upserted": 0, "errors": []}
+        for offset in range(0, len(operations), batch_size):
+            batch = operations[offset:offset + batch_size]
+            try:
+                outcome = cls.get_collection().bulk_write(batch, ordered=False)
+                details = outcome.bulk_api_result
+            except BulkWriteError as e:
+                details = e.details
+                result["errors"].extend(cls._bulk_errors(e, offset))
+            result["matched"] += details.get("nMatched", 0)
+            result["modified"] += details.get("nModified", 0)
+            result["upserted"] += details.get("nUpserted", 0)
+        return result
+    
+    @classmethod
+    def bulk_upsert(cls, documents, key_fields, batch_size=BULK_BATCH_SIZE):
+        """Insert or update many documents matched on key_fields
+        
+        created_at is only set on insert. Returns matched/modified/upserted
+        counts and per-item errors.
+        """
+        if isinstance(key_fields, str):
+            key_fields = [key_fields]
+        now = datetime.utcnow()
+        operations = []
+        for data in documents:
+            fields = {k: v for k, v in data.items() if k not in ('_id', 'created_at')}
+            fields['updated_at'] = now
+            operations.append(UpdateOne(
+                {k: data[k] for k in key_fields},
+                {"$set": fields, "$setOnInsert": {"created_at": data.get('created_at', now)}},
+                upsert=True
+            ))
+        return cls._bulk_write(operations, batch_size)
+    
+    @classmethod
+    def bulk_update(cls, updates, batch_size=BULK_BATCH_SIZE):
+        """Apply many (query, data) updates; data is wrapped in $set like update_one"""
+        now = datetime.utcnow()
+        operations = []
+        for query, data in updates:
+            if not any(key.startswith('$') for key in data):
+                data = {'$set': data}
+            data = {**data, '$set': {**data.get('$set', {}), 'updated_at': now}}
+            operations.append(UpdateOne(query, data))
+        return cls._bulk_write(operations, batch_size)
+    
     @classmethod
     def delete(cls, query):
         """Delete documents matching query"""
+        cls.invalidate_cache()
         return cls.get_collection().delete_many(query)
     
     @classmethod
@@ -89,44 +369,328 @@ class MongoBase:
         """Perform aggregation pipeline"""
         return list(cls.get_collection().aggregate(pipeline))
 
+# IDs reserved per $inc on the counters collection
+ID_BLOCK_SIZE = 100
+# Unused IDs in an older block are abandoned so timestamped IDs stay close to creation time
+ID_BLOCK_MAX_AGE_SECONDS = 60
+
+class Counter(MongoBase):
+    """Named sequences that IdAllocator reserves blocks from"""
+    collection_name = "counters"
+    
+    @classmethod
+    def reserve(cls, name, size):
+        """Reserve size consecutive values; returns (first value, server time of the reservation)"""
+        counter = cls.get_collection().find_one_and_update(
+            {"_id": name},
+            {"$inc": {"next": size}, "$currentDate": {"reserved_at": True}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return counter["next"] - size, counter["reserved_at"]
+
+class IdAllocator:
+    """
+    Hands out IDs from blocks reserved with one $inc on a counter document.
+    
+    `formatter(seq, issued_at)` turns a sequence number into the public ID
+    and may return None to skip a number. issued_at is the server time of the
+    block reservation advanced by the local monotonic time since, so it is the
+    time the ID was handed out on the server's clock. Timestamped formats use
+    it with seq modulo the suffix width, so they are unique while fewer than
+    that many values are issued per second.
+    """
+    
+    def __init__(self, name, formatter, block_size=ID_BLOCK_SIZE, max_block_age=ID_BLOCK_MAX_AGE_SECONDS):
+        self.name = name
+        self.formatter = formatter
+        self.block_size = block_size
+        self.max_block_age = max_block_age
+        self._lock = threading.Lock()
+        self._next = 0
+        self._end = 0
+        self._reserved_at = None
+        self._reserved_clock = 0.0
+        self._pid = None
+    
+    def _block_usable(self):
+        # A block reserved before a fork would be handed out twice
+        return (self._next < self._end and self._pid == os.getpid()
+                and time.monotonic() - self._reserved_clock < self.max_block_age)
+    
+    def next_id(self):
+        with self._lock:
+            while True:
+                if not self._block_usable():
+                    start, self._reserved_at = Counter.reserve(self.name, self.block_size)
+                    self._next, self._end = start, start + self.block_size
+                    self._reserved_clock = time.monotonic()
+                    self._pid = os.getpid()
+                seq = self._next
+                self._next += 1
+                issued_at = self._reserved_at + timedelta(seconds=time.monotonic() - self._reserved_clock)
+                new_id = self.formatter(seq, issued_at)
+                if new_id:
+                    return new_id
+
+ID_ALPHABET = string.digits + string.ascii_uppercase
+VOTER_ID_LENGTH = 8
+# Odd and not a multiple of 3, so seq -> seq * multiplier is a permutation of the 36^8 IDs
+_VOTER_ID_MULTIPLIER = 2654435761
+_VOTER_ID_OFFSET = 1640531527
+
+def _base36(value, length):
+    chars = []
+    for _ in range(length):
+        value, digit = divmod(value, len(ID_ALPHABET))
+        chars.append(ID_ALPHABET[digit])
+    return ''.join(reversed(chars))
+
+def format_voter_id(seq, issued_at=None):
+    """8-character voter ID; sequential numbers are scattered so IDs are not guessable in order"""
+    space = len(ID_ALPHABET) ** VOTER_ID_LENGTH
+    # Two affine steps around a digit reversal; every step is a bijection on the ID space
+    mixed = _base36((seq * _VOTER_ID_MULTIPLIER + _VOTER_ID_OFFSET) % space, VOTER_ID_LENGTH)[::-1]
+    voter_id = _base36((int(mixed, 36) * _VOTER_ID_MULTIPLIER + _VOTER_ID_OFFSET) % space, VOTER_ID_LENGTH)
+    # Legacy hash-derived IDs only use hex letters after the first character,
+    # so requiring a G-Z letter there keeps new IDs clear of them
+    if not any(c.isdigit() for c in voter_id) or not any(c > 'F' for c in voter_id[1:6]):
+        return None
+    return voter_id
+
+def timestamped_id_formatter(prefix, width, alphabet=string.digits):
+    """PREFIX + issue time (YYYYmmddHHMMSS) + seq in `width` characters"""
+    def formatter(seq, issued_at):
+        suffix = seq % (len(alphabet) ** width)
+        chars = []
+        for _ in range(width):
+            suffix, digit = divmod(suffix, len(alphabet))
+            chars.append(alphabet[digit])
+        return f"{prefix}{issued_at.strftime('%Y%m%d%H%M%S')}{''.join(reversed(chars))}"
+    return formatter
+
+voter_id_allocator = IdAllocator("voter_id", format_voter_id)
+election_id_allocator = IdAllocator("election_id", timestamped_id_formatter('ELECT', 4))
+candidate_id_allocator = IdAllocator("candidate_id", timestamped_id_formatter('CAND', 4))
+vote_id_allocator = IdAllocator("vote_id", timestamped_id_formatter('VOTE', 4))
+legacy_voter_id_allocator = IdAllocator("legacy_voter_id", timestamped_id_formatter('VOTER', 6, ID_ALPHABET))
+
 class Voter(MongoBase):
     collection_name = "voters"
+    # National IDs of voters not yet moved to voter_profiles; new voters do not carry the field
+    NATIONAL_ID_INDEX = IndexModel([("national_id_number", ASCENDING)], unique=True,
+                                   partialFilterExpression={"national_id_number": {"$exists": True}})
+    INDEXES = [
+        IndexModel([("voter_id", ASCENDING)], unique=True),
+        IndexModel([("email", ASCENDING)], unique=True),
+        IndexModel([("phone", ASCENDING)], unique=True),
+        NATIONAL_ID_INDEX,
+        IndexModel([("district", ASCENDING), ("state", ASCENDING)]),
+        IndexModel([("constituency", ASCENDING), ("is_active", ASCENDING)]),
+        IndexModel([("polling_station", ASCENDING)]),
+    ]
+    QUERY_SHAPES = [
+        ({"voter_id": "AB123456"}, None),
+        ({"email": "voter@example.com"}, None),
+        ({"phone": "9999999999"}, None),
+        ({"national_id_number": "123412341234"}, None),
+        ({"constituency": "X", "is_active": True}, None),
+        ({"polling_station": "PS-000000", "is_active": True, "face_verified": True}, None),
+    ]
+    
+    # Profile fields stored in voter_profiles (VoterProfile). The voters document
+    # keeps what authentication and eligibility checks read on every request.
+    # Code reading the voters collection directly (lookup_voter_partitions,
+    # admin export_edge_bundle and reports, home stats) must stick to the other fields.
+    COLD_FIELDS = frozenset({
+        "father_name", "mother_name", "place_of_birth", "alternate_phone",
+        "address_line1", "address_line2", "pincode", "village_city", "country",
+        "national_id_type", "national_id_number", "id_document_path",
+        "security_question", "security_answer_hash",
+        "face_methods", "face_quality_score",
+        "face_registered_at", "face_verified_at",
+        "registration_step", "notes", "verified_by", "verified_at"
+    })
+    
+    # Named projections for callers that only need part of the voter document
+    AUTH_VIEW = {
+        "voter_id": 1, "full_name": 1, "email": 1, "phone": 1, "is_active": 1,
+        "registration_status": 1, "email_verified": 1, "phone_verified": 1,
+        "id_verified": 1, "face_verified": 1, "constituency": 1, "polling_station": 1,
+        "state": 1, "district": 1
+    }
+    SUMMARY_VIEW = {**AUTH_VIEW, "created_at": 1}
+    # Everything except credential hashes
+    PROFILE_VIEW = {"password_hash": 0, "security_answer_hash": 0}
+    # The whole voters document, never the profile
+    HOT_VIEW = {field: 0 for field in COLD_FIELDS}
+    
+    @classmethod
+    def is_cold(cls, path):
+        """True if a field path (e.g. "face_methods.0") lives in voter_profiles"""
+        return path.split('.', 1)[0] in cls.COLD_FIELDS
+    
+    @classmethod
+    def check_hot_query(cls, query):
+        """Raise ValueError if a filter uses a profile field (voters documents no longer carry them)"""
+        for key, value in (query or {}).items():
+            if key in ('$and', '$or', '$nor'):
+                for clause in value:
+                    cls.check_hot_query(clause)
+            elif not key.startswith('$') and cls.is_cold(key):
+                raise ValueError(f"Voter filters cannot use {key}; it is stored in voter_profiles")
+    
+    @classmethod
+    def split_projection(cls, projection):
+        """(voters projection, voter_profiles projection, whether profile fields are wanted)"""
+        if projection is None:
+            return None, None, True
+        fields = {k: v for k, v in projection.items() if k != '_id'}
+        # Profile fields stay in the voters projection too, for documents not migrated yet
+        if any(fields.values()):
+            profile = {k: 1 for k, v in fields.items() if v and cls.is_cold(k)}
+            if not profile:
+                return projection, None, False
+            # The profile is joined on voter_id
+            return {**projection, 'voter_id': 1}, profile, True
+        excluded = {k for k, v in fields.items() if not v}
+        profile = {k: 0 for k in excluded if cls.is_cold(k)} or None
+        return projection, profile, not cls.COLD_FIELDS <= excluded
+    
+    @classmethod
+    def split_update(cls, data):
+        """Split an update into (voters update, voter_profiles update or None)"""
+        if not any(key.startswith('$') for key in data):
+            data = {'$set': data}
+        hot, profile = {}, {}
+        for operator, fields in data.items():
+            for path, value in fields.items():
+                target = profile if cls.is_cold(path) else hot
+                target.setdefault(operator, {})[path] = value
+        hot.setdefault('$set', {})
+        if not profile:
+            return hot, None
+        # Drop copies left on voters documents that predate the split, so reads see the profile value
+        for fields in list(profile.values()):
+            for path in fields:
+                hot.setdefault('$unset', {})[path.split('.', 1)[0]] = ""
+        now = datetime.utcnow()
+        profile['$set'] = {**profile.get('$set', {}), 'updated_at': now}
+        profile['$setOnInsert'] = {'created_at': now}
+        return hot, profile
+    
+    @classmethod
+    def matching_voter_ids(cls, query, limit=0):
+        """voter_ids of the voters matching query"""
+        voter_id = query.get('voter_id')
+        if len(query) == 1 and isinstance(voter_id, str):
+            return [voter_id]
+        cursor = cls.get_collection().find(query, {'voter_id': 1}, limit=limit)
+        return [doc['voter_id'] for doc in cursor if doc.get('voter_id')]
+    
+    @classmethod
+    def _profile_writes(cls, voter_ids, update):
+        # Upsert so voters created before the split get their profile on first write
+        return [UpdateOne({'voter_id': voter_id}, update, upsert=True) for voter_id in voter_ids]
+    
+    @classmethod
+    def find_all(cls, query=None, sort=None, limit=0, skip=0, projection=None):
+        """Find voters; profile fields the projection asks for are joined with one $in query"""
+        cls.check_hot_query(query)
+        hot_projection, profile_projection, wants_profile = cls.split_projection(projection)
+        voters = super().find_all(query, sort=sort, limit=limit, skip=skip, projection=hot_projection)
+        return cls.attach_profiles(voters, profile_projection) if wants_profile else voters
+    
+    @classmethod
+    def iter_all(cls, query=None, sort=None, projection=None, batch_size=500, limit=0, skip=0):
+        """Yield voters; profile fields are joined per batch_size voters"""
+        cls.check_hot_query(query)
+        hot_projection, profile_projection, wants_profile = cls.split_projection(projection)
+        voters = super().iter_all(query, sort=sort, projection=hot_projection,
+                                  batch_size=batch_size, limit=limit, skip=skip)
+        if not wants_profile:
+            yield from voters
+            return
+        chunk = []
+        for voter in voters:
+            chunk.append(voter)
+            if len(chunk) >= batch_size:
+                yield from cls.attach_profiles(chunk, profile_projection)
+                chunk = []
+        if chunk:
+            yield from cls.attach_profiles(chunk, profile_projection)
+    
+    @classmethod
+    def attach_profiles(cls, voters, projection=None):
+        """Merge voter_profiles fields into voters documents (one $in query)"""
+        profiles = VoterProfile.find_many_cached('voter_id', [v.get('voter_id') for v in voters], projection)
+        records = []
+        for voter in voters:
+            record = VoterRecord(voter, projection, lazy=False)
+            record.merge_profile(profiles.get(voter.get('voter_id')))
+            records.append(record)
+        return records
+    
+    @classmethod
+    def with_profile(cls, voter, projection=None):
+        """The voter with its profile fields loaded (for profile and export endpoints)"""
+        if voter is None:
+            return None
+        if isinstance(voter, VoterRecord):
+            return voter.load_profile()
+        return cls.attach_profiles([voter], projection)[0]
     
     @classmethod
-    def generate_unique_voter_id(cls, national_id_number, date_of_birth, full_name):
-        """Generate unique 8-character alphanumeric voter ID based on user data"""
-        # Create a unique hash from user data
-        unique_string = f"{national_id_number}{date_of_birth}{full_name}{datetime.utcnow().microsecond}"
-        hash_object = hashlib.sha256(unique_string.encode())
-        hash_hex = hash_object.hexdigest()
-        
-        # Take first 8 characters and ensure alphanumeric
-        base_id = hash_hex[:8].upper()
-        
-        # Ensure it contains both letters and numbers
-        if not any(c.isalpha() for c in base_id):
-            # Replace first digit with a letter
-            letters = string.ascii_uppercase
-            base_id = random.choice(letters) + base_id[1:]
-        if not any(c.isdigit() for c in base_id):
-            # Replace first letter with a digit
-            base_id = random.choice(string.digits) + base_id[1:]
-            
-        voter_id = base_id
-        
-        # Ensure uniqueness in database
-        counter = 1
-        while cls.find_by_voter_id(voter_id):
-            # If conflict, modify slightly and try again
-            modifier = str(counter)
-            voter_id = base_id[:8-len(modifier)] + modifier
-            counter += 1
-            if counter > 100:  # Safety limit
-                # Fallback to timestamp-based ID
-                timestamp = datetime.utcnow().strftime('%H%M%S')
-                voter_id = timestamp + ''.join(random.choices(string.ascii_uppercase, k=2))
-        
-        return voter_id
+    def update(cls, query, data):
+        """Update voters matching query; profile fields are written to voter_profiles"""
+        cls.check_hot_query(query)
+        hot, profile = cls.split_update(data)
+        voter_ids = cls.matching_voter_ids(query) if profile else []
+        result = super().update(query, hot)
+        if profile:
+            VoterProfile._bulk_write(cls._profile_writes(voter_ids, profile), BULK_BATCH_SIZE)
+        return result
+    
+    @classmethod
+    def update_one(cls, query, data):
+        """Update one voter; profile fields are written to voter_profiles"""
+        cls.check_hot_query(query)
+        hot, profile = cls.split_update(data)
+        voter_ids = cls.matching_voter_ids(query, limit=1) if profile else []
+        result = super().update_one(query, hot)
+        if profile:
+            VoterProfile._bulk_write(cls._profile_writes(voter_ids, profile), BULK_BATCH_SIZE)
+        return result
+    
+    @classmethod
+    def bulk_update(cls, updates, batch_size=BULK_BATCH_SIZE):
+        """Apply many (query, data) updates, routing profile fields like update_one"""
+        hot_updates, profile_writes = [], []
+        for query, data in updates:
+            cls.check_hot_query(query)
+            hot, profile = cls.split_update(data)
+            hot_updates.append((query, hot))
+            if profile:
+                profile_writes.extend(cls._profile_writes(cls.matching_voter_ids(query, limit=1), profile))
+        result = super().bulk_update(hot_updates, batch_size)
+        if profile_writes:
+            VoterProfile._bulk_write(profile_writes, batch_size)
+        return result
+    
+    @classmethod
+    def delete(cls, query):
+        """Delete voters matching query and their profiles"""
+        cls.check_hot_query(query)
+        voter_ids = cls.matching_voter_ids(query)
+        result = super().delete(query)
+        if voter_ids:
+            VoterProfile.delete({"voter_id": {"$in": voter_ids}})
+        return result
+    
+    @classmethod
+    def generate_unique_voter_id(cls, national_id_number=None, date_of_birth=None, full_name=None):
+        """Generate unique 8-character alphanumeric voter ID (from the voter_id counter; arguments are unused)"""
+        return voter_id_allocator.next_id()
     
     @classmethod
     def create_voter(cls, data):
@@ -238,8 +802,17 @@ class Voter(MongoBase):
         
         logger.info(f"Voter data prepared for creation. Voter ID: {voter_id}")
         
+        # Profile first: its unique national_id_number index catches concurrent duplicates
+        profile_data = {field: voter_data.pop(field) for field in list(voter_data) if field in cls.COLD_FIELDS}
+        VoterProfile.create({"voter_id": voter_id, **profile_data})
+        
         # Insert into MongoDB and return the MongoDB _id
-        result = cls.get_collection().insert_one(voter_data)
+        try:
+            result = cls.get_collection().insert_one(voter_data)
+        except Exception:
+            VoterProfile.delete({"voter_id": voter_id})
+            raise
+        cls.invalidate_cache()
         mongo_id = str(result.inserted_id)
         
         logger.info(f"Voter created with MongoDB ID: {mongo_id}, Voter ID: {voter_id}")
@@ -258,22 +831,37 @@ class Voter(MongoBase):
         return f"PS-{pincode}"
     
     @classmethod
-    def find_by_voter_id(cls, voter_id):
-        """Find voter by voter_id (the 8-character ID)"""
-        voter = cls.get_collection().find_one({"voter_id": voter_id})
-        return voter
+    def find_by_voter_id(cls, voter_id, projection=None):
+        """Find voter by voter_id (the 8-character ID)
+        
+        Only the voters document is read; profile fields the projection allows
+        are loaded from voter_profiles the first time one is accessed.
+        """
+        hot_projection, profile_projection, wants_profile = cls.split_projection(projection)
+        voter = cls.find_cached("voter_id", voter_id, hot_projection)
+        if voter is None:
+            return None
+        return VoterRecord(voter, profile_projection, lazy=wants_profile)
     
     @classmethod
     def find_by_email(cls, email):
-        return cls.get_collection().find_one({"email": email.lower().strip()})
+        voter = cls.get_collection().find_one({"email": email.lower().strip()})
+        return VoterRecord(voter) if voter else None
     
     @classmethod
     def find_by_phone(cls, phone):
-        return cls.get_collection().find_one({"phone": phone.strip()})
+        voter = cls.get_collection().find_one({"phone": phone.strip()})
+        return VoterRecord(voter) if voter else None
     
     @classmethod
     def find_by_national_id(cls, national_id):
-        return cls.get_collection().find_one({"national_id_number": national_id.strip()})
+        national_id = national_id.strip()
+        profile = VoterProfile.find_one({"national_id_number": national_id}, {"voter_id": 1})
+        if profile:
+            return cls.find_by_voter_id(profile['voter_id'])
+        # Voters the split_voter_profiles migration has not reached yet
+        voter = cls.get_collection().find_one({"national_id_number": national_id})
+        return VoterRecord(voter) if voter else None
     
     @classmethod
     def verify_password(cls, voter_doc, password):
@@ -408,17 +996,116 @@ class Voter(MongoBase):
                     "full_name": 1,
                     "email": 1,
                     "phone": 1,
-                    "face_quality_score": 1,
-                    "face_methods": 1,
                     "registration_status": 1
                 }
             }
         ]
         
-        return list(cls.get_collection().aggregate(pipeline))
+        voters = list(cls.get_collection().aggregate(pipeline))
+        return cls.attach_profiles(voters, {"face_quality_score": 1, "face_methods": 1})
+    
+    @classmethod
+    def count(cls, query=None):
+        """Count voters matching query (voters fields only)"""
+        cls.check_hot_query(query)
+        return super().count(query)
+
+
+class VoterProfile(MongoBase):
+    """Cold part of a voter: family, address, identity document and face enrolment details"""
+    collection_name = "voter_profiles"
+    INDEXES = [
+        IndexModel([("voter_id", ASCENDING)], unique=True),
+        # Profiles upserted before migration may not carry a national ID yet
+        IndexModel([("national_id_number", ASCENDING)], unique=True,
+                   partialFilterExpression={"national_id_number": {"$type": "string"}}),
+    ]
+    QUERY_SHAPES = [
+        ({"voter_id": "AB123456"}, None),
+        ({"national_id_number": "123412341234"}, None),
+    ]
+    # Bookkeeping fields that are not merged into the voter
+    META_FIELDS = ('_id', 'voter_id', 'created_at', 'updated_at')
+    
+    @classmethod
+    def find_by_voter_id(cls, voter_id, projection=None):
+        return cls.find_cached("voter_id", voter_id, projection)
+
+
+class VoterRecord(dict):
+    """A voters document that reads its voter_profiles fields on first access
+    
+    Keeps code written against the single voter document working: voter['pincode']
+    or voter.get('face_methods') fetch the profile once, while routes that only
+    touch authentication fields never read it.
+    """
+    
+    def __init__(self, voter, profile_projection=None, lazy=True):
+        super().__init__(voter)
+        self._profile_projection = profile_projection
+        self._profile_loaded = not lazy
+    
+    def merge_profile(self, profile):
+        self._profile_loaded = True
+        for key, value in (profile or {}).items():
+            if key not in VoterProfile.META_FIELDS:
+                dict.__setitem__(self, key, value)
+        return self
+    
+    def load_profile(self):
+        """Fetch the profile fields now (no-op once loaded)"""
+        if not self._profile_loaded:
+            voter_id = dict.get(self, 'voter_id')
+            profile = VoterProfile.find_by_voter_id(voter_id, self._profile_projection) if voter_id else None
+            self.merge_profile(profile)
+        return self
+    
+    def _load_for(self, key):
+        if not self._profile_loaded and not dict.__contains__(self, key) and key in Voter.COLD_FIELDS:
+            self.load_profile()
+    
+    def __missing__(self, key):
+        if not self._profile_loaded and key in Voter.COLD_FIELDS:
+            self.load_profile()
+            if dict.__contains__(self, key):
+                return dict.__getitem__(self, key)
+        raise KeyError(key)
+    
+    def get(self, key, default=None):
+        self._load_for(key)
+        return dict.get(self, key, default)
+    
+    def __contains__(self, key):
+        self._load_for(key)
+        return dict.__contains__(self, key)
+    
+    # Whole-document access (jsonify, dict(), **voter) sees the profile too
+    def __iter__(self):
+        return dict.__iter__(self.load_profile())
+    
+    def keys(self):
+        return dict.keys(self.load_profile())
+    
+    def values(self):
+        return dict.values(self.load_profile())
+    
+    def items(self):
+        return dict.items(self.load_profile())
+    
+    def __copy__(self):
+        return VoterRecord(dict.items(self), self._profile_projection, lazy=not self._profile_loaded)
+    
+    def __deepcopy__(self, memo):
+        return VoterRecord(copy.deepcopy(dict(dict.items(self)), memo), self._profile_projection,
+                           lazy=not self._profile_loaded)
     
 class OTP(MongoBase):
     collection_name = "otps"
+    INDEXES = [
+        IndexModel([("email", ASCENDING)]),
+        IndexModel([("phone", ASCENDING)]),
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=3600),  # Auto-expire after 1 hour
+    ]
     
     @classmethod
     def create_otp(cls, email=None, phone=None, purpose='verification', expires_in_minutes=10):
@@ -475,26 +1162,72 @@ class OTP(MongoBase):
         
         return True
 
+# Face encodings are stored as BSON Binary: an 8 byte header followed by the
+# little-endian vector. Header: magic b'FE' | layout version u8 | dtype code u8 | dim u32
+ENCODING_MAGIC = b'FE'
+ENCODING_LAYOUT_VERSION = 1
+ENCODING_FORMAT = "f32le-v1"
+# Documents whose encoding_data holds no vectors (e.g. the method-name lists older
+# registrations stored); the original value is kept in legacy_encoding_data
+ENCODING_FORMAT_INVALID = "legacy_invalid"
+ENCODING_DTYPES = {1: '<f4'}
+_ENCODING_HEADER = struct.Struct('<2sBBI')
+
+def pack_encoding(encoding):
+    """Pack a vector as BSON Binary float32"""
+    vector = np.asarray(encoding, dtype='<f4').ravel()
+    header = _ENCODING_HEADER.pack(ENCODING_MAGIC, ENCODING_LAYOUT_VERSION, 1, vector.size)
+    return Binary(header + vector.tobytes(), USER_DEFINED_SUBTYPE)
+
+def unpack_encoding(value):
+    """Decode a stored encoding; binary values are read zero-copy, legacy arrays are converted"""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        magic, version, dtype_code, dim = _ENCODING_HEADER.unpack_from(value, 0)
+        if magic != ENCODING_MAGIC or version != ENCODING_LAYOUT_VERSION or dtype_code not in ENCODING_DTYPES:
+            raise ValueError("Unsupported face encoding format")
+        return np.frombuffer(value, dtype=ENCODING_DTYPES[dtype_code], count=dim, offset=_ENCODING_HEADER.size)
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return np.asarray(value, dtype=np.float32)
+    return value
+
+def pack_encoding_data(encoding_data):
+    """Pack a single encoding or a {method: encoding} dict, leaving non-vector fields as they are"""
+    def pack_value(value):
+        if isinstance(value, (bytes, bytearray)):
+            return value
+        if isinstance(value, (list, tuple, np.ndarray)):
+            return pack_encoding(value)
+        return value
+    
+    if isinstance(encoding_data, dict):
+        return {k: pack_value(v) for k, v in encoding_data.items()}
+    return pack_value(encoding_data)
+
 class FaceEncoding(MongoBase):
     collection_name = "face_encodings"
+    INDEXES = [
+        IndexModel([("voter_id", ASCENDING), ("is_active", ASCENDING)]),
+        IndexModel([("encoding_id", ASCENDING)], unique=True),
+    ]
+    QUERY_SHAPES = [
+        ({"voter_id": "AB123456", "is_active": True}, None),
+        ({"voter_id": {"$in": ["AB123456"]}, "is_active": True}, None),
+        ({"encoding_id": "x"}, None),
+    ]
     
     @classmethod
     def create_encoding(cls, voter_id, encoding_data, image_metadata=None, knn_indexed=False):
         """Create face encoding record with hybrid support"""
         encoding_id = str(uuid.uuid4())
         
-        # Convert encoding data to list for MongoDB storage
-        if isinstance(encoding_data, np.ndarray):
-            encoding_data = encoding_data.tolist()
-        elif isinstance(encoding_data, dict):
-            # For hybrid system - store multiple encodings
-            encoding_data = {k: (v.tolist() if isinstance(v, np.ndarray) else v) 
-                           for k, v in encoding_data.items()}
+        # Store every method's vector as packed float32 rather than an array of doubles
+        encoding_data = pack_encoding_data(encoding_data)
         
         encoding_doc = {
             "encoding_id": encoding_id,
             "voter_id": voter_id,
             "encoding_data": encoding_data,
+            "encoding_format": ENCODING_FORMAT,
             "image_metadata": image_metadata or {},
             "knn_indexed": knn_indexed,
             "encoding_methods": list(encoding_data.keys()) if isinstance(encoding_data, dict) else ['single'],
@@ -514,6 +1247,32 @@ class FaceEncoding(MongoBase):
             "is_active": True
         })
     
+    @staticmethod
+    def primary_encoding(encoding_data):
+        """Encoding used for search: ensemble, then face_recognition, then the first method"""
+        if isinstance(encoding_data, dict):
+            if 'ensemble' in encoding_data:
+                return unpack_encoding(encoding_data['ensemble'])
+            if 'face_recognition' in encoding_data:
+                return unpack_encoding(encoding_data['face_recognition'])
+            return unpack_encoding(encoding_data[next(iter(encoding_data))])
+        return unpack_encoding(encoding_data)
+    
+    @classmethod
+    def get_primary_encodings(cls, voter_ids, batch_size=1000):
+        """Primary encodings of the given voters as {voter_id: encoding}"""
+        voter_ids = list(voter_ids)
+        result = {}
+        for i in range(0, len(voter_ids), batch_size):
+            cursor = cls.get_collection().find(
+                {"voter_id": {"$in": voter_ids[i:i + batch_size]}, "is_active": True},
+                {"voter_id": 1, "encoding_data": 1}
+            )
+            for enc in cursor:
+                if enc.get('encoding_data'):
+                    result[enc['voter_id']] = cls.primary_encoding(enc['encoding_data'])
+        return result
+    
     @classmethod
     def get_all_encodings_with_voters(cls):
         """Get all face encodings with voter IDs for KNN reindexing"""
@@ -527,22 +1286,9 @@ class FaceEncoding(MongoBase):
                 voter_id = enc.get('voter_id')
                 
                 if encoding_data and voter_id:
-                    # Extract primary encoding (use ensemble or first available)
-                    if isinstance(encoding_data, dict):
-                        if 'ensemble' in encoding_data:
-                            primary_encoding = encoding_data['ensemble']
-                        elif 'face_recognition' in encoding_data:
-                            primary_encoding = encoding_data['face_recognition']
-                        else:
-                            # Use first encoding method
-                            first_key = next(iter(encoding_data))
-                            primary_encoding = encoding_data[first_key]
-                    else:
-                        primary_encoding = encoding_data
-                    
                     result.append({
                         'voter_id': voter_id,
-                        'encoding': primary_encoding,
+                        'encoding': cls.primary_encoding(encoding_data),
                         'encoding_id': enc.get('encoding_id'),
                         'methods': enc.get('encoding_methods', []),
                         'knn_indexed': enc.get('knn_indexed', False)
@@ -584,7 +1330,7 @@ class FaceEncoding(MongoBase):
                 encoding_data = {'original': encoding_data}
             
             # Add new method
-            encoding_data[method_name] = encoding.tolist() if isinstance(encoding, np.ndarray) else encoding
+            encoding_data[method_name] = encoding
             
             # Update methods list
             methods = enc_doc.get('encoding_methods', [])
@@ -594,7 +1340,8 @@ class FaceEncoding(MongoBase):
             return cls.update_one(
                 {"voter_id": voter_id, "is_active": True},
                 {"$set": {
-                    "encoding_data": encoding_data,
+                    "encoding_data": pack_encoding_data(encoding_data),
+                    "encoding_format": ENCODING_FORMAT,
                     "encoding_methods": methods,
                     "updated_at": datetime.utcnow()
                 }}
@@ -603,6 +1350,35 @@ class FaceEncoding(MongoBase):
             logger.error(f"Error adding encoding method: {str(e)}")
             return False
     
+    @classmethod
+    def bulk_add_encoding_method(cls, method_name, encodings_by_id):
+        """Set one encoding method on many records with a single bulk write
+
+        encodings_by_id maps the document _id to the new encoding.
+        """
+        if not encodings_by_id:
+            return 0
+        try:
+            now = datetime.utcnow()
+            operations = [
+                UpdateOne(
+                    {"_id": doc_id, "is_active": True},
+                    {
+                        "$set": {
+                            f"encoding_data.{method_name}": pack_encoding(encoding),
+                            "updated_at": now
+                        },
+                        "$addToSet": {"encoding_methods": method_name}
+                    }
+                )
+                for doc_id, encoding in encodings_by_id.items()
+            ]
+            result = cls.get_collection().bulk_write(operations, ordered=False)
+            return result.modified_count
+        except Exception as e:
+            logger.error(f"Error bulk adding encoding method: {str(e)}")
+            return 0
+
     @classmethod
     def get_encoding_statistics(cls):
         """Get statistics about face encodings"""
@@ -669,6 +1445,344 @@ class FaceEncoding(MongoBase):
         except Exception as e:
             logger.error(f"Migration error: {str(e)}")
             return 0
+    
+    @classmethod
+    def unpacked_query(cls):
+        """Encodings the binary migration has not handled yet"""
+        return {"encoding_format": {"$nin": [ENCODING_FORMAT, ENCODING_FORMAT_INVALID]}}
+    
+    @classmethod
+    def migrate_to_binary_format(cls, batch_size=500):
+        """Repack encodings stored as arrays of doubles into BSON Binary float32
+        
+        Converted documents are marked with encoding_format, so an interrupted
+        run can simply be started again.
+        """
+        migrated_count = 0
+        invalid_count = 0
+        try:
+            cursor = cls.get_collection().find(
+                cls.unpacked_query(),
+                {"_id": 1, "encoding_data": 1}
+            ).batch_size(batch_size)
+            
+            operations = []
+            for enc in cursor:
+                try:
+                    update = {
+                        "encoding_data": pack_encoding_data(enc.get("encoding_data")),
+                        "encoding_format": ENCODING_FORMAT
+                    }
+                except (ValueError, TypeError) as e:
+                    logger.warning(f"Face encoding {enc['_id']} has no numeric encoding data, marking invalid: {str(e)}")
+                    update = {
+                        "encoding_data": None,
+                        "legacy_encoding_data": enc.get("encoding_data"),
+                        "encoding_format": ENCODING_FORMAT_INVALID
+                    }
+                    invalid_count += 1
+                operations.append(UpdateOne({"_id": enc["_id"]}, {"$set": update}))
+                if len(operations) >= batch_size:
+                    migrated_count += cls.get_collection().bulk_write(operations, ordered=False).modified_count
+                    operations = []
+            if operations:
+                migrated_count += cls.get_collection().bulk_write(operations, ordered=False).modified_count
+            
+            logger.info(f"Migrated {migrated_count} encodings to binary format ({invalid_count} invalid)")
+            return migrated_count
+            
+        except Exception as e:
+            logger.error(f"Binary migration error after {migrated_count} encodings: {str(e)}")
+            return migrated_count
+
+# A running re-encoding job whose owner has not checkpointed for this long may be taken over
+REENCODING_LEASE_SECONDS = 600
+
+class ReencodingJob(MongoBase):
+    """Checkpoint record for background face re-encoding jobs"""
+    collection_name = "face_reencoding_jobs"
+    INDEXES = [
+        IndexModel([("job_id", ASCENDING)], unique=True),
+        IndexModel([("method", ASCENDING), ("started_at", DESCENDING)]),
+        # At most one running job per method across processes
+        IndexModel([("method", ASCENDING)], unique=True, name="method_running",
+                   partialFilterExpression={"status": "running"}),
+    ]
+
+    @classmethod
+    def start_or_resume(cls, method_name, owner, lease_seconds=REENCODING_LEASE_SECONDS):
+        """Claim the unfinished job for a method (or create one) for owner
+        
+        Interrupted jobs and running jobs whose lease has expired are claimed
+        atomically; returns None while another owner holds a live lease.
+        """
+        now = datetime.utcnow()
+        lease = {"owner": owner, "lease_until": now + timedelta(seconds=lease_seconds), "updated_at": now}
+        try:
+            job = cls.get_collection().find_one_and_update(
+                {"method": method_name, "$or": [
+                    {"status": "interrupted"},
+                    {"status": "running", "lease_until": {"$lt": now}},
+                    {"status": "running", "lease_until": None}
+                ]},
+                {"$set": {"status": "running", **lease}},
+                sort=[("started_at", -1)],
+                return_document=ReturnDocument.AFTER
+            )
+            if job:
+                return job
+            if cls.find_one({"method": method_name, "status": "running"}, {"_id": 1}):
+                return None
+
+            job_data = {
+                "job_id": str(uuid.uuid4()),
+                "method": method_name,
+                "status": "running",
+                "last_id": None,
+                "processed": 0,
+                "skipped": 0,
+                "failed": 0,
+                "started_at": now,
+                "finished_at": None,
+                **lease
+            }
+            cls.create(job_data)
+            return job_data
+        except DuplicateKeyError:
+            # Another process claimed or created the method's running job first
+            return None
+
+    @classmethod
+    def checkpoint(cls, job_id, last_id, processed=0, skipped=0, failed=0, owner=None,
+                   lease_seconds=REENCODING_LEASE_SECONDS):
+        """Advance the job cursor after a batch has been written and renew the owner's lease
+        
+        matched_count is 0 if another process has taken the job over.
+        """
+        now = datetime.utcnow()
+        return cls.get_collection().update_one(
+            {"job_id": job_id, "owner": owner},
+            {
+                "$set": {"last_id": last_id, "updated_at": now,
+                         "lease_until": now + timedelta(seconds=lease_seconds)},
+                "$inc": {"processed": processed, "skipped": skipped, "failed": failed}
+            }
+        )
+
+    @classmethod
+    def finish(cls, job_id, status="completed", owner=None, **extra):
+        """Mark a job as finished (only if owner still holds it)"""
+        return cls.update_one(
+            {"job_id": job_id, "owner": owner},
+            {"status": status, "finished_at": datetime.utcnow(), "lease_until": None, **extra}
+        )
+
+    @classmethod
+    def find_latest(cls, method_name=None):
+        """Most recent job, optionally for one method"""
+        query = {"method": method_name} if method_name else {}
+        jobs = cls.find_all(query, sort=[("started_at", -1)], limit=1)
+        return jobs[0] if jobs else None
+
+class FaceStageTiming(MongoBase):
+    """Sampled per-stage timings of hybrid face operations"""
+    collection_name = "face_stage_timings"
+
+    @classmethod
+    def create_sample(cls, operation, stages, total_ms, voter_id=None, outcome=None):
+        """Store one sampled timing record"""
+        return cls.create({
+            "operation": operation,  # register, verify, search
+            "stages": stages,  # stage name -> milliseconds
+            "total_ms": total_ms,
+            "voter_id": voter_id,
+            "outcome": outcome,
+            "timestamp": datetime.utcnow()
+        })
+
+class FaceIndexState(MongoBase):
+    """Version counter of the shared face index (one document per index)"""
+    collection_name = "face_index_state"
+
+    @classmethod
+    def get_state(cls, index_name="knn"):
+        return cls.find_one({"_id": index_name})
+
+    @classmethod
+    def ensure_state(cls, index_name="knn"):
+        """Create the state document if missing and return it"""
+        cls.get_collection().update_one(
+            {"_id": index_name},
+            {"$setOnInsert": {"version": 0, "snapshot_version": -1, "snapshot_path": None,
+                              "created_at": datetime.utcnow()}},
+            upsert=True
+        )
+        return cls.get_state(index_name)
+
+    @classmethod
+    def next_version(cls, index_name="knn"):
+        """Atomically reserve the next index version"""
+        state = cls.get_collection().find_one_and_update(
+            {"_id": index_name},
+            {"$inc": {"version": 1}, "$set": {"updated_at": datetime.utcnow()}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return state['version']
+
+    @classmethod
+    def publish_snapshot(cls, snapshot_version, snapshot_path, size, missing_versions=None, index_name="knn"):
+        """Point workers at a newer snapshot; older snapshots never replace newer ones
+        
+        missing_versions are versions at or below snapshot_version whose deltas
+        the snapshot does not include; workers apply them when they arrive.
+        """
+        result = cls.get_collection().update_one(
+            {"_id": index_name, "$or": [
+                {"snapshot_version": {"$lt": snapshot_version}},
+                {"snapshot_version": {"$exists": False}}
+            ]},
+            {"$set": {
+                "snapshot_version": snapshot_version,
+                "snapshot_path": snapshot_path,
+                "snapshot_size": size,
+                "missing_versions": list(missing_versions or []),
+                "snapshot_at": datetime.utcnow()
+            }}
+        )
+        return result.modified_count > 0
+
+class FaceIndexDelta(MongoBase):
+    """Ordered log of face index changes applied on top of the last snapshot"""
+    collection_name = "face_index_deltas"
+    INDEXES = [
+        IndexModel([("index", ASCENDING), ("version", ASCENDING)]),
+        IndexModel([("index", ASCENDING), ("voter_id", ASCENDING), ("version", ASCENDING)]),
+    ]
+    QUERY_SHAPES = [
+        ({"index": "knn", "version": {"$gt": 0}}, [("version", 1)]),
+        ({"index": "knn", "voter_id": "V", "version": {"$gt": 0}}, None),
+    ]
+
+    @classmethod
+    def append(cls, version, op, voter_id, encoding=None, partition=None, index_name="knn"):
+        return cls.get_collection().insert_one({
+            "index": index_name,
+            "version": version,
+            "op": op,  # add, remove
+            "voter_id": voter_id,
+            "encoding": encoding,
+            "partition": partition,  # "state|constituency" of the voter
+            "created_at": datetime.utcnow()
+        })
+
+    @classmethod
+    def find_since(cls, version, index_name="knn"):
+        """Deltas newer than version, oldest first"""
+        return cls.find_all(
+            {"index": index_name, "version": {"$gt": version}},
+            sort=[("version", 1)]
+        )
+
+    @classmethod
+    def find_versions(cls, versions, index_name="knn"):
+        """Deltas with the given versions, oldest first"""
+        return cls.find_all(
+            {"index": index_name, "version": {"$in": list(versions)}},
+            sort=[("version", 1)]
+        )
+
+    @classmethod
+    def written_versions(cls, versions, index_name="knn"):
+        """Which of the given versions have a delta in the log"""
+        return cls.get_collection().distinct(
+            "version", {"index": index_name, "version": {"$in": list(versions)}}
+        )
+
+    @classmethod
+    def has_newer(cls, voter_id, version, index_name="knn"):
+        """Whether a change to the voter was logged after version"""
+        return cls.find_one(
+            {"index": index_name, "voter_id": voter_id, "version": {"$gt": version}},
+            {"_id": 1}
+        ) is not None
+
+    @classmethod
+    def prune(cls, up_to_version, keep=None, index_name="knn"):
+        """Drop deltas folded into a snapshot
+
+        Versions in keep are not part of it. Everything from the oldest of
+        them on is kept, so a late delta can still be checked against newer
+        changes to the same voter.
+        """
+        if keep:
+            up_to_version = min(up_to_version, min(keep) - 1)
+        return cls.delete({"index": index_name, "version": {"$lte": up_to_version}})
+
+class EdgeBundle(MongoBase):
+    """Record of a face template bundle exported to polling-station kiosks"""
+    collection_name = "edge_bundles"
+    INDEXES = [
+        IndexModel([("bundle_id", ASCENDING)], unique=True),
+    ]
+
+    @classmethod
+    def create_bundle(cls, scope, voter_count, dim, sha256, created_by):
+        bundle_id = f"EDGE{datetime.utcnow().strftime('%Y%m%d%H%M%S')}{uuid.uuid4().hex[:6].upper()}"
+        cls.create({
+            "bundle_id": bundle_id,
+            "scope": scope,  # {"polling_station": ...} or {"constituency": ...}
+            "voter_count": voter_count,
+            "dim": dim,
+            "sha256": sha256,
+            "created_by": created_by,
+            "is_active": True
+        })
+        return bundle_id
+
+    @classmethod
+    def find_by_bundle_id(cls, bundle_id):
+        return cls.find_one({"bundle_id": bundle_id})
+
+    @classmethod
+    def set_digest(cls, bundle_id, sha256):
+        return cls.update_one({"bundle_id": bundle_id}, {"sha256": sha256})
+
+class EdgeVerification(MongoBase):
+    """Face verification outcomes synced back from kiosks"""
+    collection_name = "edge_verifications"
+    INDEXES = [
+        IndexModel([("bundle_id", ASCENDING), ("kiosk_id", ASCENDING),
+                    ("voter_id", ASCENDING), ("verified_at", ASCENDING)], unique=True),
+    ]
+
+    @classmethod
+    def record_results(cls, bundle_id, kiosk_id, results):
+        """Upsert kiosk results so a retried sync does not duplicate them"""
+        if not results:
+            return 0
+        now = datetime.utcnow()
+        operations = [
+            UpdateOne(
+                {
+                    "bundle_id": bundle_id,
+                    "kiosk_id": kiosk_id,
+                    "voter_id": item.get('voter_id'),
+                    "verified_at": item.get('verified_at')
+                },
+                {"$setOnInsert": {
+                    "verified": bool(item.get('verified')),
+                    "similarity": item.get('similarity'),
+                    "in_bundle": item.get('in_bundle', True),
+                    "synced_at": now,
+                    "created_at": now
+                }},
+                upsert=True
+            )
+            for item in results
+        ]
+        result = cls.get_collection().bulk_write(operations, ordered=False)
+        return result.upserted_count
 
 # Helper functions
 def calculate_age(date_of_birth):
@@ -685,6 +1799,10 @@ def calculate_age(date_of_birth):
 
 class User(MongoBase):
     collection_name = "users"
+    INDEXES = [
+        IndexModel([("username", ASCENDING)], unique=True),
+        IndexModel([("email", ASCENDING)], unique=True),
+    ]
     
     @classmethod
     def create_user(cls, username, email, password, first_name, last_name, **kwargs):
@@ -768,6 +1886,27 @@ class User(MongoBase):
 
 class Election(MongoBase):
     collection_name = "elections"
+    INDEXES = [
+        IndexModel([("election_id", ASCENDING)], unique=True),
+        IndexModel([("status", ASCENDING)]),
+        IndexModel([("voting_start", ASCENDING), ("voting_end", ASCENDING)]),
+        IndexModel([("election_type", ASCENDING)]),
+        IndexModel([("is_active", ASCENDING), ("status", ASCENDING)]),
+    ]
+    QUERY_SHAPES = [
+        ({"election_id": "ELECT1"}, None),
+        ({"status": "active", "is_active": True}, [("voting_end", 1)]),
+        ({"is_active": True, "status": "scheduled", "voting_start": {"$gt": datetime(2000, 1, 1)}}, None),
+    ]
+    
+    # Fields shown in election lists and needed for eligibility checks
+    LISTING_VIEW = {
+        "election_id": 1, "title": 1, "description": 1, "election_type": 1, "status": 1,
+        "constituency": 1, "registration_start": 1, "registration_end": 1,
+        "voting_start": 1, "voting_end": 1, "results_publish": 1, "voter_turnout": 1,
+        "total_votes": 1, "election_logo": 1, "election_banner": 1,
+        "require_face_verification": 1, "is_active": 1
+    }
     
     @classmethod
     def create_election(cls, data):
@@ -808,19 +1947,11 @@ class Election(MongoBase):
     @classmethod
     def generate_election_id(cls):
         """Generate unique election ID"""
-        timestamp = datetime.utcnow().strftime('%Y%m%d%H%M%S')
-        random_str = ''.join(random.choices(string.digits, k=4))
-        election_id = f'ELECT{timestamp}{random_str}'
-        
-        while cls.find_by_election_id(election_id):
-            random_str = ''.join(random.choices(string.digits, k=4))
-            election_id = f'ELECT{timestamp}{random_str}'
-        
-        return election_id
+        return election_id_allocator.next_id()
     
     @classmethod
-    def find_by_election_id(cls, election_id):
-        return cls.get_collection().find_one({"election_id": election_id})
+    def find_by_election_id(cls, election_id, projection=None):
+        return cls.find_cached("election_id", election_id, projection)
     
     @classmethod
     def get_active_elections(cls):
@@ -828,7 +1959,7 @@ class Election(MongoBase):
         return cls.find_all({
             "status": "active",
             "is_active": True
-        })
+        }, projection=cls.LISTING_VIEW)
     
     @classmethod
     def get_upcoming_elections(cls):
@@ -837,7 +1968,7 @@ class Election(MongoBase):
             "status": "scheduled",
             "voting_start": {"$gt": datetime.utcnow()},
             "is_active": True
-        })
+        }, projection=cls.LISTING_VIEW)
     
     @classmethod
     def update_election_status(cls, election_id, status):
@@ -853,10 +1984,29 @@ class Election(MongoBase):
 
 class Candidate(MongoBase):
     collection_name = "candidates"
+    INDEXES = [
+        IndexModel([("candidate_id", ASCENDING)], unique=True),
+        IndexModel([("election_id", ASCENDING), ("is_active", ASCENDING)]),
+    ]
+    QUERY_SHAPES = [
+        ({"candidate_id": "CAND1"}, None),
+        ({"election_id": "ELECT1", "is_active": True}, None),
+        ({"election_id": "ELECT1", "is_active": True, "is_approved": True}, None),
+    ]
     
     @classmethod
     def create_candidate(cls, data):
         """Create a new candidate"""
+        return cls.create(cls.build_candidate(data))
+    
+    @classmethod
+    def create_candidates(cls, candidates):
+        """Create many candidates in one bulk insert"""
+        return cls.bulk_create([cls.build_candidate(data) for data in candidates])
+    
+    @classmethod
+    def build_candidate(cls, data):
+        """Candidate document with defaults applied"""
         candidate_id = cls.generate_candidate_id()
         
         candidate_data = {
@@ -882,14 +2032,12 @@ class Candidate(MongoBase):
             "campaign_info": data.get('campaign_info', {})
         }
         
-        return cls.create(candidate_data)
+        return candidate_data
     
     @classmethod
     def generate_candidate_id(cls):
         """Generate unique candidate ID"""
-        timestamp = datetime.utcnow().strftime('%Y%m%d%H%M%S')
-        random_str = ''.join(random.choices(string.digits, k=4))
-        return f'CAND{timestamp}{random_str}'
+        return candidate_id_allocator.next_id()
     
     @classmethod
     def find_by_election(cls, election_id):
@@ -902,6 +2050,7 @@ class Candidate(MongoBase):
     @classmethod
     def increment_vote_count(cls, candidate_id):
         """Increment candidate's vote count"""
+        cls.invalidate_cache()
         return cls.get_collection().update_one(
             {"candidate_id": candidate_id},
             {"$inc": {"vote_count": 1}}
@@ -911,9 +2060,21 @@ class Candidate(MongoBase):
     @classmethod
     def find_by_candidate_id(cls, candidate_id):
         """Find candidate by candidate_id"""
-        return cls.find_one({"candidate_id": candidate_id})
+        return cls.find_cached("candidate_id", candidate_id)
 class Vote(MongoBase):
     collection_name = "votes"
+    INDEXES = [
+        IndexModel([("vote_id", ASCENDING)], unique=True),
+        IndexModel([("election_id", ASCENDING), ("voter_id", ASCENDING)], unique=True),
+        IndexModel([("voter_id", ASCENDING), ("vote_timestamp", DESCENDING)]),
+        IndexModel([("is_verified", ASCENDING), ("vote_timestamp", DESCENDING)]),
+    ]
+    QUERY_SHAPES = [
+        ({"election_id": "ELECT1", "voter_id": "AB123456"}, None),
+        ({"election_id": "ELECT1"}, None),
+        ({"voter_id": "AB123456", "is_verified": True}, [("vote_timestamp", -1)]),
+        ({"is_verified": True}, [("vote_timestamp", -1)]),
+    ]
     
     @classmethod
     def create_vote(cls, data):
@@ -942,9 +2103,7 @@ class Vote(MongoBase):
     @classmethod
     def generate_vote_id(cls):
         """Generate unique vote ID"""
-        timestamp = datetime.utcnow().strftime('%Y%m%d%H%M%S')
-        random_str = ''.join(random.choices(string.digits, k=4))
-        return f'VOTE{timestamp}{random_str}'
+        return vote_id_allocator.next_id()
     
     @classmethod
     def find_by_election_and_voter(cls, election_id, voter_id):
@@ -955,6 +2114,19 @@ class Vote(MongoBase):
             "is_verified": True
         })
     
+    @classmethod
+    def find_by_voter_for_elections(cls, voter_id, election_ids):
+        """{election_id: vote} of the voter's verified votes in the given elections (one query)"""
+        election_ids = [e for e in election_ids if e is not None]
+        if not election_ids:
+            return {}
+        votes = cls.find_all({
+            "election_id": {"$in": election_ids},
+            "voter_id": voter_id,
+            "is_verified": True
+        })
+        return {vote['election_id']: vote for vote in votes}
+    
     @classmethod
     def has_voted(cls, election_id, voter_id):
         """Check if voter has already voted in this election"""
@@ -978,6 +2150,11 @@ class Vote(MongoBase):
 
 class Admin(MongoBase):
     collection_name = "admins"
+    INDEXES = [
+        IndexModel([("admin_id", ASCENDING)], unique=True),
+        IndexModel([("username", ASCENDING)], unique=True),
+        IndexModel([("email", ASCENDING)], unique=True),
+    ]
     
     @classmethod
     def create_admin(cls, data):
@@ -1084,7 +2261,7 @@ class Admin(MongoBase):
     @classmethod
     def get_all_admins(cls):
         """Get all admins"""
-        return cls.find_all({}, {'password_hash': 0})
+        return cls.find_all({}, projection={'password_hash': 0})
     
     @classmethod
     def update_last_login(cls, admin_id):
@@ -1097,6 +2274,10 @@ class Admin(MongoBase):
 class IDDocument(MongoBase):
     """Model for ID document storage and verification"""
     collection_name = "id_documents"
+    INDEXES = [
+        IndexModel([("voter_id", ASCENDING)]),
+        IndexModel([("document_id", ASCENDING)]),
+    ]
     
     @classmethod
     def create_document(cls, voter_id, document_data, document_type='aadhar'):
@@ -1145,10 +2326,33 @@ class IDDocument(MongoBase):
 
 class AuditLog(MongoBase):
     collection_name = "audit_logs"
-    
-    @classmethod
-    def create_log(cls, action, user_id, user_type, details, ip_address=None, user_agent=None):
-        """Create audit log entry"""
+    INDEXES = [
+        IndexModel([("user_id", ASCENDING), ("action", ASCENDING), ("timestamp", DESCENDING)]),
+        IndexModel([("timestamp", DESCENDING)]),
+        IndexModel([("action", ASCENDING), ("timestamp", DESCENDING)]),
+    ]
+    QUERY_SHAPES = [
+        ({"user_id": "AB123456", "action": "login"}, [("timestamp", -1)]),
+        ({}, [("timestamp", -1)]),
+        ({"action": "login"}, [("timestamp", -1)]),
+    ]
+    
+    # Write-behind buffer set by AuditLogWriter.init_app; None means write synchronously
+    writer = None
+    # Security-critical actions are always written before the request returns
+    DURABLE_ACTIONS = {
+        "vote_cast", "admin_login", "admin_logout", "two_factor_enabled", "two_factor_disabled",
+        "logout_all_sessions", "device_revoked", "security_settings_updated", "delete_election",
+        "suspend_voter", "duplicate_face_attempt", "replayed_face_frame"
+    }
+    
+    @classmethod
+    def create_log(cls, action, user_id, user_type, details, ip_address=None, user_agent=None, durable=False):
+        """Create audit log entry
+        
+        Buffered unless durable=True or the action is in DURABLE_ACTIONS. Returns
+        the log_id (buffered) or the inserted document id.
+        """
         log_data = {
             "log_id": str(uuid.uuid4()),
             "action": action,  # login, vote, registration, update, delete
@@ -1160,11 +2364,18 @@ class AuditLog(MongoBase):
             "timestamp": datetime.utcnow()
         }
         
+        if cls.writer is not None and not durable and action not in cls.DURABLE_ACTIONS:
+            cls.writer.submit(log_data)
+            return log_data["log_id"]
+        
         return cls.create(log_data)
 
 # Additional specialized collections
 class SystemStats(MongoBase):
     collection_name = "system_stats"
+    INDEXES = [
+        IndexModel([("stats_type", ASCENDING)]),
+    ]
     
     @classmethod
     def update_stats(cls, stats_type, data):
@@ -1194,6 +2405,9 @@ class LoginSession(MongoBase):
 
 class VoterEligibility(MongoBase):
     collection_name = "voter_eligibility"
+    INDEXES = [
+        IndexModel([("voter_id", ASCENDING), ("election_id", ASCENDING)]),
+    ]
     
     @classmethod
     def check_eligibility(cls, voter_id, election_id):
@@ -1206,6 +2420,9 @@ class VoterEligibility(MongoBase):
 
 class ElectionResult(MongoBase):
     collection_name = "election_results"
+    INDEXES = [
+        IndexModel([("election_id", ASCENDING)]),
+    ]
     
     @classmethod
     def find_by_election(cls, election_id):
@@ -1241,16 +2458,7 @@ class ElectionResult(MongoBase):
 # Helper functions
 def generate_voter_id():
     """Generate unique voter ID"""
-    timestamp = datetime.utcnow().strftime('%Y%m%d%H%M%S')
-    random_str = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
-    voter_id = f'VOTER{timestamp}{random_str}'
-    
-    # Ensure uniqueness
-    while Voter.find_by_voter_id(voter_id):
-        random_str = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
-        voter_id = f'VOTER{timestamp}{random_str}'
-    
-    return voter_id
+    return legacy_voter_id_allocator.next_id()
 
 def calculate_age(date_of_birth):
     """Calculate age from date of birth"""
@@ -1277,42 +2485,10 @@ def hash_data(data):
     return bcrypt.hashpw(data_bytes, bcrypt.gensalt()).decode('utf-8')
 
 
-def create_dashboard_indexes():
-    """Create indexes for dashboard performance"""
-    collections = mongo.db
-    
-    # Voter indexes
-    collections.voters.create_index([("voter_id", 1)], unique=True)
-    collections.voters.create_index([("email", 1)], unique=True)
-    collections.voters.create_index([("constituency", 1)])
-    
-    # Election indexes
-    collections.elections.create_index([("election_id", 1)], unique=True)
-    collections.elections.create_index([("voting_start", 1)])
-    collections.elections.create_index([("election_type", 1)])
-    collections.elections.create_index([("status", 1)])
-    
-    # Vote indexes
-    collections.votes.create_index([("voter_id", 1), ("election_id", 1)], unique=True)
-    collections.votes.create_index([("vote_timestamp", -1)])
-    
-    # Candidate indexes
-    collections.candidates.create_index([("election_id", 1)])
-    
-    # Audit log indexes
-    collections.audit_logs.create_index([("user_id", 1)])
-    collections.audit_logs.create_index([("timestamp", -1)])
-
-    # OTP indexes
-    collections.otps.create_index([("email", 1)])
-    collections.otps.create_index([("phone", 1)])
-    collections.otps.create_index([("expires_at", 1)], expireAfterSeconds=3600)  # Auto expire after 1 hour
-
 # Utility functions for hybrid face system
 def normalize_encoding(encoding):
     """Normalize face encoding vector"""
-    if isinstance(encoding, list):
-        encoding = np.array(encoding, dtype=np.float32)
+    encoding = unpack_encoding(encoding)
     
     norm = np.linalg.norm(encoding)
     if norm > 0:
@@ -1328,8 +2504,7 @@ def create_ensemble_encoding(encodings_dict):
     all_encodings = []
     
     for method, encoding in encodings_dict.items():
-        if isinstance(encoding, list):
-            encoding = np.array(encoding, dtype=np.float32)
+        encoding = unpack_encoding(encoding)
         
         # Normalize each encoding
         normalized = normalize_encoding(encoding)
@@ -1353,14 +2528,14 @@ def validate_encoding_data(encoding_data):
             return False, "Empty encoding dictionary"
         
         for method, encoding in encoding_data.items():
-            if not isinstance(encoding, (list, np.ndarray)):
+            if not isinstance(encoding, (list, np.ndarray, bytes)):
                 return False, f"Invalid encoding type for method {method}"
             
-            if isinstance(encoding, list) and len(encoding) == 0:
-                return False, f"Empty encoding list for method {method}"
+            if len(unpack_encoding(encoding)) == 0:
+                return False, f"Empty encoding for method {method}"
     
-    elif isinstance(encoding_data, (list, np.ndarray)):
-        if len(encoding_data) == 0:
+    elif isinstance(encoding_data, (list, np.ndarray, bytes)):
+        if len(unpack_encoding(encoding_data)) == 0:
             return False, "Empty encoding list/array"
     
     else:
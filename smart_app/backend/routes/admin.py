@@ -1,11 +1,24 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, send_file, current_app, Response, stream_with_context
 from datetime import datetime, timedelta
+import io
+import json
+import hashlib
 import logging
 from functools import wraps
 import jwt
 from werkzeug.exceptions import RequestEntityTooLarge
 from smart_app.backend.extensions import socketio
-from smart_app.backend.mongo_models import Admin, Election, Voter, Vote, Candidate, AuditLog
+from smart_app.backend.mongo_models import (
+    Admin, Election, Voter, Vote, Candidate, AuditLog, FaceEncoding, EdgeBundle, EdgeVerification,
+    reporting_reads
+)
+from smart_app.backend.services.face_metrics import face_metrics, FACE_TIMING_SAMPLE_RATE
+from smart_app.backend.services.query_monitor import query_monitor
+from smart_app.backend.services.pool_monitor import pool_monitor
+from smart_app.backend.services.audit_writer import audit_writer
+from smart_app.backend.services.loaders import get_loader, get_count_loader
+from smart_app.backend.services.face_recognition_service import knn_face_service
+from smart_app.backend.services.edge_matcher import pack_bundle, verify_payload
 from bson import ObjectId
 from flask_socketio import join_room, leave_room, emit
 
@@ -268,17 +281,16 @@ def get_elections():
         end_idx = start_idx + per_page
         paginated_elections = all_elections[start_idx:end_idx]
         
+        # Vote and candidate counts for the whole page in one aggregation each
+        page_ids = [election.get('election_id') for election in paginated_elections]
+        vote_counts = get_count_loader(Vote, 'election_id', {"is_verified": True}).load_many(page_ids)
+        candidate_counts = get_count_loader(Candidate, 'election_id', {"is_active": True}).load_many(page_ids)
+        
         # Format elections data
         elections_data = []
         for election in paginated_elections:
-            # Get vote count for this election
-            vote_count = Vote.count({"election_id": election.get('election_id'), "is_verified": True})
-            
-            # Get candidate count
-            candidate_count = Candidate.count({
-                "election_id": election.get('election_id'),
-                "is_active": True
-            })
+            vote_count = vote_counts.get(election.get('election_id'), 0)
+            candidate_count = candidate_counts.get(election.get('election_id'), 0)
             
             # Calculate time remaining
             time_remaining = None
@@ -1285,12 +1297,18 @@ def get_voters():
             query=query,
             sort=[("created_at", -1)],
             skip=skip,
-            limit=per_page
+            limit=per_page,
+            projection=Voter.HOT_VIEW
         )
         
         # Get unique constituencies for filter
         constituencies = Voter.get_collection().distinct("constituency", {"is_active": True})
         
+        # Vote counts of the whole page in one aggregation
+        votes_cast_counts = get_count_loader(Vote, 'voter_id', {"is_verified": True}).load_many(
+            voter.get('voter_id') for voter in voters
+        )
+        
         voters_data = []
         for voter in voters:
             # Fix: Handle date_of_birth properly
@@ -1319,12 +1337,6 @@ def get_voters():
                     logger.warning(f"Could not parse date_of_birth for voter {voter.get('voter_id')}: {date_error}")
                     age = 0
             
-            # Get vote count for this voter
-            votes_cast = Vote.count({
-                "voter_id": voter.get('voter_id'),
-                "is_verified": True
-            })
-            
             # Format dates for display
             created_at = voter.get('created_at')
             if isinstance(created_at, datetime):
@@ -1362,7 +1374,7 @@ def get_voters():
                     voter.get('phone_verified', False),
                     voter.get('id_verified', False)
                 ]),
-                'votes_cast': votes_cast,
+                'votes_cast': votes_cast_counts.get(voter.get('voter_id'), 0),
                 'is_active': voter.get('is_active', True),
                 'created_at': created_at_str,
                 'last_login': last_login_str
@@ -1436,6 +1448,7 @@ def delete_voter(voter_id):
 # Enhanced Reports & Analytics
 @admin_bp.route('/reports/dashboard', methods=['GET'])
 @admin_required
+@reporting_reads
 def get_dashboard_reports():
     """Get comprehensive dashboard analytics"""
     try:
@@ -1511,7 +1524,7 @@ def get_dashboard_reports():
         
         # Get age counts using simplified approach
         try:
-            voters = Voter.find_all({"is_active": True}, limit=100)  # Limit for performance
+            voters = Voter.find_all({"is_active": True}, limit=100, projection={"age": 1, "date_of_birth": 1})  # Limit for performance
             for voter in voters:
                 # Try to get age if already calculated
                 age = voter.get('age')
@@ -1553,19 +1566,19 @@ def get_dashboard_reports():
         # Election performance - SIMPLIFIED
         election_performance = []
         try:
-            elections = Election.find_all({"is_active": True}, limit=10)
+            elections = Election.find_all({"is_active": True}, limit=10, projection=Election.LISTING_VIEW)
+            vote_counts = get_count_loader(Vote, 'election_id', {"is_verified": True}).load_many(
+                election.get('election_id') for election in elections
+            )
+            constituency_counts = get_count_loader(Voter, 'constituency', {"is_active": True}).load_many(
+                election.get('constituency', 'General') for election in elections
+            )
             for election in elections:
-                total_votes = Vote.count({
-                    "election_id": election.get('election_id'),
-                    "is_verified": True
-                })
+                total_votes = vote_counts.get(election.get('election_id'), 0)
                 
                 # Get voter count for constituency
                 constituency = election.get('constituency', 'General')
-                constituency_voters = Voter.count({
-                    "constituency": constituency,
-                    "is_active": True
-                })
+                constituency_voters = constituency_counts.get(constituency, 0)
                 
                 turnout = round((total_votes / constituency_voters * 100), 2) if constituency_voters > 0 else 0
                 
@@ -1603,8 +1616,10 @@ def get_dashboard_reports():
             ]
             
             election_votes = list(Vote.get_collection().aggregate(pipeline))
+            elections = get_loader(Election, 'election_id', Election.LISTING_VIEW)
+            elections.add_many(ev["_id"] for ev in election_votes)
             for ev in election_votes:
-                election = Election.find_by_election_id(ev["_id"])
+                election = elections.get(ev["_id"])
                 if election:
                     top_elections.append({
                         "title": election.get('title', 'Unknown Election')[:50],
@@ -1654,6 +1669,7 @@ def get_dashboard_reports():
 
 @admin_bp.route('/reports/election/<election_id>', methods=['GET'])
 @admin_required
+@reporting_reads
 def get_election_report(election_id):
     """Get detailed election report"""
     try:
@@ -1664,12 +1680,12 @@ def get_election_report(election_id):
         # Get candidates with vote counts
         candidates = Candidate.find_all({"election_id": election_id, "is_active": True})
         candidates_data = []
+        vote_counts = get_count_loader(Vote, 'candidate_id', {"is_verified": True}).load_many(
+            candidate.get('candidate_id') for candidate in candidates
+        )
         
         for candidate in candidates:
-            vote_count = Vote.count({
-                "candidate_id": candidate.get('candidate_id'),
-                "is_verified": True
-            })
+            vote_count = vote_counts.get(candidate.get('candidate_id'), 0)
             
             candidates_data.append({
                 'candidate_id': candidate.get('candidate_id'),
@@ -1767,6 +1783,7 @@ def get_election_report(election_id):
 
 @admin_bp.route('/reports/voter-analytics', methods=['GET'])
 @admin_required
+@reporting_reads
 def get_voter_analytics():
     """Get voter analytics report"""
     try:
@@ -1866,58 +1883,63 @@ def export_report():
         
         if report_type == 'voters':
             # Export voter data
-            voters = Voter.find_all({"is_active": True})
-            export_data = []
-            for voter in voters:
-                export_data.append({
-                    'voter_id': voter.get('voter_id'),
-                    'full_name': voter.get('full_name'),
-                    'email': voter.get('email'),
-                    'phone': voter.get('phone'),
-                    'constituency': voter.get('constituency'),
-                    'registration_date': voter.get('created_at'),
-                    'verification_status': {
-                        'email': voter.get('email_verified', False),
-                        'phone': voter.get('phone_verified', False),
-                        'id': voter.get('id_verified', False),
-                        'face': voter.get('face_verified', False)
-                    }
-                })
+            rows = ({
+                'voter_id': voter.get('voter_id'),
+                'full_name': voter.get('full_name'),
+                'email': voter.get('email'),
+                'phone': voter.get('phone'),
+                'constituency': voter.get('constituency'),
+                'registration_date': voter.get('created_at'),
+                'verification_status': {
+                    'email': voter.get('email_verified', False),
+                    'phone': voter.get('phone_verified', False),
+                    'id': voter.get('id_verified', False),
+                    'face': voter.get('face_verified', False)
+                }
+            } for voter in Voter.iter_all({"is_active": True}, projection=Voter.SUMMARY_VIEW))
             
         elif report_type == 'elections':
             # Export election data
-            elections = Election.find_all({"is_active": True})
-            export_data = []
-            for election in elections:
-                export_data.append({
-                    'election_id': election.get('election_id'),
-                    'title': election.get('title'),
-                    'type': election.get('election_type'),
-                    'status': election.get('status'),
-                    'voting_period': {
-                        'start': election.get('voting_start'),
-                        'end': election.get('voting_end')
-                    },
-                    'total_votes': election.get('total_votes', 0),
-                    'voter_turnout': election.get('voter_turnout', 0)
-                })
+            rows = ({
+                'election_id': election.get('election_id'),
+                'title': election.get('title'),
+                'type': election.get('election_type'),
+                'status': election.get('status'),
+                'voting_period': {
+                    'start': election.get('voting_start'),
+                    'end': election.get('voting_end')
+                },
+                'total_votes': election.get('total_votes', 0),
+                'voter_turnout': election.get('voter_turnout', 0)
+            } for election in Election.iter_all({"is_active": True}, projection=Election.LISTING_VIEW))
             
         elif report_type == 'votes':
             # Export vote data
-            votes = Vote.find_all({"is_verified": True}, limit=1000)
-            export_data = []
-            for vote in votes:
-                export_data.append({
-                    'vote_id': vote.get('vote_id'),
-                    'election_id': vote.get('election_id'),
-                    'voter_id': vote.get('voter_id'),
-                    'timestamp': vote.get('vote_timestamp'),
-                    'face_verified': vote.get('face_verified', False)
-                })
+            rows = ({
+                'vote_id': vote.get('vote_id'),
+                'election_id': vote.get('election_id'),
+                'voter_id': vote.get('voter_id'),
+                'timestamp': vote.get('vote_timestamp'),
+                'face_verified': vote.get('face_verified', False)
+            } for vote in Vote.iter_all({"is_verified": True}, limit=1000))
         
         else:
             return jsonify({'success': False, 'message': 'Invalid report type'}), 400
         
+        if format_type == 'ndjson':
+            # Stream one JSON document per line so memory stays flat for large exports
+            log_admin_action(
+                request.admin,
+                "export_report",
+                {"report_type": report_type, "format": format_type, "streamed": True}
+            )
+            return Response(
+                stream_with_context(json.dumps(row, default=str) + '\n' for row in rows),
+                mimetype='application/x-ndjson'
+            )
+        
+        export_data = list(rows)
+        
         # Log export action
         log_admin_action(
             request.admin,
@@ -1982,6 +2004,194 @@ def get_system_health():
         logger.error(f"System health error: {str(e)}")
         return jsonify({'success': False, 'message': 'Failed to get system health'}), 500
         
+@admin_bp.route('/metrics/face', methods=['GET'])
+@admin_required
+def get_face_metrics():
+    """Get per-stage latency histograms of the hybrid face pipeline"""
+    try:
+        snapshot = face_metrics.snapshot()
+        
+        if request.args.get('reset') == 'true':
+            face_metrics.reset()
+        
+        return jsonify({
+            'success': True,
+            'metrics': snapshot,
+            'sample_rate': FACE_TIMING_SAMPLE_RATE
+        })
+    except Exception as e:
+        logger.error(f"Face metrics error: {str(e)}")
+        return jsonify({'success': False, 'message': 'Failed to get face metrics'}), 500
+
+@admin_bp.route('/metrics/queries', methods=['GET'])
+@admin_required
+def get_query_metrics():
+    """Get per-route MongoDB query totals and budgets"""
+    try:
+        snapshot = query_monitor.snapshot()
+        
+        if request.args.get('reset') == 'true':
+            query_monitor.reset()
+        
+        return jsonify({
+            'success': True,
+            'routes': snapshot,
+            'default_budget': query_monitor.default_budget
+        })
+    except Exception as e:
+        logger.error(f"Query metrics error: {str(e)}")
+        return jsonify({'success': False, 'message': 'Failed to get query metrics'}), 500
+
+@admin_bp.route('/metrics/pool', methods=['GET'])
+@admin_required
+def get_pool_metrics():
+    """Get MongoDB connection pool sizes, checkout waits and checkout failures"""
+    try:
+        snapshot = pool_monitor.snapshot()
+        
+        if request.args.get('reset') == 'true':
+            pool_monitor.reset()
+        
+        return jsonify({
+            'success': True,
+            **snapshot
+        })
+    except Exception as e:
+        logger.error(f"Pool metrics error: {str(e)}")
+        return jsonify({'success': False, 'message': 'Failed to get pool metrics'}), 500
+
+@admin_bp.route('/metrics/audit', methods=['GET'])
+@admin_required
+def get_audit_writer_metrics():
+    """Get queue depth and write counters of the buffered audit log writer"""
+    try:
+        if request.args.get('flush') == 'true':
+            audit_writer.flush()
+        
+        return jsonify({
+            'success': True,
+            'audit_writer': audit_writer.get_statistics(),
+            'buffered': AuditLog.writer is not None
+        })
+    except Exception as e:
+        logger.error(f"Audit writer metrics error: {str(e)}")
+        return jsonify({'success': False, 'message': 'Failed to get audit writer metrics'}), 500
+
+@admin_bp.route('/edge/bundle', methods=['GET'])
+@admin_required
+def export_edge_bundle():
+    """Export a signed face template bundle for one polling station or constituency"""
+    try:
+        if not current_app.config.get('EDGE_BUNDLE_SIGNING_KEY'):
+            return jsonify({
+                'success': False,
+                'message': 'EDGE_BUNDLE_SIGNING_KEY is not configured'
+            }), 503
+        
+        polling_station = request.args.get('polling_station')
+        constituency = request.args.get('constituency')
+        if not polling_station and not constituency:
+            return jsonify({
+                'success': False,
+                'message': 'polling_station or constituency is required'
+            }), 400
+        
+        scope = {'polling_station': polling_station} if polling_station else {'constituency': constituency}
+        voters = Voter.get_collection().find(
+            {**scope, 'is_active': True, 'face_verified': True},
+            {'voter_id': 1}
+        )
+        voter_ids = [v['voter_id'] for v in voters]
+        encodings = FaceEncoding.get_primary_encodings(voter_ids)
+        
+        # Templates of different encoders cannot share a matrix; keep the most common size
+        dims = {}
+        for encoding in encodings.values():
+            dims[len(encoding)] = dims.get(len(encoding), 0) + 1
+        dim = max(dims, key=dims.get) if dims else 0
+        bundle_ids = [vid for vid in voter_ids if vid in encodings and len(encodings[vid]) == dim]
+        skipped = len(voter_ids) - len(bundle_ids)
+        
+        bundle_id = EdgeBundle.create_bundle(scope, len(bundle_ids), dim, None, request.admin['admin_id'])
+        bundle = pack_bundle(
+            bundle_ids,
+            [encodings[vid] for vid in bundle_ids],
+            current_app.config['EDGE_BUNDLE_SIGNING_KEY'],
+            {
+                'bundle_id': bundle_id,
+                'scope': scope,
+                'threshold': knn_face_service.threshold,
+                'created_at': datetime.utcnow().isoformat()
+            }
+        )
+        digest = hashlib.sha256(bundle).hexdigest()
+        EdgeBundle.set_digest(bundle_id, digest)
+        
+        log_admin_action(
+            request.admin,
+            'edge_bundle_exported',
+            f"Exported edge bundle {bundle_id} for {scope} ({len(bundle_ids)} voters, {skipped} skipped)",
+            bundle_id
+        )
+        
+        response = send_file(
+            io.BytesIO(bundle),
+            as_attachment=True,
+            download_name=f"{bundle_id}.sveb",
+            mimetype='application/octet-stream'
+        )
+        response.headers['X-Bundle-Id'] = bundle_id
+        response.headers['X-Bundle-SHA256'] = digest
+        response.headers['X-Bundle-Voters'] = str(len(bundle_ids))
+        response.headers['X-Bundle-Skipped'] = str(skipped)
+        return response
+        
+    except Exception as e:
+        logger.error(f"Edge bundle export error: {str(e)}")
+        return jsonify({'success': False, 'message': 'Failed to export edge bundle'}), 500
+
+@admin_bp.route('/edge/sync', methods=['POST'])
+@admin_required
+def sync_edge_results():
+    """Receive kiosk verification results for an exported bundle"""
+    try:
+        payload = request.get_json() or {}
+        bundle_id = payload.get('bundle_id')
+        kiosk_id = payload.get('kiosk_id')
+        results = payload.get('results') or []
+        
+        if not bundle_id or not kiosk_id:
+            return jsonify({'success': False, 'message': 'bundle_id and kiosk_id are required'}), 400
+        
+        if not current_app.config.get('EDGE_BUNDLE_SIGNING_KEY'):
+            return jsonify({'success': False, 'message': 'EDGE_BUNDLE_SIGNING_KEY is not configured'}), 503
+        
+        if not EdgeBundle.find_by_bundle_id(bundle_id):
+            return jsonify({'success': False, 'message': 'Unknown bundle'}), 404
+        
+        # Only a kiosk holding the bundle signing key can produce a valid payload
+        if not verify_payload(payload, current_app.config['EDGE_BUNDLE_SIGNING_KEY']):
+            return jsonify({'success': False, 'message': 'Invalid payload signature'}), 403
+        
+        recorded = EdgeVerification.record_results(bundle_id, kiosk_id, results)
+        
+        log_admin_action(
+            request.admin,
+            'edge_results_synced',
+            f"Kiosk {kiosk_id} synced {len(results)} results for bundle {bundle_id} ({recorded} new)",
+            bundle_id
+        )
+        
+        return jsonify({
+            'success': True,
+            'received': len(results),
+            'recorded': recorded
+        })
+        
+    except Exception as e:
+        logger.error(f"Edge sync error: {str(e)}")
+        return jsonify({'success': False, 'message': 'Failed to sync edge results'}), 500
+
 # System settings routes
 @admin_bp.route('/settings', methods=['GET'])
 @admin_required
@@ -2189,13 +2399,64 @@ def update_voter_status(voter_id):
             'message': 'Failed to update voter status'
         }), 500
 
+@admin_bp.route('/voters/bulk-status', methods=['PUT'])
+@admin_required
+def bulk_update_voter_status():
+    """Update the status (active/inactive) of many voters in one bulk write"""
+    try:
+        data = request.get_json() or {}
+        voter_ids = data.get('voter_ids') or []
+        status = data.get('status')
+        
+        if status not in ['active', 'inactive'] or not voter_ids:
+            return jsonify({
+                'success': False,
+                'message': 'voter_ids and a status of "active" or "inactive" are required'
+            }), 400
+        
+        is_active = status == 'active'
+        result = Voter.bulk_update(
+            ({"voter_id": voter_id}, {"is_active": is_active}) for voter_id in voter_ids
+        )
+        
+        broadcast_voter_update('status_update', {
+            'voter_ids': voter_ids,
+            'new_status': status
+        }, request.admin['admin_id'])
+        
+        log_admin_action(
+            request.admin,
+            "bulk_update_voter_status",
+            {
+                "voter_count": len(voter_ids),
+                "new_status": status,
+                "modified": result['modified'],
+                "errors": len(result['errors'])
+            }
+        )
+        
+        return jsonify({
+            'success': not result['errors'],
+            'message': f"Updated {result['modified']} of {len(voter_ids)} voters to {status}",
+            'matched': result['matched'],
+            'modified': result['modified'],
+            'errors': [{**err, 'voter_id': voter_ids[err['index']]} for err in result['errors']]
+        })
+        
+    except Exception as e:
+        logger.error(f"Bulk update voter status error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': 'Failed to update voter status'
+        }), 500
+
 # Get voter details with voting history
 @admin_bp.route('/voters/<voter_id>', methods=['GET'])
 @admin_required
 def get_voter_details(voter_id):
     """Get detailed voter information with voting history"""
     try:
-        voter = Voter.find_by_voter_id(voter_id)
+        voter = Voter.with_profile(Voter.find_by_voter_id(voter_id))
         if not voter:
             return jsonify({
                 'success': False,
@@ -2208,10 +2469,15 @@ def get_voter_details(voter_id):
             "is_verified": True
         }, sort=[("vote_timestamp", -1)])
         
+        elections = get_loader(Election, 'election_id')
+        candidates = get_loader(Candidate, 'candidate_id')
+        elections.add_many(vote['election_id'] for vote in votes)
+        candidates.add_many(vote.get('candidate_id') for vote in votes)
+        
         voting_history = []
         for vote in votes:
-            election = Election.find_by_election_id(vote['election_id'])
-            candidate = Candidate.find_by_candidate_id(vote['candidate_id'])
+            election = elections.get(vote['election_id'])
+            candidate = candidates.get(vote.get('candidate_id'))
             
             voting_history.append({
                 'election_id': vote['election_id'],
@@ -2294,18 +2560,16 @@ def get_audit_logs():
         if user_type != 'all':
             query["user_type"] = user_type
         
-        # Get all audit logs first, then manually paginate
-        all_logs = AuditLog.find_all(
+        # Paginate in the database instead of loading every log
+        total_logs = AuditLog.count(query)
+        paginated_logs = AuditLog.iter_all(
             query=query,
-            sort=[("timestamp", -1)]
+            sort=[("timestamp", -1)],
+            skip=(page - 1) * per_page,
+            limit=per_page,
+            batch_size=per_page
         )
         
-        # Manual pagination
-        total_logs = len(all_logs)
-        start_idx = (page - 1) * per_page
-        end_idx = start_idx + per_page
-        paginated_logs = all_logs[start_idx:end_idx]
-        
         # Get unique actions and user types for filters
         actions = AuditLog.get_collection().distinct("action")
         user_types = AuditLog.get_collection().distinct("user_type")
@@ -2381,23 +2645,25 @@ def get_candidates():
         paginated_candidates = all_candidates[start_idx:end_idx]
         
         # Get elections for filter
-        all_elections = Election.find_all({"is_active": True})
+        all_elections = Election.find_all({"is_active": True}, projection={"election_id": 1, "title": 1})
         elections = [
             {"election_id": e.get("election_id"), "title": e.get("title")}
             for e in all_elections
         ]        
         
+        # Elections and vote counts of the whole page, one query each
+        page_elections = get_loader(Election, 'election_id', Election.LISTING_VIEW)
+        page_elections.add_many(candidate.get('election_id') for candidate in paginated_candidates)
+        vote_counts = get_count_loader(Vote, 'candidate_id', {"is_verified": True}).load_many(
+            candidate.get('candidate_id') for candidate in paginated_candidates
+        )
+        
         candidates_data = []
         for candidate in paginated_candidates:
             # Get election title
-            election = Election.find_by_election_id(candidate.get('election_id'))
+            election = page_elections.get(candidate.get('election_id'))
             election_title = election['title'] if election else 'Unknown Election'
-            
-            # Get vote count
-            vote_count = Vote.count({
-                "candidate_id": candidate.get('candidate_id'),
-                "is_verified": True
-            })
+            vote_count = vote_counts.get(candidate.get('candidate_id'), 0)
             
             candidates_data.append({
                 'candidate_id': candidate.get('candidate_id'),
@@ -80,6 +80,53 @@ def get_user_id_from_payload(payload):
     
     return None
 
+def complete_face_login(voter, result, ip_address=None, action="face_verified_hybrid"):
+    """Issue the final voter token after a successful face match"""
+    voter_id = voter['voter_id']
+    voter_data = {
+        'voter_id': voter_id,
+        'full_name': voter['full_name'],
+        'email': voter['email'],
+        'phone': voter['phone'],
+        'constituency': voter.get('constituency', ''),
+        'polling_station': voter.get('polling_station', ''),
+        'role': 'voter'
+    }
+    
+    token_payload = {
+        'user_id': voter_id,
+        'voter_id': voter_id,
+        'email': voter['email'],
+        'full_name': voter['full_name'],
+        'user_type': 'voter',
+        'exp': datetime.utcnow() + JWT_EXPIRATION,
+        'iat': datetime.utcnow()
+    }
+    final_token = jwt.encode(token_payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
+    
+    # Update last face verification time and last login
+    try:
+        Voter.update_one(
+            {"voter_id": voter_id},
+            {"$set": {
+                "last_face_verification": datetime.utcnow(),
+                "last_login": datetime.utcnow()
+            }}
+        )
+        logger.info(f"Updated last_face_verification and last_login for voter: {voter_id}")
+    except Exception as e:
+        logger.warning(f"Could not update face verification time: {e}")
+    
+    AuditLog.create_log(
+        action=action,
+        user_id=voter_id,
+        user_type="voter",
+        details=f"Face verified using hybrid system (confidence: {result.confidence:.4f}, method: {result.method})",
+        ip_address=ip_address
+    )
+    
+    return voter_data, final_token
+
 @auth_bp.route('/test', methods=['GET', 'POST', 'OPTIONS'])
 def test_route():
     """Test route to verify auth blueprint is working"""
@@ -332,51 +379,7 @@ def verify_face_hybrid():
         # logger.info(f"Face verification result: {result.is_match}, confidence: {result.confidence}")
         
         if result.is_match:
-            # Prepare voter data for token generation
-            voter_data = {
-                'voter_id': voter['voter_id'],
-                'full_name': voter['full_name'],
-                'email': voter['email'],
-                'phone': voter['phone'],
-                'constituency': voter.get('constituency', ''),
-                'polling_station': voter.get('polling_station', ''),
-                'role': 'voter'
-            }
-            
-            # Generate JWT token
-            token_payload = {
-                'user_id': voter['voter_id'],
-                'voter_id': voter['voter_id'],
-                'email': voter['email'],
-                'full_name': voter['full_name'],
-                'user_type': 'voter',
-                'exp': datetime.utcnow() + JWT_EXPIRATION,
-                'iat': datetime.utcnow()
-            }
-            
-            final_token = jwt.encode(token_payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
-            
-            # Update last face verification time and last login
-            try:
-                Voter.update_one(
-                    {"voter_id": voter_id},
-                    {"$set": {
-                        "last_face_verification": datetime.utcnow(),
-                        "last_login": datetime.utcnow()
-                    }}
-                )
-                logger.info(f"Updated last_face_verification and last_login for voter: {voter_id}")
-            except Exception as e:
-                logger.warning(f"Could not update face verification time: {e}")
-            
-            # Log successful verification
-            AuditLog.create_log(
-                action="face_verified_hybrid",
-                user_id=voter_id,
-                user_type="voter",
-                details=f"Face verified using hybrid system (confidence: {result.confidence:.4f}, method: {result.method})",
-                ip_address=request.remote_addr
-            )
+            voter_data, final_token = complete_face_login(voter, result, request.remote_addr)
             
             logger.info(f"✅ Face verification successful for voter: {voter_id}")
             logger.info(f"✅ Token generated: {final_token[:50]}...")
@@ -972,7 +975,7 @@ def debug_voters():
     """Debug endpoint to list all voters in database"""
     try:
         from smart_app.backend.mongo_models import Voter
-        voters = Voter.find_all({}, {'voter_id': 1, 'full_name': 1, 'email': 1, 'date_of_birth': 1, 'password_hash': 1})
+        voters = Voter.find_all({}, projection={'voter_id': 1, 'full_name': 1, 'email': 1, 'date_of_birth': 1, 'password_hash': 1})
         
         voter_list = []
         for voter in voters:
@@ -17,8 +17,9 @@ from flask_socketio import emit, join_room
 from smart_app.backend.socket_events import safe_emit, connected_clients
 
 # Import from your project structure
-from smart_app.backend.mongo_models import Voter, Election, Vote, Candidate, AuditLog, OTP, FaceEncoding, Admin
+from smart_app.backend.mongo_models import Voter, Election, Vote, Candidate, AuditLog, OTP, FaceEncoding, Admin, reporting_reads
 from smart_app.backend.extensions import mongo
+from smart_app.backend.services.loaders import get_loader, get_count_loader
 from flask_cors import cross_origin
 
 logger = logging.getLogger(__name__)
@@ -111,7 +112,7 @@ def get_authenticated_voter():
         print(f"Looking for voter with ID: {voter_id}")
         
         # Find voter in database
-        voter = Voter.find_by_voter_id(voter_id)
+        voter = Voter.find_by_voter_id(voter_id, projection=Voter.PROFILE_VIEW)
         if not voter:
             print(f"Voter not found: {voter_id}")
             return None
@@ -222,7 +223,7 @@ def safe_emit(event, data, room=None, broadcast=False):
 def handle_voter_connection(voter_id):
     """Handle voter WebSocket connection - FIXED VERSION"""
     try:
-        voter = Voter.find_by_voter_id(voter_id)
+        voter = Voter.find_by_voter_id(voter_id, projection=Voter.AUTH_VIEW)
         if not voter:
             logger.warning(f"Voter not found: {voter_id}")
             emit('connection_error', {'message': 'Voter not found'})
@@ -490,7 +491,7 @@ def get_dashboard_data():
 def get_profile():
     """Get comprehensive user profile data - FIXED VERSION"""
     try:
-        voter = request.voter
+        voter = Voter.with_profile(request.voter)
         
         # Enhanced profile data
         profile_data = {
@@ -1356,7 +1357,7 @@ def get_digital_id():
 def export_data():
     """Export voter data in various formats"""
     try:
-        voter = get_authenticated_voter()
+        voter = Voter.with_profile(get_authenticated_voter())
         if not voter:
             return jsonify({
                 'success': False,
@@ -1481,7 +1482,7 @@ def refresh_dashboard_data():
 def export_voter_data(format_type):
     """Export voter data in various formats"""
     try:
-        voter = request.voter
+        voter = Voter.with_profile(request.voter)
         
         if format_type == 'pdf':
             return export_pdf_data(voter)
@@ -2322,7 +2323,7 @@ def get_upcoming_elections(voter, election_type='all'):
         if election_type != 'all':
             query["election_type"] = election_type
         
-        elections = Election.find_all(query, sort=[("voting_start", 1)])
+        elections = Election.find_all(query, sort=[("voting_start", 1)], projection=Election.LISTING_VIEW)
         
         enhanced_elections = []
         for election in elections:
@@ -2352,16 +2353,16 @@ def get_active_elections(voter, election_type='all'):
         current_time = datetime.utcnow()
         print(f"🔍 Looking for active elections at: {current_time}")
         
-        # Get ALL elections first to debug
-        all_elections = Election.find_all({"is_active": True})
-        print(f"📊 Total active elections in DB: {len(all_elections)}")
-        
-        for election in all_elections:
+        # Walk ALL elections first to debug
+        total_elections = 0
+        for election in Election.iter_all({"is_active": True}, projection=Election.LISTING_VIEW):
+            total_elections += 1
             print(f"📋 Election: {election.get('title')}")
             print(f"   - ID: {election.get('election_id')}")
             print(f"   - Status: {election.get('status')}")
             print(f"   - Voting Start: {election.get('voting_start')}")
             print(f"   - Voting End: {election.get('voting_end')}")
+        print(f"📊 Total active elections in DB: {total_elections}")
         
         # Build query for active elections
         query = {
@@ -2369,7 +2370,7 @@ def get_active_elections(voter, election_type='all'):
             "status": "active"
         }
         
-        elections = Election.find_all(query, sort=[("voting_end", 1)])
+        elections = Election.find_all(query, sort=[("voting_end", 1)], projection=Election.LISTING_VIEW)
         print(f"📊 Found {len(elections)} elections with active status")
         
         # Filter by date manually
@@ -2395,13 +2396,19 @@ def get_active_elections(voter, election_type='all'):
         
         print(f"🎯 Final active elections count: {len(active_elections)}")
         
+        # The voter's votes, candidate and vote counts for all active elections, one query each
+        election_ids = [election.get('election_id') for election in active_elections]
+        own_votes = Vote.find_by_voter_for_elections(voter['voter_id'], election_ids)
+        candidate_counts = get_count_loader(Candidate, 'election_id').load_many(election_ids)
+        vote_counts = get_count_loader(Vote, 'election_id').load_many(election_ids)
+        
         # Process active elections
         enhanced_elections = []
         for election in active_elections:
             try:
                 # Simple eligibility for debugging
                 is_eligible = True  # Temporarily set to True
-                has_voted = Vote.has_voted(election.get('election_id'), voter['voter_id'])
+                has_voted = election.get('election_id') in own_votes
                 
                 enhanced_elections.append({
                     'election_id': election.get('election_id'),
@@ -2415,8 +2422,8 @@ def get_active_elections(voter, election_type='all'):
                     'has_voted': has_voted,
                     'can_vote': not has_voted and is_eligible,
                     'is_eligible': is_eligible,
-                    'candidates_count': Candidate.count({"election_id": election.get('election_id')}),
-                    'total_votes': Vote.count({"election_id": election.get('election_id')})
+                    'candidates_count': candidate_counts.get(election.get('election_id'), 0),
+                    'total_votes': vote_counts.get(election.get('election_id'), 0)
                 })
                 
             except Exception as e:
@@ -2443,11 +2450,13 @@ def get_past_elections(voter, election_type='all'):
         if election_type != 'all':
             query["election_type"] = election_type
         
-        elections = Election.find_all(query, sort=[("voting_end", -1)], limit=10)
+        elections = Election.find_all(query, sort=[("voting_end", -1)], limit=10, projection=Election.LISTING_VIEW)
+        
+        votes = Vote.find_by_voter_for_elections(voter['voter_id'], [e.get('election_id') for e in elections])
         
         enhanced_elections = []
         for election in elections:
-            vote = Vote.find_by_election_and_voter(election.get('election_id', 'unknown'), voter['voter_id'])
+            vote = votes.get(election.get('election_id', 'unknown'))
             enhanced_elections.append({
                 'id': election.get('election_id', 'unknown'),
                 'title': election.get('title', 'Unknown Election'),
@@ -2576,12 +2585,18 @@ def get_voter_voting_history(voter_id):
             "is_verified": True
         }, sort=[("vote_timestamp", -1)])
         
+        # One $in query each for the elections and candidates of all votes
+        elections = get_loader(Election, 'election_id')
+        candidates = get_loader(Candidate, 'candidate_id')
+        elections.add_many(vote['election_id'] for vote in votes)
+        candidates.add_many(vote.get('candidate_id') for vote in votes)
+        
         voting_history = []
         for vote in votes:
             # Get election details
-            election = Election.find_by_election_id(vote['election_id'])
+            election = elections.get(vote['election_id'])
             # Get candidate details if available
-            candidate = Candidate.find_one({"candidate_id": vote['candidate_id']}) if vote.get('candidate_id') else None
+            candidate = candidates.get(vote.get('candidate_id'))
             
             voting_history.append({
                 'election_id': vote['election_id'],
@@ -2599,6 +2614,7 @@ def get_voter_voting_history(voter_id):
         logger.error(f"Error getting voting history: {str(e)}")
         return []
 
+@reporting_reads
 def get_voter_analytics(voter_id):
     """Get analytics data for voter"""
     try:
@@ -2651,7 +2667,7 @@ def get_election_type_breakdown(voter_id):
 def get_constituency_ranking(voter_id):
     """Get voter's ranking in constituency"""
     try:
-        voter = Voter.find_by_voter_id(voter_id)
+        voter = Voter.find_by_voter_id(voter_id, projection=Voter.AUTH_VIEW)
         if not voter:
             return None
         
@@ -2810,8 +2826,8 @@ def check_voter_eligibility(voter_id, election_id):
     try:
         logger.info(f"Checking eligibility for voter {voter_id} in election {election_id}")
         
-        voter = Voter.find_by_voter_id(voter_id)
-        election = Election.find_by_election_id(election_id)
+        voter = Voter.find_by_voter_id(voter_id, projection=Voter.AUTH_VIEW)
+        election = Election.find_by_election_id(election_id, projection=Election.LISTING_VIEW)
         
         if not voter:
             logger.error(f"Voter {voter_id} not found")
@@ -3933,8 +3949,7 @@ def create_test_election():
             }
         ]
         
-        for candidate in candidates:
-            Candidate.create_candidate(candidate)
+        Candidate.create_candidates(candidates)
         
         return jsonify({
             'success': True,
@@ -4223,6 +4238,7 @@ def get_election_results_voter(election_id):
         # Determine if voter can view results
         can_view_results = False
         reason = ""
+        has_voted = None
         
         # Rules for viewing results:
         # 1. If results are explicitly published, anyone can view
@@ -4296,7 +4312,7 @@ def get_election_results_voter(election_id):
             'access_info': {
                 'reason': reason,
                 'can_view': can_view_results,
-                'voter_has_voted': Vote.has_voted(election_id, voter['voter_id'])
+                'voter_has_voted': has_voted if has_voted is not None else Vote.has_voted(election_id, voter['voter_id'])
             }
         })
         
@@ -4503,6 +4519,11 @@ def get_detailed_live_stats():
             "voting_end": {"$gte": current_time}
         })
         
+        # Limit to 5 for performance; their counts come from one aggregation each
+        detail_ids = [election.get('election_id') for election in active_elections[:5]]
+        detail_vote_counts = get_count_loader(Vote, 'election_id').load_many(detail_ids)
+        detail_candidate_counts = get_count_loader(Candidate, 'election_id').load_many(detail_ids)
+        
         # Upcoming elections
         upcoming_elections = Election.count({
             "status": "scheduled",
@@ -4547,12 +4568,12 @@ def get_detailed_live_stats():
                     'election_id': election.get('election_id'),
                     'title': election.get('title'),
                     'voting_ends': election.get('voting_end'),
-                    'total_votes': Vote.count({"election_id": election.get('election_id')}),
+                    'total_votes': detail_vote_counts.get(election.get('election_id'), 0),
                     'voter_turnout': election.get('voter_turnout', 0),
                     'time_remaining': calculate_time_remaining(election.get('voting_end')),
-                    'candidates_count': Candidate.count({"election_id": election.get('election_id')})
+                    'candidates_count': detail_candidate_counts.get(election.get('election_id'), 0)
                 }
-                for election in active_elections[:5]  # Limit to 5 for performance
+                for election in active_elections[:5]
             ]
         }
     except Exception as e:
@@ -4610,6 +4631,8 @@ def get_voter_insights(voter_id):
         votes_by_hour = {}
         votes_by_election_type = {}
         last_vote_date = None
+        elections = get_loader(Election, 'election_id')
+        elections.add_many(vote['election_id'] for vote in votes)
         
         for vote in votes:
             vote_time = vote.get('vote_timestamp')
@@ -4618,7 +4641,7 @@ def get_voter_insights(voter_id):
                 votes_by_hour[hour] = votes_by_hour.get(hour, 0) + 1
                 
                 # Get election type
-                election = Election.find_by_election_id(vote['election_id'])
+                election = elections.get(vote['election_id'])
                 if election:
                     election_type = election.get('election_type', 'unknown')
                     votes_by_election_type[election_type] = votes_by_election_type.get(election_type, 0) + 1
@@ -5211,8 +5234,7 @@ def create_test_data():
             }
         ]
         
-        for candidate in candidates:
-            Candidate.create_candidate(candidate)
+        Candidate.create_candidates(candidates)
         
         return jsonify({
             'success': True,
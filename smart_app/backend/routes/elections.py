@@ -10,6 +10,7 @@ import re
 # Import from your project structure
 from smart_app.backend.mongo_models import Voter, Election, Vote, Candidate, AuditLog
 from smart_app.backend.routes.dashboard import get_authenticated_voter, voter_required
+from smart_app.backend.services.loaders import get_loader, get_count_loader
 
 logger = logging.getLogger(__name__)
 
@@ -69,13 +70,11 @@ def get_active_elections_enhanced():
         current_time = datetime.utcnow()
         logger.info(f"⏰ Current time for election check: {current_time}")
         
-        # Get ALL elections first
-        all_elections = Election.find_all({"is_active": True})
-        logger.info(f"📊 Total elections in DB: {len(all_elections)}")
-        
-        # Use the fix_date_parsing function
+        # Stream ALL elections, keeping only the ones open for voting
+        total_elections = 0
         active_elections = []
-        for election in all_elections:
+        for election in Election.iter_all({"is_active": True}, projection=Election.LISTING_VIEW):
+            total_elections += 1
             voting_start = fix_date_parsing(election.get('voting_start'))
             voting_end = fix_date_parsing(election.get('voting_end'))
             
@@ -90,8 +89,17 @@ def get_active_elections_enhanced():
                 active_elections.append(election)
                 logger.info(f"✅ ACTIVE: {election.get('title')}")
         
+        logger.info(f"📊 Total elections in DB: {total_elections}")
         logger.info(f"🎯 Final active elections count: {len(active_elections)}")
         
+        # Votes, candidate counts and vote totals of all active elections, one query each
+        election_ids = [election.get('election_id') for election in active_elections]
+        votes = Vote.find_by_voter_for_elections(voter['voter_id'], election_ids)
+        candidate_counts = get_count_loader(Candidate, 'election_id', {"is_active": True, "is_approved": True}).load_many(election_ids)
+        vote_counts = get_count_loader(Vote, 'election_id').load_many(election_ids)
+        # Eligibility checks read the elections from the request's identity map
+        get_loader(Election, 'election_id', Election.LISTING_VIEW).load_many(election_ids)
+        
         # Process active elections with enhanced data
         enhanced_elections = []
         for election in active_elections:
@@ -101,17 +109,13 @@ def get_active_elections_enhanced():
                 voting_end = fix_date_parsing(election.get('voting_end'))
                 
                 # Get vote status
-                has_voted = Vote.has_voted(election.get('election_id'), voter['voter_id'])
+                has_voted = election.get('election_id') in votes
                 
                 # Check eligibility
                 is_eligible = check_voter_eligibility(voter['voter_id'], election.get('election_id'))
                 
                 # Get candidate count
-                candidates_count = Candidate.count({
-                    "election_id": election.get('election_id'),
-                    "is_active": True,
-                    "is_approved": True
-                })
+                candidates_count = candidate_counts.get(election.get('election_id'), 0)
                 
                 election_data = {
                     'election_id': election.get('election_id'),
@@ -126,7 +130,7 @@ def get_active_elections_enhanced():
                     'is_eligible': is_eligible,
                     'can_vote': not has_voted and is_eligible,
                     'candidates_count': candidates_count,
-                    'total_votes': Vote.count({"election_id": election.get('election_id')}),
+                    'total_votes': vote_counts.get(election.get('election_id'), 0),
                     'voter_turnout': election.get('voter_turnout', 0),
                     'election_logo': election.get('election_logo'),
                     'election_banner': election.get('election_banner'),
@@ -171,7 +175,10 @@ def get_upcoming_elections_enhanced():
             "voting_start": {"$gt": datetime.utcnow()}
         }
         
-        elections = Election.find_all(query, sort=[("vouting_start", 1)])
+        elections = Election.find_all(query, sort=[("vouting_start", 1)], projection=Election.LISTING_VIEW)
+        election_ids = [election.get('election_id') for election in elections]
+        candidate_counts = get_count_loader(Candidate, 'election_id', {"is_active": True, "is_approved": True}).load_many(election_ids)
+        get_loader(Election, 'election_id', Election.LISTING_VIEW).load_many(election_ids)
         
         enhanced_elections = []
         for election in elections:
@@ -187,11 +194,7 @@ def get_upcoming_elections_enhanced():
                 'voting_end': election.get('voting_end').isoformat() if election.get('voting_end') else None,
                 'constituency': election.get('constituency', 'General Constituency'),
                 'is_eligible': is_eligible,
-                'candidates_count': Candidate.count({
-                    "election_id": election.get('election_id'),
-                    "is_active": True,
-                    "is_approved": True
-                }),
+                'candidates_count': candidate_counts.get(election.get('election_id'), 0),
                 'election_logo': election.get('election_logo')
             })
         
@@ -222,11 +225,14 @@ def get_completed_elections():
             "voting_end": {"$lt": datetime.utcnow()}
         }
         
-        elections = Election.find_all(query, sort=[("voting_end", -1)])
+        elections = Election.find_all(query, sort=[("voting_end", -1)], projection=Election.LISTING_VIEW)
+        election_ids = [election.get('election_id') for election in elections]
+        votes = Vote.find_by_voter_for_elections(voter['voter_id'], election_ids)
+        vote_counts = get_count_loader(Vote, 'election_id').load_many(election_ids)
         
         enhanced_elections = []
         for election in elections:
-            vote = Vote.find_by_election_and_voter(election.get('election_id'), voter['voter_id'])
+            vote = votes.get(election.get('election_id'))
             
             enhanced_elections.append({
                 'election_id': election.get('election_id'),
@@ -239,7 +245,7 @@ def get_completed_elections():
                 'constituency': election.get('constituency', 'General Constituency'),
                 'voted': vote is not None,
                 'vote_timestamp': vote.get('vote_timestamp').isoformat() if vote and vote.get('vote_timestamp') else None,
-                'total_votes': Vote.count({"election_id": election.get('election_id')}),
+                'total_votes': vote_counts.get(election.get('election_id'), 0),
                 'results_available': election.get('results_publish') and datetime.utcnow() > election.get('results_publish', datetime.utcnow())
             })
         
@@ -1072,8 +1078,8 @@ def check_voter_eligibility(voter_id, election_id):
     try:
         logger.info(f"Checking eligibility for voter {voter_id} in election {election_id}")
         
-        voter = Voter.find_by_voter_id(voter_id)
-        election = Election.find_by_election_id(election_id)
+        voter = Voter.find_by_voter_id(voter_id, projection=Voter.AUTH_VIEW)
+        election = Election.find_by_election_id(election_id, projection=Election.LISTING_VIEW)
         
         if not voter:
             logger.error(f"Voter {voter_id} not found")
@@ -1177,7 +1183,7 @@ def get_upcoming_elections(voter, election_type='all'):
         if election_type != 'all':
             query["election_type"] = election_type
         
-        elections = Election.find_all(query, sort=[("voting_start", 1)])
+        elections = Election.find_all(query, sort=[("voting_start", 1)], projection=Election.LISTING_VIEW)
         
         enhanced_elections = []
         for election in elections:
@@ -1216,7 +1222,7 @@ def get_active_elections(voter, election_type='all'):
         logger.info(f"Active elections query: {query}")
         
         # Get all active elections first
-        elections = Election.find_all(query, sort=[("voting_end", 1)])
+        elections = Election.find_all(query, sort=[("voting_end", 1)], projection=Election.LISTING_VIEW)
         logger.info(f"📊 Found {len(elections)} elections with active status")
         
         # Filter by date manually to ensure proper comparison
@@ -1248,13 +1254,19 @@ def get_active_elections(voter, election_type='all'):
         
         logger.info(f"🎯 Final active elections count: {len(active_elections)}")
         
+        election_ids = [election.get('election_id') for election in active_elections]
+        votes = Vote.find_by_voter_for_elections(voter['voter_id'], election_ids)
+        candidate_counts = get_count_loader(Candidate, 'election_id').load_many(election_ids)
+        vote_counts = get_count_loader(Vote, 'election_id').load_many(election_ids)
+        get_loader(Election, 'election_id', Election.LISTING_VIEW).load_many(election_ids)
+        
         enhanced_elections = []
         for election in active_elections:
             try:
                 voting_start = normalize_date(election.get('voting_start'))
                 voting_end = normalize_date(election.get('voting_end'))
                 
-                has_voted = Vote.has_voted(election.get('election_id'), voter['voter_id'])
+                has_voted = election.get('election_id') in votes
                 is_eligible = check_voter_eligibility(voter['voter_id'], election.get('election_id'))
                 
                 enhanced_elections.append({
@@ -1269,8 +1281,8 @@ def get_active_elections(voter, election_type='all'):
                     'has_voted': has_voted,
                     'can_vote': not has_voted and is_eligible,
                     'is_eligible': is_eligible,
-                    'candidates_count': Candidate.count({"election_id": election.get('election_id')}),
-                    'total_votes': Vote.count({"election_id": election.get('election_id')}),
+                    'candidates_count': candidate_counts.get(election.get('election_id'), 0),
+                    'total_votes': vote_counts.get(election.get('election_id'), 0),
                     'voter_turnout': election.get('voter_turnout', 0)
                 })
                 
@@ -1298,11 +1310,13 @@ def get_past_elections(voter, election_type='all'):
         if election_type != 'all':
             query["election_type"] = election_type
         
-        elections = Election.find_all(query, sort=[("voting_end", -1)], limit=10)
+        elections = Election.find_all(query, sort=[("voting_end", -1)], limit=10, projection=Election.LISTING_VIEW)
+        
+        votes = Vote.find_by_voter_for_elections(voter['voter_id'], [e.get('election_id') for e in elections])
         
         enhanced_elections = []
         for election in elections:
-            vote = Vote.find_by_election_and_voter(election.get('election_id', 'unknown'), voter['voter_id'])
+            vote = votes.get(election.get('election_id', 'unknown'))
             enhanced_elections.append({
                 'id': election.get('election_id', 'unknown'),
                 'title': election.get('title', 'Unknown Election'),
@@ -1380,8 +1394,8 @@ def check_voter_eligibility(voter_id, election_id):
     try:
         logger.info(f"Checking eligibility for voter {voter_id} in election {election_id}")
         
-        voter = Voter.find_by_voter_id(voter_id)
-        election = Election.find_by_election_id(election_id)
+        voter = Voter.find_by_voter_id(voter_id, projection=Voter.AUTH_VIEW)
+        election = Election.find_by_election_id(election_id, projection=Election.LISTING_VIEW)
         
         if not voter:
             logger.error(f"Voter {voter_id} not found")
@@ -5,6 +5,7 @@ import numpy as np
 import base64
 import io
 import os
+import time
 from PIL import Image
 import bcrypt
 
@@ -15,8 +16,9 @@ import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 
-from smart_app.backend.mongo_models import Admin, AuditLog, Voter, OTP, FaceEncoding, IDDocument, calculate_age
+from smart_app.backend.mongo_models import Admin, AuditLog, Voter, OTP, FaceEncoding, IDDocument, ReencodingJob, calculate_age
 from smart_app.backend.routes.auth import verify_token
+from smart_app.backend.routes.admin import admin_required
 from smart_app.backend.services.face_recognition_service import (
     hybrid_face_service, 
     multi_face_service,
@@ -24,6 +26,10 @@ from smart_app.backend.services.face_recognition_service import (
     FaceRecognitionResult
 )
 from smart_app.backend.services.face_utils import face_utils
+from smart_app.backend.services.face_reencoding_service import start_reencoding_job
+from smart_app.backend.services.face_metrics import face_metrics
+from smart_app.backend.services.loaders import get_loader
+from smart_app.backend.services.rate_limiter import face_probe_limiter
 
 logger = logging.getLogger(__name__)
 
@@ -616,6 +622,20 @@ def register_face(voter_id):
                     'success': False,
                     **error_message
                 }), 409
+            elif error_details.get('suspicious_replay'):
+                AuditLog.create_log(
+                    action="replayed_face_frame",
+                    user_id=voter_id,
+                    user_type="voter",
+                    details=f"Previously submitted face image resubmitted for {voter_id} "
+                            f"({error_details.get('first_seen_seconds_ago')}s after first use)",
+                    ip_address=request.remote_addr
+                )
+                return jsonify({
+                    'success': False,
+                    'message': error_details.get('error'),
+                    'error_code': 'REPLAYED_FRAME'
+                }), 400
             elif error_details.get('no_face_detected'):
                 return jsonify({
                     'success': False,
@@ -648,10 +668,21 @@ def register_face(voter_id):
         # Registration successful
         registration_details = result.details
         
+        # Keep the enrollment image so encodings can be recomputed when models change
+        image_metadata = {
+            'face_bbox': registration_details.get('face_bbox'),
+            'quality_score': result.quality_score
+        }
+        image_path = save_enrollment_image(voter_id, image_data)
+        if image_path:
+            image_metadata['image_path'] = image_path
+        
         # Store face encoding in database
+        persist_start = time.perf_counter()
         face_encoding_id = FaceEncoding.create_encoding(
             voter_id=voter_id,
-            encoding_data=registration_details.get('encoding_methods', {}),
+            encoding_data=result.encodings or {},
+            image_metadata=image_metadata,
             knn_indexed=registration_details.get('knn_indexed', False)
         )
         
@@ -684,6 +715,7 @@ def register_face(voter_id):
             {"voter_id": voter_id},
             {"$set": update_data}
         )
+        face_metrics.observe('register', 'persistence.db', time.perf_counter() - persist_start)
         
         if not update_result.modified_count:
             logger.error(f"Failed to update voter record: {voter_id}")
@@ -712,6 +744,7 @@ def register_face(voter_id):
             'face_encoding_id': face_encoding_id,
             'quality_score': result.quality_score,
             'processing_time': result.processing_time,
+            'stage_timings': result.stage_timings,
             'method': result.method,
             'details': registration_details,
             'registration_completed': updated_voter.get('registration_status') == 'completed',
@@ -826,7 +859,7 @@ def knn_status():
         
         return jsonify({
             'success': True,
-            'model_status': 'loaded' if knn_face_service.knn_model else 'not_loaded',
+            'model_status': 'loaded' if stats.get('model_trained') else 'not_loaded',
             'statistics': stats,
             'system_stats': hybrid_face_service.get_system_stats(),
             'last_updated': datetime.utcnow().isoformat()
@@ -851,6 +884,14 @@ def knn_reindex():
         # Reindex using hybrid service
         added_count = hybrid_face_service.reindex_knn_from_database(all_encodings)
         
+        # Flag the newly indexed records in one bulk write, skipping ones the reindex could not load
+        if added_count:
+            FaceEncoding.bulk_update(
+                ({"encoding_id": enc['encoding_id']}, {"knn_indexed": True})
+                for enc in all_encodings
+                if 'voter_id' in enc and 'encoding' in enc and not enc.get('knn_indexed')
+            )
+        
         return jsonify({
             'success': True,
             'message': f'KNN reindexed with {added_count} face encodings',
@@ -864,6 +905,99 @@ def knn_reindex():
             'message': f'Failed to reindex KNN: {str(e)}'
         }), 500
 
+@register_bp.route('/knn/reencode', methods=['POST'])
+@admin_required
+def knn_reencode():
+    """Start (or resume) a background re-encoding job for one encoding method"""
+    try:
+        data = request.get_json() or {}
+        method = data.get('method')
+        
+        if method not in multi_face_service.get_index_methods():
+            return jsonify({
+                'success': False,
+                'message': f'Unknown or unavailable encoding method: {method}',
+                'available_methods': multi_face_service.get_index_methods()
+            }), 400
+        
+        try:
+            started = start_reencoding_job(
+                current_app._get_current_object(),
+                method,
+                live_service=knn_face_service,
+                batch_size=int(data.get('batch_size', 64)),
+                workers=data.get('workers'),
+                promote=bool(data.get('promote', False))
+            )
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'message': str(e)
+            }), 400
+        
+        if not started:
+            return jsonify({
+                'success': False,
+                'message': 'A re-encoding job is already running'
+            }), 409
+        
+        return jsonify({
+            'success': True,
+            'message': f'Re-encoding job started for {method}',
+            'method': method
+        }), 202
+    except Exception as e:
+        logger.error(f"KNN re-encode error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': f'Failed to start re-encoding: {str(e)}'
+        }), 500
+
+@register_bp.route('/knn/reencode/status', methods=['GET'])
+def knn_reencode_status():
+    """Get progress of the latest re-encoding job"""
+    try:
+        job = ReencodingJob.find_latest(request.args.get('method'))
+        if not job:
+            return jsonify({
+                'success': True,
+                'job': None
+            })
+        
+        job.pop('_id', None)
+        job['last_id'] = str(job['last_id']) if job.get('last_id') else None
+        
+        return jsonify({
+            'success': True,
+            'job': job
+        })
+    except Exception as e:
+        logger.error(f"KNN re-encode status error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': 'Failed to get re-encoding status'
+        }), 500
+
+@register_bp.route('/knn/migrate-encodings', methods=['POST'])
+@admin_required
+def knn_migrate_encodings():
+    """Repack stored face encodings into the compact binary format"""
+    try:
+        data = request.get_json(silent=True) or {}
+        migrated_count = FaceEncoding.migrate_to_binary_format(int(data.get('batch_size', 500)))
+        
+        return jsonify({
+            'success': True,
+            'message': f'Migrated {migrated_count} face encodings to binary format',
+            'migrated_count': migrated_count
+        })
+    except Exception as e:
+        logger.error(f"Encoding migration error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': 'Failed to migrate face encodings'
+        }), 500
+
 @register_bp.route('/face/system-stats', methods=['GET'])
 def face_system_stats():
     """Get face recognition system statistics"""
@@ -883,6 +1017,61 @@ def face_system_stats():
             'message': 'Failed to get system statistics'
         }), 500
 
+@register_bp.route('/face/quality-probe', methods=['POST', 'OPTIONS'])
+def face_quality_probe():
+    """Fast capture-time quality check for live guidance (no matching, no storage)"""
+    if request.method == 'OPTIONS':
+        return jsonify({'status': 'ok'}), 200
+    
+    # Open to registering users, so limit it per client before decoding anything
+    client_key = f"ip:{request.remote_addr}"
+    if not face_probe_limiter.allow(client_key):
+        response = jsonify({
+            'success': False,
+            'message': 'Too many quality probes, slow down'
+        })
+        response.headers['Retry-After'] = str(max(1, round(face_probe_limiter.retry_after(client_key))))
+        return response, 429
+        
+    try:
+        # Raw JPEG body is cheapest; base64 JSON is accepted for the existing capture code
+        if request.mimetype and request.mimetype.startswith('image/'):
+            image_bytes = request.get_data()
+        else:
+            data = request.get_json(silent=True) or {}
+            image_data = data.get('image_data', '')
+            if 'base64,' in image_data:
+                image_data = image_data.split('base64,')[1]
+            image_bytes = base64.b64decode(image_data) if image_data else b''
+        
+        if not image_bytes:
+            return jsonify({
+                'success': False,
+                'message': 'Image data required'
+            }), 400
+        
+        probe = multi_face_service.probe_face_quality(
+            image_bytes,
+            quality_threshold=hybrid_face_service.config['quality_threshold']
+        )
+        
+        return jsonify({
+            'success': True,
+            **probe
+        })
+        
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+    except Exception as e:
+        logger.error(f"Quality probe error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': 'Quality probe failed'
+        }), 500
+
 @register_bp.route('/face/find-similar', methods=['POST', 'OPTIONS'])
 def find_similar_faces():
     """Find similar faces using hybrid system"""
@@ -899,14 +1088,21 @@ def find_similar_faces():
                 'message': 'Image data required'
             }), 400
         
-        # Use hybrid service to find similar faces
-        similar_faces = hybrid_face_service.find_similar_faces(image_data, k=10)
+        # Use hybrid service to find similar faces, optionally limited to a state/constituency
+        similar_faces = hybrid_face_service.find_similar_faces(
+            image_data,
+            k=10,
+            state=data.get('state'),
+            constituency=data.get('constituency')
+        )
         
-        # Get voter details for matches
+        # Get voter details for matches (one $in query)
+        voters = get_loader(Voter, 'voter_id', {'voter_id': 1, 'full_name': 1})
+        voters.add_many(match['voter_id'] for match in similar_faces if match['is_match'])
         results = []
         for match in similar_faces:
             if match['is_match']:
-                voter = Voter.find_by_voter_id(match['voter_id'])
+                voter = voters.get(match['voter_id'])
                 if voter:
                     results.append({
                         'voter_id': match['voter_id'],
@@ -921,6 +1117,7 @@ def find_similar_faces():
             'total_matches_found': len(results),
             'threshold': knn_face_service.threshold,
             'matches': results,
+            'filters': {'state': data.get('state'), 'constituency': data.get('constituency')},
             'processing_method': 'hybrid_knn_search'
         })
         
@@ -932,6 +1129,23 @@ def find_similar_faces():
         }), 500
 
 # Helper functions
+def save_enrollment_image(voter_id, image_data):
+    """Store the submitted enrollment image and return its path"""
+    try:
+        if 'base64,' in image_data:
+            image_data = image_data.split('base64,')[1]
+        
+        folder = os.path.join(current_app.config.get('UPLOAD_FOLDER', 'uploads'), 'faces')
+        os.makedirs(folder, exist_ok=True)
+        image_path = os.path.join(folder, f'{voter_id}.jpg')
+        
+        with open(image_path, 'wb') as f:
+            f.write(base64.b64decode(image_data))
+        return image_path
+    except Exception as e:
+        logger.error(f"Failed to save enrollment image for {voter_id}: {str(e)}")
+        return None
+
 def is_voter_fully_verified(voter):
     """Check if voter is fully verified"""
     return all([
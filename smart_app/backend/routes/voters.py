@@ -5,6 +5,7 @@ from bson import ObjectId
 
 from smart_app.backend.extensions import mongo
 from smart_app.backend.mongo_models import Voter, Election, Candidate, Vote
+from smart_app.backend.services.loaders import get_loader
 
 voting_bp = Blueprint('voters', __name__)
 
@@ -134,10 +135,15 @@ def get_voting_history():
         # Get all votes by this voter
         votes = list(Vote.get_collection().find({'voter_id': voter_id}).sort('created_at', -1))
         
+        elections = get_loader(Election, 'election_id')
+        candidates = get_loader(Candidate, 'candidate_id')
+        elections.add_many(vote['election_id'] for vote in votes)
+        candidates.add_many(vote.get('candidate_id') for vote in votes)
+        
         voting_history = []
         for vote in votes:
-            election = Election.find_by_election_id(vote['election_id'])
-            candidate = Candidate.get_collection().find_one({'candidate_id': vote['candidate_id']})
+            election = elections.get(vote['election_id'])
+            candidate = candidates.get(vote.get('candidate_id'))
             
             voting_history.append({
                 'vote_id': vote['vote_id'],
@@ -0,0 +1,175 @@
+# smart_app/backend/services/audit_writer.py
+import os
+import time
+import queue
+import atexit
+import logging
+import threading
+from typing import Dict, List
+
+from smart_app.backend.mongo_models import AuditLog
+
+logger = logging.getLogger(__name__)
+
+
+class AuditLogWriter:
+    """
+    Write-behind buffer for audit logs. AuditLog.create_log enqueues records
+    and a background thread inserts them with insert_many every `batch_size`
+    records or `flush_interval_ms`, whichever comes first. When the queue is
+    full new records are dropped and counted rather than blocking the request.
+
+    The thread is started by the first submit() in each process rather than in
+    create_app, so pre-fork servers (gunicorn) get a live writer per worker
+    instead of inheriting a dead thread and a queue nobody drains.
+    """
+
+    def __init__(self, max_queue: int = 10000, batch_size: int = 200, flush_interval_ms: int = 500):
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000.0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._flush_lock = threading.Lock()   # one insert_many at a time
+        self._stats_lock = threading.Lock()   # submit() runs on many request threads
+        self._thread = None
+        self._pid = None
+        self.app = None
+        self.stats = {
+            'enqueued': 0,
+            'written': 0,
+            'dropped': 0,
+            'failed': 0,
+            'batches': 0,
+            'last_flush_ms': None
+        }
+
+    def init_app(self, app):
+        """Route AuditLog.create_log through the writer; the thread starts on first submit"""
+        if not app.config.get('AUDIT_LOG_BUFFERED', True):
+            return
+        self.app = app
+        self.max_queue = app.config.get('AUDIT_LOG_QUEUE_SIZE', self.max_queue)
+        self.batch_size = app.config.get('AUDIT_LOG_BATCH_SIZE', self.batch_size)
+        self.flush_interval = app.config.get('AUDIT_LOG_FLUSH_MS', self.flush_interval * 1000) / 1000.0
+        self._queue = queue.Queue(maxsize=self.max_queue)
+        AuditLog.writer = self
+        atexit.register(self.stop)
+
+    def start(self):
+        pid = os.getpid()
+        if self._pid == pid and self._thread and self._thread.is_alive():
+            return
+        with self._stats_lock:
+            if self._pid != pid:
+                self._after_fork(pid)
+            elif self._thread and self._thread.is_alive():
+                return
+            self._start_thread()
+
+    def _after_fork(self, pid: int):
+        """
+        Reset state inherited from another process. Records queued before the
+        fork belong to the parent, which still writes them; locks may have been
+        held by a parent thread that does not exist here.
+        """
+        if self._pid is not None:
+            self._queue = queue.Queue(maxsize=self.max_queue)
+            self._flush_lock = threading.Lock()
+            self._stop = threading.Event()
+            self.stats.update(enqueued=0, written=0, dropped=0, failed=0, batches=0, last_flush_ms=None)
+        self._thread = None
+        self._pid = pid
+
+    def _start_thread(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='audit-log-writer', daemon=True)
+        self._thread.start()
+
+    def submit(self, log_data: Dict) -> bool:
+        """Queue one record; False if it was dropped because the queue is full"""
+        self.start()
+        try:
+            self._queue.put_nowait(log_data)
+            self._count('enqueued')
+            return True
+        except queue.Full:
+            self._count('dropped')
+            logger.warning(f"Audit log queue full, dropped {log_data.get('action')} record")
+            return False
+
+    def _count(self, key: str, amount: int = 1):
+        with self._stats_lock:
+            self.stats[key] += amount
+
+    def _drain(self, wait: bool) -> List[Dict]:
+        """Collect up to batch_size records, waiting at most one flush interval for the first"""
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            try:
+                if wait and timeout > 0:
+                    batch.append(self._queue.get(timeout=timeout))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch: List[Dict]):
+        start = time.perf_counter()
+        try:
+            if self.app is not None:
+                with self.app.app_context():
+                    result = AuditLog.bulk_create(batch)
+            else:
+                result = AuditLog.bulk_create(batch)
+            self._count('written', len(result['inserted_ids']))
+            self._count('failed', len(result['errors']))
+        except Exception as e:
+            self._count('failed', len(batch))
+            logger.error(f"Failed to write {len(batch)} audit logs: {str(e)}")
+        with self._stats_lock:
+            self.stats['batches'] += 1
+            self.stats['last_flush_ms'] = round((time.perf_counter() - start) * 1000, 3)
+
+    def _run(self):
+        while not self._stop.is_set():
+            # Wait for records without the lock so flush() is not held up by an idle interval
+            batch = self._drain(wait=True)
+            if batch:
+                with self._flush_lock:
+                    self._write(batch)
+
+    def flush(self):
+        """Write everything currently queued"""
+        while True:
+            batch = self._drain(wait=False)
+            if not batch:
+                break
+            with self._flush_lock:
+                self._write(batch)
+
+    def stop(self, timeout: float = 5.0):
+        """Stop the background thread and flush what is left"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+
+    def get_statistics(self) -> Dict:
+        with self._stats_lock:
+            stats = dict(self.stats)
+        return {
+            **stats,
+            'queue_depth': self._queue.qsize(),
+            'max_queue': self.max_queue,
+            'batch_size': self.batch_size,
+            'flush_interval_ms': int(self.flush_interval * 1000),
+            'running': bool(self._thread and self._thread.is_alive())
+        }
+
+
+# Global instance for easy import
+audit_writer = AuditLogWriter()
@@ -0,0 +1,174 @@
+# smart_app/backend/services/edge_matcher.py
+"""
+Signed face template bundles for polling-station kiosks.
+
+A bundle holds the int8-quantized, L2-normalized face templates and
+voter_ids of one polling station or constituency, signed with HMAC-SHA256.
+This module only needs numpy and the standard library so it can be copied
+to a kiosk as-is:
+
+    matcher = EdgeMatcher(open('bundle.sveb', 'rb').read(), signing_key)
+    result = matcher.verify('AB123456', encoding)
+    payload = matcher.sync_payload('kiosk-17')   # POST to /api/admin/edge/sync
+
+Layout (little endian):
+    magic b'SVEB' | format u16 | header length u32 | header JSON
+    | voter_ids (utf-8, newline separated) | int8 templates (count x dim)
+    | float32 row scales (count) | HMAC-SHA256 of everything before (32 bytes)
+"""
+import hmac
+import json
+import struct
+import hashlib
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+BUNDLE_MAGIC = b'SVEB'
+BUNDLE_FORMAT_VERSION = 1
+SIGNATURE_SIZE = 32
+_PREFIX = struct.Struct('<4sHI')
+
+
+def _signing_key(key) -> bytes:
+    return key.encode('utf-8') if isinstance(key, str) else key
+
+
+def quantize(encodings: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """L2-normalize rows and quantize them to int8 with one scale per row"""
+    encodings = np.asarray(encodings, dtype=np.float32)
+    norms = np.linalg.norm(encodings, axis=1, keepdims=True)
+    encodings = encodings / np.where(norms > 0, norms, 1)
+    scales = np.abs(encodings).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    quantized = np.clip(np.rint(encodings / scales[:, None]), -127, 127).astype(np.int8)
+    return quantized, scales.astype(np.float32)
+
+
+def pack_bundle(voter_ids: List[str], encodings, key, header: Dict) -> bytes:
+    """Serialize and sign a bundle"""
+    quantized, scales = quantize(encodings) if len(voter_ids) else (
+        np.zeros((0, 0), dtype=np.int8), np.zeros(0, dtype=np.float32))
+    ids_block = '\n'.join(voter_ids).encode('utf-8')
+
+    header = {
+        **header,
+        'count': len(voter_ids),
+        'dim': int(quantized.shape[1]) if quantized.ndim == 2 else 0,
+        'dtype': 'int8',
+        'ids_bytes': len(ids_block)
+    }
+    header_block = json.dumps(header, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+    body = b''.join([
+        _PREFIX.pack(BUNDLE_MAGIC, BUNDLE_FORMAT_VERSION, len(header_block)),
+        header_block,
+        ids_block,
+        quantized.tobytes(),
+        scales.astype('<f4').tobytes()
+    ])
+    return body + hmac.new(_signing_key(key), body, hashlib.sha256).digest()
+
+
+def unpack_bundle(data: bytes, key) -> Tuple[Dict, List[str], np.ndarray, np.ndarray]:
+    """Verify the signature and parse a bundle; raises ValueError if it is invalid"""
+    if len(data) < _PREFIX.size + SIGNATURE_SIZE:
+        raise ValueError("Bundle too short")
+
+    body, signature = data[:-SIGNATURE_SIZE], data[-SIGNATURE_SIZE:]
+    expected = hmac.new(_signing_key(key), body, hashlib.sha256).digest()
+    if not hmac.compare_digest(signature, expected):
+        raise ValueError("Bundle signature mismatch")
+
+    magic, version, header_len = _PREFIX.unpack_from(body, 0)
+    if magic != BUNDLE_MAGIC or version != BUNDLE_FORMAT_VERSION:
+        raise ValueError("Unsupported bundle format")
+
+    offset = _PREFIX.size
+    header = json.loads(body[offset:offset + header_len].decode('utf-8'))
+    offset += header_len
+
+    ids_block = body[offset:offset + header['ids_bytes']].decode('utf-8')
+    voter_ids = ids_block.split('\n') if header['count'] else []
+    offset += header['ids_bytes']
+
+    count, dim = header['count'], header['dim']
+    quantized = np.frombuffer(body, dtype=np.int8, count=count * dim, offset=offset).reshape(count, dim)
+    offset += count * dim
+    scales = np.frombuffer(body, dtype='<f4', count=count, offset=offset)
+
+    return header, voter_ids, quantized, scales
+
+
+def sign_payload(payload: Dict, key) -> str:
+    """HMAC of a sync payload (canonical JSON without its signature field)"""
+    unsigned = {k: v for k, v in payload.items() if k != 'signature'}
+    message = json.dumps(unsigned, sort_keys=True, separators=(',', ':'), default=str).encode('utf-8')
+    return hmac.new(_signing_key(key), message, hashlib.sha256).hexdigest()
+
+
+def verify_payload(payload: Dict, key) -> bool:
+    return hmac.compare_digest(payload.get('signature') or '', sign_payload(payload, key))
+
+
+class EdgeMatcher:
+    """In-process matcher over one bundle"""
+
+    def __init__(self, bundle: bytes, key, threshold: Optional[float] = None):
+        self.key = key
+        self.header, self.voter_ids, quantized, scales = unpack_bundle(bundle, key)
+        self.bundle_id = self.header.get('bundle_id')
+        self.threshold = threshold if threshold is not None else self.header.get('threshold', 0.70)
+        # Dequantize once; a polling station's roll fits comfortably in memory
+        self.templates = quantized.astype(np.float32) * scales[:, None]
+        self.rows = {voter_id: i for i, voter_id in enumerate(self.voter_ids)}
+        self.results = []
+
+    def _query(self, encoding) -> np.ndarray:
+        encoding = np.asarray(encoding, dtype=np.float32)
+        norm = np.linalg.norm(encoding)
+        return encoding / norm if norm > 0 else encoding
+
+    def verify(self, voter_id: str, encoding) -> Dict:
+        """1:1 check of a voter against their own template; the outcome is queued for sync"""
+        row = self.rows.get(voter_id)
+        similarity = float(self.templates[row] @ self._query(encoding)) if row is not None else 0.0
+        result = {
+            'voter_id': voter_id,
+            'verified': row is not None and similarity > self.threshold,
+            'similarity': round(similarity, 4),
+            'in_bundle': row is not None,
+            'verified_at': datetime.utcnow().isoformat()
+        }
+        self.results.append(result)
+        return result
+
+    def identify(self, encoding, k: int = 3) -> List[Dict]:
+        """1:N search within the bundle"""
+        if not self.voter_ids:
+            return []
+        scores = self.templates @ self._query(encoding)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [{
+            'voter_id': self.voter_ids[i],
+            'similarity': round(float(scores[i]), 4),
+            'is_match': float(scores[i]) > self.threshold
+        } for i in top]
+
+    def sync_payload(self, kiosk_id: str) -> Dict:
+        """Signed payload of queued results for POST /api/admin/edge/sync"""
+        payload = {
+            'bundle_id': self.bundle_id,
+            'kiosk_id': kiosk_id,
+            'results': list(self.results),
+            'sent_at': datetime.utcnow().isoformat()
+        }
+        payload['signature'] = sign_payload(payload, self.key)
+        return payload
+
+    def mark_synced(self, count: int):
+        """Drop results the server acknowledged"""
+        self.results = self.results[count:]
@@ -0,0 +1,163 @@
+# smart_app/backend/services/face_frame_cache.py
+import os
+import copy
+import time
+import base64
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Near-identical retries within this window get the cached result
+FRAME_CACHE_TTL = float(os.getenv('FACE_FRAME_CACHE_TTL', 30))
+# How long frame digests are remembered for replay checks
+FRAME_REPLAY_WINDOW = float(os.getenv('FACE_FRAME_REPLAY_WINDOW', 24 * 3600))
+# Max differing bits (of 64) for two dHashes to count as the same frame
+FRAME_HASH_MAX_DISTANCE = int(os.getenv('FACE_FRAME_HASH_MAX_DISTANCE', 6))
+FRAME_CACHE_MAX_ENTRIES = 2048
+FRAME_REPLAY_MAX_ENTRIES = 100000
+
+
+@dataclass
+class FrameFingerprint:
+    """Perceptual hash of the face crop and digest of the exact bytes"""
+    dhash: int
+    digest: str
+
+
+def dhash(gray_image: np.ndarray, hash_size: int = 8) -> int:
+    """64-bit difference hash of a grayscale image"""
+    resized = cv2.resize(gray_image, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    diff = resized[:, 1:] > resized[:, :-1]
+    return int(sum(1 << i for i, bit in enumerate(diff.flatten()) if bit))
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count('1')
+
+
+class FaceFrameCache:
+    """
+    Short TTL cache of face pipeline results keyed by operation, voter_id and
+    a dHash of the face crop. Also remembers exact frame digests per operation
+    for longer, to flag replays: a frame another voter already submitted, or a
+    frame that was accepted and is reused after the retry window. A voter
+    resubmitting their own rejected frame is not a replay.
+    """
+
+    def __init__(self, ttl: float = FRAME_CACHE_TTL, replay_window: float = FRAME_REPLAY_WINDOW,
+                 max_distance: int = FRAME_HASH_MAX_DISTANCE):
+        self.ttl = ttl
+        self.replay_window = replay_window
+        self.max_distance = max_distance
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # (operation, voter_id) -> [(dhash, stored_at, result), ...]
+        self._digests = OrderedDict()   # (operation, digest) -> (voter_id, seen_at, accepted), oldest first
+        self.stats = {'hits': 0, 'misses': 0, 'replays': 0}
+
+    def fingerprint(self, face_service, image_data: str) -> Optional[FrameFingerprint]:
+        """Hash the face crop of a base64 frame using the cheap downscaled decode"""
+        try:
+            if 'base64,' in image_data:
+                image_data = image_data.split('base64,')[1]
+            image_bytes = base64.b64decode(image_data)
+            digest = hashlib.sha256(image_bytes).hexdigest()
+
+            small = face_service.decode_downscaled(image_bytes, 160)
+            gray = cv2.cvtColor(small, cv2.COLOR_RGB2GRAY)
+            faces = face_service._detect_with_opencv(small)
+            if len(faces) == 1:
+                x, y, w, h = [int(v) for v in faces[0]['bbox']]
+                gray = gray[y:y+h, x:x+w]
+
+            return FrameFingerprint(dhash=dhash(gray), digest=digest)
+        except Exception as e:
+            logger.warning(f"Could not fingerprint frame: {str(e)}")
+            return None
+
+    def check_replay(self, fingerprint: FrameFingerprint, voter_id: str, operation: str) -> Optional[dict]:
+        """Record the frame digest for the operation; return replay info if the frame may not be reused"""
+        now = time.time()
+        key = (operation, fingerprint.digest)
+        with self._lock:
+            self._expire_digests(now)
+            seen = self._digests.get(key)
+            if seen is None:
+                self._digests[key] = (voter_id, now, False)
+                if len(self._digests) > FRAME_REPLAY_MAX_ENTRIES:
+                    self._digests.popitem(last=False)
+                return None
+
+            first_voter_id, seen_at, accepted = seen
+            if first_voter_id == voter_id and (not accepted or now - seen_at <= self.ttl):
+                # The voter retrying their own frame: it was rejected, or this is the retry window
+                return None
+
+            self.stats['replays'] += 1
+            return {
+                'first_seen_seconds_ago': round(now - seen_at, 1),
+                'same_voter': first_voter_id == voter_id,
+                'previously_accepted': accepted
+            }
+
+    def mark_accepted(self, operation: str, fingerprint: FrameFingerprint):
+        """Record that the frame passed; reusing it after the retry window is then a replay"""
+        key = (operation, fingerprint.digest)
+        with self._lock:
+            seen = self._digests.get(key)
+            if seen is not None:
+                self._digests[key] = (seen[0], time.time(), True)
+                self._digests.move_to_end(key)
+
+    def get(self, operation: str, voter_id: str, fingerprint: FrameFingerprint):
+        """Cached result for a near-identical frame, or None"""
+        now = time.time()
+        with self._lock:
+            entries = self._entries.get((operation, voter_id))
+            if entries:
+                entries[:] = [e for e in entries if now - e[1] <= self.ttl]
+                for frame_hash, stored_at, result in entries:
+                    if hamming_distance(frame_hash, fingerprint.dhash) <= self.max_distance:
+                        self.stats['hits'] += 1
+                        cached = copy.copy(result)
+                        cached.details = {**(result.details or {}), 'cache_hit': True,
+                                          'cached_seconds_ago': round(now - stored_at, 2)}
+                        return cached
+            self.stats['misses'] += 1
+            return None
+
+    def put(self, operation: str, voter_id: str, fingerprint: FrameFingerprint, result):
+        with self._lock:
+            key = (operation, voter_id)
+            self._entries.setdefault(key, []).append((fingerprint.dhash, time.time(), result))
+            self._entries.move_to_end(key)
+            while len(self._entries) > FRAME_CACHE_MAX_ENTRIES:
+                self._entries.popitem(last=False)
+
+    def _expire_digests(self, now: float):
+        while self._digests:
+            _, seen_at, _ = next(iter(self._digests.values()))
+            if now - seen_at <= self.replay_window:
+                break
+            self._digests.popitem(last=False)
+
+    def get_statistics(self) -> dict:
+        with self._lock:
+            return {
+                **self.stats,
+                'cached_keys': len(self._entries),
+                'tracked_digests': len(self._digests),
+                'ttl': self.ttl,
+                'replay_window': self.replay_window
+            }
+
+
+# Global instance for easy import
+face_frame_cache = FaceFrameCache()
@@ -0,0 +1,159 @@
+# smart_app/backend/services/face_metrics.py
+import os
+import time
+import random
+import logging
+import threading
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from typing import Dict, Optional
+
+from smart_app.backend.mongo_models import FaceStageTiming
+
+logger = logging.getLogger(__name__)
+
+# Histogram bucket upper bounds in milliseconds
+LATENCY_BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, float('inf')]
+
+# Fraction of hybrid calls whose stage timings are also written to MongoDB
+FACE_TIMING_SAMPLE_RATE = float(os.getenv('FACE_TIMING_SAMPLE_RATE', 0.0))
+
+
+class StageTimer:
+    """Collects wall time per pipeline stage for a single face operation"""
+
+    def __init__(self):
+        self.stages = {}
+        self.started_at = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            # Accumulate so a stage that runs twice (e.g. validation + detection) is summed
+            self.stages[name] = self.stages.get(name, 0.0) + (time.perf_counter() - start)
+
+    def total(self) -> float:
+        return time.perf_counter() - self.started_at
+
+    def as_dict(self) -> Dict[str, float]:
+        """Stage durations in milliseconds"""
+        return {name: round(seconds * 1000, 3) for name, seconds in self.stages.items()}
+
+
+class NullStageTimer:
+    """Timer used when the caller does not want stage timings"""
+
+    def stage(self, name: str):
+        return nullcontext()
+
+
+NULL_TIMER = NullStageTimer()
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram"""
+
+    def __init__(self):
+        self.counts = [0] * len(LATENCY_BUCKETS_MS)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, value_ms: float):
+        for i, bound in enumerate(LATENCY_BUCKETS_MS):
+            if value_ms <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.total_ms += value_ms
+        self.max_ms = max(self.max_ms, value_ms)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-th percentile"""
+        if self.count == 0:
+            return None
+        target = q / 100.0 * self.count
+        seen = 0
+        for bound, bucket_count in zip(LATENCY_BUCKETS_MS, self.counts):
+            seen += bucket_count
+            if seen >= target:
+                return self.max_ms if bound == float('inf') else bound
+        return self.max_ms
+
+    def snapshot(self) -> Dict:
+        return {
+            'count': self.count,
+            'mean_ms': round(self.total_ms / self.count, 3) if self.count else None,
+            'max_ms': round(self.max_ms, 3),
+            'p50_ms': self.percentile(50),
+            'p95_ms': self.percentile(95),
+            'p99_ms': self.percentile(99),
+            'buckets': {
+                ('+Inf' if bound == float('inf') else str(bound)): count
+                for bound, count in zip(LATENCY_BUCKETS_MS, self.counts)
+            }
+        }
+
+
+class HistogramRegistry:
+    """In-process registry of per-stage latency histograms, keyed by operation and stage"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self.started_at = datetime.utcnow()
+
+    def observe(self, operation: str, stage: str, seconds: float):
+        with self._lock:
+            key = (operation, stage)
+            if key not in self._histograms:
+                self._histograms[key] = LatencyHistogram()
+            self._histograms[key].observe(seconds * 1000)
+
+    def observe_timer(self, operation: str, timer: StageTimer, total_seconds: float = None):
+        with self._lock:
+            for stage, seconds in list(timer.stages.items()) + [('total', total_seconds or timer.total())]:
+                key = (operation, stage)
+                if key not in self._histograms:
+                    self._histograms[key] = LatencyHistogram()
+                self._histograms[key].observe(seconds * 1000)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            result = {}
+            for (operation, stage), histogram in sorted(self._histograms.items()):
+                result.setdefault(operation, {})[stage] = histogram.snapshot()
+            return {
+                'since': self.started_at.isoformat(),
+                'operations': result
+            }
+
+    def reset(self):
+        with self._lock:
+            self._histograms = {}
+            self.started_at = datetime.utcnow()
+
+
+# Global registry for easy import
+face_metrics = HistogramRegistry()
+
+
+def record_face_timings(operation: str, timer: StageTimer, voter_id: str = None,
+                        outcome: str = None, total_seconds: float = None):
+    """Feed one operation's stage timings into the registry and optionally sample them to MongoDB"""
+    face_metrics.observe_timer(operation, timer, total_seconds)
+
+    if FACE_TIMING_SAMPLE_RATE > 0 and random.random() < FACE_TIMING_SAMPLE_RATE:
+        try:
+            FaceStageTiming.create_sample(
+                operation=operation,
+                stages=timer.as_dict(),
+                total_ms=round((total_seconds or timer.total()) * 1000, 3),
+                voter_id=voter_id,
+                outcome=outcome
+            )
+        except Exception as e:
+            logger.warning(f"Could not sample face stage timings: {str(e)}")
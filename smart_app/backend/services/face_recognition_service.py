@@ -7,11 +7,17 @@ import logging
 import time
 import base64
 import io
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Tuple, Dict, Optional, Any
 from dataclasses import dataclass
 from datetime import datetime
 from PIL import Image
 
+from smart_app.backend.services.face_metrics import StageTimer, NULL_TIMER, face_metrics, record_face_timings
+from smart_app.backend.services.face_frame_cache import face_frame_cache
+from smart_app.backend.mongo_models import Voter, FaceIndexState, FaceIndexDelta
+
 # ============================================
 # INITIALIZE ALL AVAILABILITY VARIABLES FIRST
 # ============================================
@@ -69,6 +75,18 @@ except Exception as e:
 from sklearn.neighbors import NearestNeighbors
 import joblib
 
+# 'local': each process keeps its own pickled index
+# 'shared': one memory-mapped index per host kept in sync through MongoDB deltas (opt-in)
+FACE_INDEX_MODE = os.getenv('FACE_INDEX_MODE', 'local')
+FACE_INDEX_DIR = os.getenv('FACE_INDEX_DIR', 'data/face_index')
+FACE_INDEX_SYNC_INTERVAL = float(os.getenv('FACE_INDEX_SYNC_INTERVAL', 1.0))  # seconds between version checks
+FACE_INDEX_COMPACT_EVERY = int(os.getenv('FACE_INDEX_COMPACT_EVERY', 1000))  # deltas before a new snapshot
+FACE_INDEX_GAP_TIMEOUT = 10.0  # seconds to wait for a reserved but unwritten delta
+FACE_INDEX_LATE_DELTA_TIMEOUT = 3600.0  # seconds a skipped version is still looked for (its writer may have died)
+# Snapshot scans are split into up to this many shards searched in parallel
+FACE_INDEX_SHARDS = int(os.getenv('FACE_INDEX_SHARDS', os.cpu_count() or 1))
+FACE_INDEX_SHARD_MIN_ROWS = int(os.getenv('FACE_INDEX_SHARD_MIN_ROWS', 50000))  # smaller shards cost more than they save
+
 @dataclass
 class FaceRecognitionResult:
     """Unified result structure for face recognition"""
@@ -79,6 +97,8 @@ class FaceRecognitionResult:
     processing_time: float = 0.0
     details: Dict = None
     quality_score: float = 0.0
+    encodings: Dict = None
+    stage_timings: Dict = None  # stage name -> milliseconds
 
 class MultiMethodFaceService:
     """Face service using multiple detection/recognition methods"""
@@ -144,23 +164,46 @@ class MultiMethodFaceService:
             
             # Decode base64
             image_bytes = base64.b64decode(image_data)
-            
+
+            return self.bytes_to_image(image_bytes)
+        except ValueError:
+            raise
+        except Exception as e:
+            logger.error(f"Image conversion error: {str(e)}")
+            raise ValueError(f"Invalid image data: {str(e)}")
+
+    def bytes_to_image(self, image_bytes: bytes) -> np.ndarray:
+        """Convert encoded image bytes (JPEG/PNG) to an RGB numpy array"""
+        try:
             # Convert to numpy array
             image = Image.open(io.BytesIO(image_bytes))
             image_array = np.array(image)
-            
+
             # Convert to RGB if needed
             if len(image_array.shape) == 2:  # Grayscale
                 image_array = cv2.cvtColor(image_array, cv2.COLOR_GRAY2RGB)
             elif image_array.shape[2] == 4:  # RGBA
                 image_array = cv2.cvtColor(image_array, cv2.COLOR_RGBA2RGB)
             # RGB (3 channels) stays as is
-            
+
             return image_array
         except Exception as e:
             logger.error(f"Image conversion error: {str(e)}")
             raise ValueError(f"Invalid image data: {str(e)}")
     
+    def decode_downscaled(self, image_bytes: bytes, max_side: int = 160) -> np.ndarray:
+        """Decode image bytes straight to a small RGB array (JPEG is decoded at reduced scale)"""
+        try:
+            image = Image.open(io.BytesIO(image_bytes))
+            # draft() lets libjpeg skip most of the IDCT work for a downscaled decode
+            image.draft('RGB', (max_side, max_side))
+            image = image.convert('RGB')
+            image.thumbnail((max_side, max_side))
+            return np.array(image)
+        except Exception as e:
+            logger.error(f"Image conversion error: {str(e)}")
+            raise ValueError(f"Invalid image data: {str(e)}")
+    
     def preprocess_image(self, image_array: np.ndarray) -> np.ndarray:
         """Preprocess image for better face recognition"""
         try:
@@ -191,35 +234,60 @@ class MultiMethodFaceService:
             logger.error(f"Image preprocessing error: {str(e)}")
             return image_array
     
-    def detect_faces_multi_method(self, image_array: np.ndarray) -> List[Dict]:
+    def detect_faces_multi_method(self, image_array: np.ndarray, timer=None) -> List[Dict]:
         """Detect faces using multiple methods for robustness"""
+        timer = timer or NULL_TIMER
         faces = []
         rgb_image = cv2.cvtColor(image_array, cv2.COLOR_BGR2RGB)
         
         # Method 1: MediaPipe (fast and accurate)
         if MEDIAPIPE_AVAILABLE:
-            mp_faces = self._detect_with_mediapipe(rgb_image)
+            with timer.stage('detect.mediapipe'):
+                mp_faces = self._detect_with_mediapipe(rgb_image)
             faces.extend(mp_faces)
         
         # Method 2: OpenCV (reliable fallback)
-        cv_faces = self._detect_with_opencv(image_array)
+        with timer.stage('detect.opencv'):
+            cv_faces = self._detect_with_opencv(image_array)
         faces.extend(cv_faces)
         
         # Method 3: Dlib (accurate but slower)
         if DLIB_AVAILABLE:
-            dlib_faces = self._detect_with_dlib(rgb_image)
+            with timer.stage('detect.dlib'):
+                dlib_faces = self._detect_with_dlib(rgb_image)
             faces.extend(dlib_faces)
         
         # Method 4: face_recognition library
         if FACE_RECOGNITION_AVAILABLE:
-            fr_faces = self._detect_with_face_recognition(rgb_image)
+            with timer.stage('detect.face_recognition'):
+                fr_faces = self._detect_with_face_recognition(rgb_image)
             faces.extend(fr_faces)
         
         # Remove duplicates and merge results
-        unique_faces = self._merge_face_detections(faces)
+        with timer.stage('fuse'):
+            unique_faces = self._merge_face_detections(faces)
         
         return unique_faces
     
+    def detect_faces_in_roi(self, image_array: np.ndarray, roi_bbox: Tuple, margin: float = 0.5,
+                            timer=None) -> List[Dict]:
+        """Detect faces only inside a region around a previously found bbox"""
+        img_h, img_w = image_array.shape[:2]
+        x, y, w, h = [int(v) for v in roi_bbox]
+        pad_x, pad_y = int(w * margin), int(h * margin)
+        x0, y0 = max(0, x - pad_x), max(0, y - pad_y)
+        x1, y1 = min(img_w, x + w + pad_x), min(img_h, y + h + pad_y)
+        if x1 - x0 < 40 or y1 - y0 < 40:
+            return []
+        
+        faces = self.detect_faces_multi_method(image_array[y0:y1, x0:x1], timer)
+        
+        # Map boxes back to full-frame coordinates
+        for face in faces:
+            fx, fy, fw, fh = face['bbox']
+            face['bbox'] = (int(fx) + x0, int(fy) + y0, int(fw), int(fh))
+        return faces
+    
     def _detect_with_mediapipe(self, rgb_image: np.ndarray) -> List[Dict]:
         """Face detection using MediaPipe"""
         faces = []
@@ -397,53 +465,119 @@ class MultiMethodFaceService:
         
         return merged_faces
     
-    def extract_face_encoding_multi_method(self, image_array: np.ndarray, face_bbox: Tuple) -> Dict[str, Any]:
+    def get_available_encoders(self) -> List[str]:
+        """Names of the encoding methods usable in this process"""
+        encoders = []
+        if FACE_RECOGNITION_AVAILABLE:
+            encoders.append('face_recognition')
+        if DEEPFACE_AVAILABLE:
+            encoders.append('deepface_facenet')
+        if DLIB_AVAILABLE and getattr(self, 'dlib_predictor', None):
+            encoders.append('dlib')
+        return encoders
+
+    def get_index_methods(self) -> List[str]:
+        """Encodings a KNN index can be built from: each encoder, plus 'ensemble' when there are two or more"""
+        encoders = self.get_available_encoders()
+        return encoders + ['ensemble'] if len(encoders) >= 2 else encoders
+    
+    def get_query_encoder(self) -> Optional[str]:
+        """Encoding live searches query the KNN index with (see extract_face_encoding_multi_method)"""
+        encoders = self.get_available_encoders()
+        if len(encoders) >= 2:
+            return 'ensemble'
+        return encoders[0] if encoders else None
+
+    def _encode_with_face_recognition(self, face_region: np.ndarray) -> Optional[List[float]]:
+        """Face encoding using face_recognition library"""
+        try:
+            rgb_face = cv2.cvtColor(face_region, cv2.COLOR_BGR2RGB)
+            face_encodings = face_recognition.face_encodings(rgb_face)
+            if face_encodings:
+                return face_encodings[0].tolist()
+        except Exception as e:
+            logger.error(f"face_recognition encoding error: {str(e)}")
+        return None
+
+    def _encode_with_deepface(self, face_region: np.ndarray) -> Optional[List[float]]:
+        """Face encoding using DeepFace Facenet"""
+        try:
+            # DeepFace expects BGR for OpenCV
+            bgr_face = cv2.cvtColor(face_region, cv2.COLOR_RGB2BGR)
+            embedding = DeepFace.represent(
+                bgr_face,
+                model_name='Facenet',
+                enforce_detection=False
+            )
+            if embedding:
+                return embedding[0]['embedding']
+        except Exception as e:
+            logger.error(f"DeepFace encoding error: {str(e)}")
+        return None
+
+    def _encode_with_dlib(self, face_region: np.ndarray) -> Optional[List[float]]:
+        """Face encoding using Dlib ResNet model"""
+        try:
+            h, w = face_region.shape[:2]
+            rgb_face = cv2.cvtColor(face_region, cv2.COLOR_BGR2RGB)
+            dlib_rect = dlib.rectangle(0, 0, w, h)
+            shape = self.dlib_predictor(rgb_face, dlib_rect)
+            face_encoding = self.dlib_face_encoder.compute_face_descriptor(rgb_face, shape)
+            return list(face_encoding)
+        except Exception as e:
+            logger.error(f"Dlib encoding error: {str(e)}")
+        return None
+
+    def extract_face_encoding(self, image_array: np.ndarray, face_bbox: Tuple, method: str) -> Optional[List[float]]:
+        """Extract face encoding with a single named method"""
+        if method not in self.get_available_encoders():
+            raise ValueError(f"Encoding method not available: {method}")
+
+        x, y, w, h = face_bbox
+        face_region = image_array[y:y+h, x:x+w]
+        if face_region.size == 0:
+            return None
+
+        encoders = {
+            'face_recognition': self._encode_with_face_recognition,
+            'deepface_facenet': self._encode_with_deepface,
+            'dlib': self._encode_with_dlib
+        }
+        return encoders[method](face_region)
+
+    def extract_face_encoding_multi_method(self, image_array: np.ndarray, face_bbox: Tuple, timer=None) -> Dict[str, Any]:
         """Extract face encoding using multiple methods"""
+        timer = timer or NULL_TIMER
         encodings = {}
         x, y, w, h = face_bbox
-        
+
         # Extract face region
         face_region = image_array[y:y+h, x:x+w]
-        
+
         if face_region.size == 0:
             return encodings
-        
+
         # Method 1: face_recognition library
         if FACE_RECOGNITION_AVAILABLE:
-            try:
-                rgb_face = cv2.cvtColor(face_region, cv2.COLOR_BGR2RGB)
-                face_encodings = face_recognition.face_encodings(rgb_face)
-                if face_encodings:
-                    encodings['face_recognition'] = face_encodings[0].tolist()
-            except Exception as e:
-                logger.error(f"face_recognition encoding error: {str(e)}")
-        
+            with timer.stage('encode.face_recognition'):
+                encoding = self._encode_with_face_recognition(face_region)
+            if encoding:
+                encodings['face_recognition'] = encoding
+
         # Method 2: DeepFace
         if DEEPFACE_AVAILABLE:
-            try:
-                # DeepFace expects BGR for OpenCV
-                bgr_face = cv2.cvtColor(face_region, cv2.COLOR_RGB2BGR)
-                embedding = DeepFace.represent(
-                    bgr_face,
-                    model_name='Facenet',
-                    enforce_detection=False
-                )
-                if embedding:
-                    encodings['deepface_facenet'] = embedding[0]['embedding']
-            except Exception as e:
-                logger.error(f"DeepFace encoding error: {str(e)}")
-        
+            with timer.stage('encode.deepface_facenet'):
+                encoding = self._encode_with_deepface(face_region)
+            if encoding:
+                encodings['deepface_facenet'] = encoding
+
         # Method 3: Dlib (if shape predictor available)
         if DLIB_AVAILABLE and hasattr(self, 'dlib_predictor') and self.dlib_predictor:
-            try:
-                rgb_face = cv2.cvtColor(face_region, cv2.COLOR_BGR2RGB)
-                dlib_rect = dlib.rectangle(0, 0, w, h)
-                shape = self.dlib_predictor(rgb_face, dlib_rect)
-                face_encoding = self.dlib_face_encoder.compute_face_descriptor(rgb_face, shape)
-                encodings['dlib'] = list(face_encoding)
-            except Exception as e:
-                logger.error(f"Dlib encoding error: {str(e)}")
-        
+            with timer.stage('encode.dlib'):
+                encoding = self._encode_with_dlib(face_region)
+            if encoding:
+                encodings['dlib'] = encoding
+
         # Method 4: Create custom ensemble encoding
         if len(encodings) >= 2:
             # Combine encodings from different methods
@@ -454,7 +588,7 @@ class MultiMethodFaceService:
         
         return encodings
     
-    def validate_face_image(self, image_array: np.ndarray) -> Tuple[bool, str]:
+    def validate_face_image(self, image_array: np.ndarray, timer=None) -> Tuple[bool, str]:
         """Validate face image quality"""
         try:
             # Check image size
@@ -463,7 +597,7 @@ class MultiMethodFaceService:
                 return False, "Image too small (minimum 100x100 pixels)"
             
             # Check for faces
-            faces = self.detect_faces_multi_method(image_array)
+            faces = self.detect_faces_multi_method(image_array, timer)
             
             if len(faces) == 0:
                 return False, "No face detected"
@@ -509,61 +643,188 @@ class MultiMethodFaceService:
     def calculate_face_quality_score(self, image_array: np.ndarray, face_bbox: Tuple) -> float:
         """Calculate face quality score (0-1)"""
         try:
-            x, y, w, h = face_bbox
-            face_region = image_array[y:y+h, x:x+w]
-            
-            if face_region.size == 0:
-                return 0.0
-            
-            gray_face = cv2.cvtColor(face_region, cv2.COLOR_RGB2GRAY)
-            
-            # 1. Brightness score (ideal: 127)
-            brightness = np.mean(gray_face)
-            brightness_score = 1.0 - abs(brightness - 127) / 127
-            
-            # 2. Contrast score
-            contrast = np.std(gray_face)
-            contrast_score = min(contrast / 50, 1.0)
-            
-            # 3. Sharpness score
-            sharpness = cv2.Laplacian(gray_face, cv2.CV_64F).var()
-            sharpness_score = min(sharpness / 100, 1.0)
-            
-            # 4. Face proportion score
-            image_area = image_array.shape[0] * image_array.shape[1]
-            face_area = w * h
-            proportion = face_area / image_area
-            # Ideal proportion: 20-40% of image
-            if 0.2 <= proportion <= 0.4:
-                proportion_score = 1.0
-            else:
-                proportion_score = 1.0 - min(abs(proportion - 0.3) / 0.3, 1.0)
-            
-            # 5. Face alignment (check if eyes are level)
-            # Simple check: face should be roughly centered
-            img_center_x = image_array.shape[1] / 2
-            img_center_y = image_array.shape[0] / 2
-            face_center_x = x + w / 2
-            face_center_y = y + h / 2
-            
-            x_offset = abs(face_center_x - img_center_x) / img_center_x
-            y_offset = abs(face_center_y - img_center_y) / img_center_y
-            alignment_score = 1.0 - (x_offset + y_offset) / 2
-            
-            # Weighted average
-            quality_score = (
-                brightness_score * 0.2 +
-                contrast_score * 0.2 +
-                sharpness_score * 0.25 +
-                proportion_score * 0.2 +
-                alignment_score * 0.15
-            )
-            
-            return max(0.0, min(quality_score, 1.0))
+            components = self.face_quality_components(image_array, face_bbox)
+            return components['quality_score'] if components else 0.0
             
         except Exception as e:
             logger.error(f"Quality score calculation error: {str(e)}")
             return 0.0
+    
+    def face_quality_components(self, image_array: np.ndarray, face_bbox: Tuple) -> Optional[Dict[str, float]]:
+        """Raw measurements and weighted sub-scores behind the face quality score"""
+        x, y, w, h = face_bbox
+        face_region = image_array[y:y+h, x:x+w]
+        
+        if face_region.size == 0:
+            return None
+        
+        gray_face = cv2.cvtColor(face_region, cv2.COLOR_RGB2GRAY)
+        
+        # 1. Brightness score (ideal: 127)
+        brightness = np.mean(gray_face)
+        brightness_score = 1.0 - abs(brightness - 127) / 127
+        
+        # 2. Contrast score
+        contrast = np.std(gray_face)
+        contrast_score = min(contrast / 50, 1.0)
+        
+        # 3. Sharpness score
+        sharpness = cv2.Laplacian(gray_face, cv2.CV_64F).var()
+        sharpness_score = min(sharpness / 100, 1.0)
+        
+        # 4. Face proportion score
+        image_area = image_array.shape[0] * image_array.shape[1]
+        face_area = w * h
+        proportion = face_area / image_area
+        # Ideal proportion: 20-40% of image
+        if 0.2 <= proportion <= 0.4:
+            proportion_score = 1.0
+        else:
+            proportion_score = 1.0 - min(abs(proportion - 0.3) / 0.3, 1.0)
+        
+        # 5. Face alignment (check if eyes are level)
+        # Simple check: face should be roughly centered
+        img_center_x = image_array.shape[1] / 2
+        img_center_y = image_array.shape[0] / 2
+        face_center_x = x + w / 2
+        face_center_y = y + h / 2
+        
+        x_offset = abs(face_center_x - img_center_x) / img_center_x
+        y_offset = abs(face_center_y - img_center_y) / img_center_y
+        alignment_score = 1.0 - (x_offset + y_offset) / 2
+        
+        # Weighted average
+        quality_score = (
+            brightness_score * 0.2 +
+            contrast_score * 0.2 +
+            sharpness_score * 0.25 +
+            proportion_score * 0.2 +
+            alignment_score * 0.15
+        )
+        
+        return {
+            'brightness': float(brightness),
+            'contrast': float(contrast),
+            'sharpness': float(sharpness),
+            'proportion': float(proportion),
+            'x_offset': float(x_offset),
+            'y_offset': float(y_offset),
+            'brightness_score': float(brightness_score),
+            'contrast_score': float(contrast_score),
+            'sharpness_score': float(sharpness_score),
+            'proportion_score': float(proportion_score),
+            'alignment_score': float(alignment_score),
+            'quality_score': float(max(0.0, min(quality_score, 1.0)))
+        }
+    
+    def probe_face_quality(self, image_bytes: bytes, max_side: int = 160,
+                           quality_threshold: float = 0.60) -> Dict[str, Any]:
+        """
+        Cheap capture-time quality check: one fast detector on a heavily
+        downscaled frame plus the quality score math. Sharpness is measured
+        on the small frame, so treat it as guidance only.
+        """
+        start_time = time.perf_counter()
+        image_array = self.decode_downscaled(image_bytes, max_side)
+        img_h, img_w = image_array.shape[:2]
+        
+        # Haar cascade only: the MediaPipe path builds a new graph per call
+        faces = self._detect_with_opencv(image_array)
+        
+        issues = []
+        components = None
+        bbox = None
+        if not faces:
+            issues.append('No face detected')
+        elif len(faces) > 1:
+            issues.append('Multiple faces detected')
+        else:
+            x, y, w, h = [int(v) for v in faces[0]['bbox']]
+            components = self.face_quality_components(image_array, (x, y, w, h))
+            # Relative box so the client can draw it on any preview size
+            bbox = [round(x / img_w, 4), round(y / img_h, 4), round(w / img_w, 4), round(h / img_h, 4)]
+        
+        if components:
+            if components['brightness'] < 30:
+                issues.append('Image too dark')
+            elif components['brightness'] > 220:
+                issues.append('Image too bright')
+            if components['proportion'] < 0.1:
+                issues.append('Move closer to the camera')
+            elif components['proportion'] > 0.8:
+                issues.append('Move back from the camera')
+            if max(components['x_offset'], components['y_offset']) > 0.25:
+                issues.append('Center your face in the frame')
+            if components['sharpness_score'] < 0.5:
+                issues.append('Image is blurry, hold still')
+        
+        quality_score = components['quality_score'] if components else 0.0
+        elapsed = time.perf_counter() - start_time
+        face_metrics.observe('probe', 'total', elapsed)
+        
+        return {
+            'ready': not issues and quality_score >= quality_threshold,
+            'quality_score': round(quality_score, 4),
+            'quality_threshold': quality_threshold,
+            'face_count': len(faces),
+            'face_bbox': bbox,
+            'issues': issues,
+            'guidance': issues[0] if issues else 'Looks good, hold still',
+            'components': {k: round(v, 4) for k, v in components.items()} if components else None,
+            'detector': faces[0]['method'] if faces else None,
+            'processing_ms': round(elapsed * 1000, 3)
+        }
+
+def partition_key(state, constituency) -> str:
+    """Index partition a voter belongs to"""
+    return f"{(state or '').strip()}|{(constituency or '').strip()}"
+
+def partition_matches(key: str, state: str = None, constituency: str = None) -> bool:
+    """Whether a partition key passes the state/constituency filters"""
+    key_state, _, key_constituency = key.partition('|')
+    if state and key_state.lower() != state.strip().lower():
+        return False
+    if constituency and key_constituency.lower() != constituency.strip().lower():
+        return False
+    return True
+
+def lookup_voter_partitions(voter_ids) -> List[str]:
+    """Partition keys of voters from the voters collection ('' when unknown)"""
+    voter_ids = list(voter_ids)
+    found = {}
+    try:
+        for i in range(0, len(voter_ids), 1000):
+            voters = Voter.get_collection().find(
+                {"voter_id": {"$in": voter_ids[i:i + 1000]}},
+                {"voter_id": 1, "state": 1, "constituency": 1}
+            )
+            for voter in voters:
+                found[voter['voter_id']] = partition_key(voter.get('state'), voter.get('constituency'))
+    except Exception as e:
+        logger.warning(f"Could not look up voter partitions: {str(e)}")
+    return [found.get(voter_id, '') for voter_id in voter_ids]
+
+def group_partition_rows(partitions) -> Dict[str, np.ndarray]:
+    """Row indices of each partition key"""
+    if len(partitions) == 0:
+        return {}
+    keys, inverse = np.unique(np.asarray(partitions, dtype=str), return_inverse=True)
+    order = np.argsort(inverse, kind='stable')
+    bounds = np.cumsum(np.bincount(inverse, minlength=len(keys)))[:-1]
+    return {str(key): rows for key, rows in zip(keys, np.split(order, bounds))}
+
+def select_partition_rows(groups: Dict[str, np.ndarray], state: str = None, constituency: str = None) -> np.ndarray:
+    """Row indices of every partition passing the filters"""
+    selected = [rows for key, rows in groups.items() if partition_matches(key, state, constituency)]
+    return np.concatenate(selected) if selected else np.zeros(0, dtype=np.int64)
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest finite scores, best first"""
+    k = min(k, int(np.isfinite(scores).sum()))
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
 
 class KNNFaceService:
     """KNN-based face similarity search service"""
@@ -573,6 +834,10 @@ class KNNFaceService:
         self.knn_model = None
         self.face_encodings = []
         self.voter_ids = []
+        self.partitions = []  # partition_key() per row, parallel to voter_ids
+        self._encodings_matrix = None
+        self._partition_rows = None
+        self._partitions_resolved = False
         self.threshold = 0.65  # Similarity threshold for duplicates
         self.k_neighbors = 5
         self.distance_metric = 'cosine'
@@ -591,6 +856,9 @@ class KNNFaceService:
                     self.knn_model = model_data.get('model')
                     self.face_encodings = model_data.get('encodings', [])
                     self.voter_ids = model_data.get('voter_ids', [])
+                    # Older models carry no partitions; they are resolved on the first filtered search
+                    self.partitions = model_data.get('partitions') or [''] * len(self.voter_ids)
+                self._cache_matrix()
                 logger.info(f"KNN model loaded with {len(self.face_encodings)} face encodings")
                 return True
         except Exception as e:
@@ -599,6 +867,43 @@ class KNNFaceService:
         self._initialize_model()
         return False
     
+    def reload_model(self):
+        """Swap in the model file from disk without a window where searches see an empty index"""
+        try:
+            with open(self.model_path, 'rb') as f:
+                model_data = pickle.load(f)
+            # Assign the fully loaded state in one step
+            voter_ids = model_data.get('voter_ids', [])
+            self.knn_model, self.face_encodings, self.voter_ids, self.partitions = (
+                model_data.get('model'),
+                model_data.get('encodings', []),
+                voter_ids,
+                model_data.get('partitions') or [''] * len(voter_ids)
+            )
+            self._partitions_resolved = False
+            self._cache_matrix()
+            logger.info(f"KNN model reloaded with {len(self.face_encodings)} face encodings")
+            return True
+        except Exception as e:
+            logger.error(f"Failed to reload KNN model: {str(e)}")
+            return False
+
+    def load_encodings(self, encodings, voter_ids, partitions=None):
+        """Replace the index contents in bulk and retrain once"""
+        normalized = []
+        for encoding in encodings:
+            encoding = np.asarray(encoding, dtype=np.float32)
+            norm = np.linalg.norm(encoding)
+            normalized.append(encoding / norm if norm > 0 else encoding)
+
+        self.face_encodings = normalized
+        self.voter_ids = list(voter_ids)
+        self.partitions = list(partitions) if partitions is not None else lookup_voter_partitions(self.voter_ids)
+        self._partitions_resolved = True
+        self.knn_model = None
+        self._initialize_model()
+        return len(self.face_encodings)
+
     def _initialize_model(self):
         """Initialize new KNN model"""
         if len(self.face_encodings) > 0:
@@ -619,10 +924,17 @@ class KNNFaceService:
         try:
             encodings_array = np.array(self.face_encodings, dtype=np.float32)
             self.knn_model.fit(encodings_array)
+            self._encodings_matrix = encodings_array
+            self._partition_rows = None
             logger.info(f"KNN model retrained with {len(self.face_encodings)} samples")
         except Exception as e:
             logger.error(f"Failed to retrain KNN model: {str(e)}")
     
+    def _cache_matrix(self):
+        """Dense copy of the encodings used by filtered searches"""
+        self._encodings_matrix = np.array(self.face_encodings, dtype=np.float32) if self.face_encodings else None
+        self._partition_rows = None
+    
     def save_model(self):
         """Save KNN model to disk"""
         try:
@@ -630,6 +942,7 @@ class KNNFaceService:
                 'model': self.knn_model,
                 'encodings': self.face_encodings,
                 'voter_ids': self.voter_ids,
+                'partitions': self.partitions,
                 'threshold': self.threshold,
                 'timestamp': datetime.now().isoformat(),
                 'version': '2.0'
@@ -648,9 +961,12 @@ class KNNFaceService:
             logger.error(f"Failed to save KNN model: {str(e)}")
             return False
     
-    def add_face_encoding(self, encoding, voter_id):
+    def add_face_encoding(self, encoding, voter_id, partition=None):
         """Add new face encoding to KNN model"""
         try:
+            if partition is None:
+                partition = lookup_voter_partitions([voter_id])[0]
+            
             if isinstance(encoding, list):
                 encoding = np.array(encoding, dtype=np.float32)
             
@@ -661,6 +977,7 @@ class KNNFaceService:
             
             self.face_encodings.append(encoding)
             self.voter_ids.append(voter_id)
+            self.partitions.append(partition)
             
             # Retrain with new data
             self._retrain_model()
@@ -674,11 +991,14 @@ class KNNFaceService:
             logger.error(f"Failed to add face encoding: {str(e)}")
             return False
     
-    def find_similar_faces(self, query_encoding, k=None):
-        """Find k most similar faces using KNN"""
+    def find_similar_faces(self, query_encoding, k=None, state=None, constituency=None):
+        """Find k most similar faces using KNN, optionally only within a state/constituency"""
         if k is None:
             k = self.k_neighbors
         
+        if state or constituency:
+            return self._find_in_partitions(query_encoding, k, state, constituency)
+        
         if len(self.face_encodings) == 0 or self.knn_model is None:
             return []
         
@@ -716,6 +1036,47 @@ class KNNFaceService:
             logger.error(f"KNN search failed: {str(e)}")
             return []
     
+    def _find_in_partitions(self, query_encoding, k, state=None, constituency=None):
+        """Exact search over the rows of matching partitions only"""
+        if len(self.face_encodings) == 0:
+            return []
+        
+        try:
+            if not self._partitions_resolved and '' in self.partitions:
+                self.partitions = lookup_voter_partitions(self.voter_ids)
+                self._partition_rows = None
+            self._partitions_resolved = True
+            
+            if self._encodings_matrix is None:
+                self._cache_matrix()
+            if self._partition_rows is None:
+                self._partition_rows = group_partition_rows(self.partitions)
+            
+            rows = select_partition_rows(self._partition_rows, state, constituency)
+            if len(rows) == 0:
+                return []
+            
+            query = np.asarray(query_encoding, dtype=np.float32)
+            norm = np.linalg.norm(query)
+            if norm > 0:
+                query = query / norm
+            
+            scores = self._encodings_matrix[rows] @ query
+            results = []
+            for idx in top_k_indices(scores, k):
+                similarity = float(scores[idx])
+                results.append({
+                    'voter_id': self.voter_ids[rows[idx]],
+                    'distance': 1 - similarity,
+                    'similarity': similarity,
+                    'is_match': similarity > self.threshold,
+                    'rank': len(results) + 1
+                })
+            return results
+        except Exception as e:
+            logger.error(f"Partitioned KNN search failed: {str(e)}")
+            return []
+    
     def find_duplicate(self, query_encoding):
         """Check if face is duplicate (already registered)"""
         similar_faces = self.find_similar_faces(query_encoding, k=3)
@@ -784,6 +1145,7 @@ class KNNFaceService:
             'total_encodings': len(self.face_encodings),
             'unique_voters': len(set(self.voter_ids)),
             'model_trained': self.knn_model is not None,
+            'partitions': len(set(self.partitions)),
             'threshold': self.threshold,
             'distance_metric': self.distance_metric,
             'model_path': self.model_path
@@ -798,6 +1160,7 @@ class KNNFaceService:
             for idx in sorted(indices_to_remove, reverse=True):
                 self.face_encodings.pop(idx)
                 self.voter_ids.pop(idx)
+                self.partitions.pop(idx)
             
             # Retrain model
             self._retrain_model()
@@ -809,6 +1172,450 @@ class KNNFaceService:
             logger.error(f"Failed to remove face encoding: {str(e)}")
             return False
 
+@dataclass(frozen=True)
+class SharedIndexView:
+    """Point-in-time view of the shared index; replaced as a whole on every update"""
+    vectors: Any = None           # memory-mapped snapshot matrix
+    voter_ids: Any = None         # memory-mapped snapshot voter_ids
+    groups: Dict = None           # partition key -> snapshot rows
+    removed_mask: Any = None      # snapshot rows of removed voters
+    delta_vectors: Any = None
+    delta_ids: Tuple = ()
+    delta_partitions: Tuple = ()
+
+class SharedKNNFaceService(KNNFaceService):
+    """
+    KNN index shared by all worker processes on a host.
+
+    The base of the index is a snapshot written as .npy files and
+    memory-mapped read-only, so the OS page cache holds a single copy for
+    every worker. Changes made after the snapshot go to an ordered delta log
+    in MongoDB with a version counter; workers poll the counter and apply new
+    deltas incrementally instead of reloading. Compaction folds the deltas
+    into a new snapshot. Rows carry the voter's state/constituency partition
+    so filtered searches only scan matching partitions.
+    """
+    
+    def __init__(self, model_path='data/face_knn_model.pkl', index_dir=FACE_INDEX_DIR,
+                 sync_interval=FACE_INDEX_SYNC_INTERVAL, compact_every=FACE_INDEX_COMPACT_EVERY):
+        self.index_dir = index_dir
+        self.sync_interval = sync_interval
+        self.compact_every = compact_every
+        self.version = -1            # last delta version applied locally
+        self.snapshot_version = -1   # version of the mapped snapshot
+        self._lock = threading.RLock()
+        self._last_sync = 0.0
+        self._gap_since = None
+        self._snapshot = (None, None, {})  # (vectors, voter_ids, partition rows)
+        self._delta_encodings = []
+        self._delta_ids = []
+        self._delta_partitions = []
+        self._removed = set()
+        self._late = {}              # skipped version -> time first missed; applied when the delta shows up
+        self._view = SharedIndexView()
+        self._pool = None  # shard scan threads, created on the first large search
+        
+        os.makedirs(index_dir, exist_ok=True)
+        
+        # The local pickle only seeds the very first snapshot
+        super().__init__(model_path)
+    
+    # ---------- synchronisation ----------
+    
+    def sync(self):
+        """Catch up with the shared version: map a newer snapshot, then apply newer deltas"""
+        with self._lock:
+            self._last_sync = time.time()
+            try:
+                state = FaceIndexState.get_state()
+                if not state or state.get('snapshot_version', -1) < 0:
+                    state = self._bootstrap()
+                
+                if state['snapshot_version'] > self.snapshot_version:
+                    self._map_snapshot(state)
+                
+                if state.get('version', 0) > self.version:
+                    self._apply_deltas(FaceIndexDelta.find_since(self.version))
+                if self._late:
+                    self._apply_late_deltas()
+            except Exception as e:
+                logger.warning(f"Shared face index sync failed, serving version {self.version}: {str(e)}")
+            return self.version
+    
+    def _sync_if_due(self):
+        if time.time() - self._last_sync >= self.sync_interval:
+            self.sync()
+    
+    def _bootstrap(self):
+        """Publish the local pickle as snapshot 0 if no worker has done it yet"""
+        FaceIndexState.ensure_state()
+        vectors = self._as_matrix(self.face_encodings)
+        partitions = lookup_voter_partitions(self.voter_ids)
+        path = self._write_snapshot(vectors, self.voter_ids, partitions, 0)
+        FaceIndexState.publish_snapshot(0, path, len(self.voter_ids))
+        logger.info(f"Shared face index bootstrapped with {len(self.voter_ids)} encodings")
+        return FaceIndexState.get_state()
+    
+    def _map_snapshot(self, state):
+        path = state['snapshot_path']
+        vectors = np.load(f"{path}.vectors.npy", mmap_mode='r')
+        voter_ids = np.load(f"{path}.ids.npy", mmap_mode='r')
+        # Snapshots written before partitioning have no partitions file
+        partitions_path = f"{path}.partitions.npy"
+        partitions = np.load(partitions_path) if os.path.exists(partitions_path) else [''] * len(voter_ids)
+        groups = group_partition_rows(partitions)
+        
+        self._snapshot = (vectors, voter_ids, groups)
+        self.snapshot_version = state['snapshot_version']
+        self.version = self.snapshot_version
+        self._delta_encodings, self._delta_ids, self._delta_partitions = [], [], []
+        self._removed = set()
+        # Versions the snapshot could not include because their deltas were not written yet
+        self._late = {version: time.time() for version in state.get('missing_versions') or []}
+        self._gap_since = None
+        self._rebuild_view()
+        
+        # Free the bootstrap copy once the shared snapshot is mapped
+        self.face_encodings, self.voter_ids, self.partitions = [], [], []
+        logger.info(f"Mapped face index snapshot v{self.snapshot_version} ({len(voter_ids)} encodings)")
+    
+    def _apply_deltas(self, deltas):
+        applied = 0
+        for delta in deltas:
+            if delta['version'] != self.version + 1:
+                # A writer reserved a version but has not inserted its delta yet
+                if self._gap_since is None:
+                    self._gap_since = time.time()
+                if time.time() - self._gap_since < FACE_INDEX_GAP_TIMEOUT:
+                    break
+                logger.warning(f"Skipping missing face index versions {self.version + 1}..{delta['version'] - 1}, "
+                               f"will apply them if they arrive")
+                for version in range(self.version + 1, delta['version']):
+                    self._late.setdefault(version, time.time())
+            self._gap_since = None
+            
+            self._apply_delta(delta)
+            self.version = delta['version']
+            applied += 1
+        
+        if applied:
+            self._rebuild_view()
+        return applied
+    
+    def _apply_late_deltas(self):
+        """Apply deltas for versions skipped earlier whose writers have since inserted them
+        
+        A late delta is dropped if the voter has a newer delta: replaying it
+        out of order would undo that change (e.g. a late remove deleting a
+        newer add).
+        """
+        deltas = FaceIndexDelta.find_versions(list(self._late))
+        applied = 0
+        for delta in deltas:
+            self._late.pop(delta['version'], None)
+            if FaceIndexDelta.has_newer(delta['voter_id'], delta['version']):
+                logger.warning(f"Dropping late face index v{delta['version']} ({delta['op']} {delta['voter_id']}), "
+                               f"superseded by a newer change")
+                continue
+            self._apply_delta(delta)
+            applied += 1
+        
+        expired = [v for v, since in self._late.items() if time.time() - since > FACE_INDEX_LATE_DELTA_TIMEOUT]
+        for version in expired:
+            del self._late[version]
+        if expired:
+            logger.warning(f"Face index versions {sorted(expired)} never arrived, no longer waiting for them")
+        
+        if applied:
+            self._rebuild_view()
+        return applied
+    
+    def _apply_delta(self, delta):
+        if delta['op'] == 'add':
+            self._delta_encodings.append(self._normalize(delta['encoding']))
+            self._delta_ids.append(delta['voter_id'])
+            self._delta_partitions.append(delta.get('partition') or '')
+        elif delta['op'] == 'remove':
+            keep = [i for i, vid in enumerate(self._delta_ids) if vid != delta['voter_id']]
+            self._delta_encodings = [self._delta_encodings[i] for i in keep]
+            self._delta_ids = [self._delta_ids[i] for i in keep]
+            self._delta_partitions = [self._delta_partitions[i] for i in keep]
+            self._removed.add(delta['voter_id'])
+    
+    def _rebuild_view(self):
+        vectors, voter_ids, groups = self._snapshot
+        removed_mask = None
+        if self._removed and voter_ids is not None and len(voter_ids):
+            removed_mask = np.isin(voter_ids, list(self._removed))
+        self._view = SharedIndexView(
+            vectors=vectors,
+            voter_ids=voter_ids,
+            groups=groups,
+            removed_mask=removed_mask,
+            delta_vectors=np.vstack(self._delta_encodings) if self._delta_encodings else None,
+            delta_ids=tuple(self._delta_ids),
+            delta_partitions=tuple(self._delta_partitions)
+        )
+    
+    def _write_snapshot(self, vectors, voter_ids, partitions, version):
+        """Write a snapshot atomically and return its path prefix"""
+        path = os.path.join(self.index_dir, f"snapshot_{version}")
+        for suffix, array in (('.vectors.npy', np.ascontiguousarray(vectors, dtype=np.float32)),
+                              ('.ids.npy', np.asarray(list(voter_ids), dtype=str)),
+                              ('.partitions.npy', np.asarray(list(partitions), dtype=str))):
+            staging = f"{path}{suffix}.{os.getpid()}.tmp"
+            with open(staging, 'wb') as f:
+                np.save(f, array)
+            os.replace(staging, f"{path}{suffix}")
+        return path
+    
+    def _remove_old_snapshots(self, keep_version):
+        # Mapped files stay readable after unlink, so workers still on an old snapshot are unaffected
+        for name in os.listdir(self.index_dir):
+            if name.startswith('snapshot_') and name.endswith('.npy'):
+                try:
+                    version = int(name[len('snapshot_'):].split('.')[0])
+                    if version < keep_version:
+                        os.remove(os.path.join(self.index_dir, name))
+                except (ValueError, OSError):
+                    continue
+    
+    @staticmethod
+    def _as_matrix(encodings):
+        if len(encodings) == 0:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.vstack([np.asarray(e, dtype=np.float32) for e in encodings])
+    
+    @staticmethod
+    def _normalize(encoding):
+        encoding = np.asarray(encoding, dtype=np.float32)
+        norm = np.linalg.norm(encoding)
+        return encoding / norm if norm > 0 else encoding
+    
+    # ---------- writes ----------
+    
+    def _publish_delta(self, op, voter_id, encoding=None, partition=None):
+        version = FaceIndexState.next_version()
+        FaceIndexDelta.append(version, op, voter_id, encoding, partition)
+        self.sync()
+        if len(self._delta_ids) + len(self._removed) >= self.compact_every:
+            self.compact()
+        return version
+    
+    def add_face_encoding(self, encoding, voter_id, partition=None):
+        """Append an encoding to the shared delta log"""
+        try:
+            if partition is None:
+                partition = lookup_voter_partitions([voter_id])[0]
+            self._publish_delta('add', voter_id, self._normalize(encoding).tolist(), partition)
+            logger.info(f"Face encoding added for voter: {voter_id} (index v{self.version})")
+            return True
+        except Exception as e:
+            logger.error(f"Failed to add face encoding: {str(e)}")
+            return False
+    
+    def remove_face_encoding(self, voter_id):
+        """Record a removal in the shared delta log"""
+        try:
+            self._publish_delta('remove', voter_id)
+            logger.info(f"Removed face encoding for voter: {voter_id} (index v{self.version})")
+            return True
+        except Exception as e:
+            logger.error(f"Failed to remove face encoding: {str(e)}")
+            return False
+    
+    def load_encodings(self, encodings, voter_ids, partitions=None):
+        """Replace the shared index with a new snapshot
+        
+        Deltas already in the log are taken to be covered by the given
+        encodings. Versions reserved but not written yet are recorded as
+        missing, so workers still apply them on top of the snapshot.
+        """
+        vectors = self._as_matrix([self._normalize(e) for e in encodings])
+        if partitions is None:
+            partitions = lookup_voter_partitions(voter_ids)
+        with self._lock:
+            previous = FaceIndexState.get_state() or {}
+            version = FaceIndexState.next_version()
+            candidates = set(range(max(previous.get('snapshot_version', -1), 0) + 1, version))
+            candidates |= set(previous.get('missing_versions') or [])
+            missing = sorted(candidates - set(FaceIndexDelta.written_versions(candidates)))
+            path = self._write_snapshot(vectors, voter_ids, partitions, version)
+            if FaceIndexState.publish_snapshot(version, path, len(voter_ids), missing):
+                FaceIndexDelta.prune(version, keep=missing)
+            self.sync()
+            self._remove_old_snapshots(self.snapshot_version)
+        return len(voter_ids)
+    
+    def compact(self):
+        """Fold applied deltas into a new snapshot at the current version"""
+        with self._lock:
+            self.sync()
+            view = self._view
+            if view.delta_vectors is None and view.removed_mask is None:
+                return False
+            if self.version <= self.snapshot_version:
+                # Only late deltas were applied; they stay in the log until a newer version can be snapshotted
+                return False
+            
+            parts, ids, partitions = [], [], []
+            if view.vectors is not None and len(view.voter_ids):
+                keep = np.ones(len(view.voter_ids), dtype=bool)
+                if view.removed_mask is not None:
+                    keep &= ~view.removed_mask
+                snapshot_partitions = np.empty(len(view.voter_ids), dtype=object)
+                for key, rows in view.groups.items():
+                    snapshot_partitions[rows] = key
+                parts.append(np.asarray(view.vectors[keep]))
+                ids.extend(np.asarray(view.voter_ids[keep]).tolist())
+                partitions.extend(snapshot_partitions[keep].tolist())
+            if view.delta_vectors is not None:
+                parts.append(view.delta_vectors)
+                ids.extend(view.delta_ids)
+                partitions.extend(view.delta_partitions)
+            merged = np.vstack(parts) if parts else np.zeros((0, 0), dtype=np.float32)
+            
+            # Skipped versions are not in the snapshot: keep their deltas and keep looking for them
+            version = self.version
+            missing = sorted(self._late)
+            path = self._write_snapshot(merged, ids, partitions, version)
+            if FaceIndexState.publish_snapshot(version, path, len(ids), missing):
+                FaceIndexDelta.prune(version, keep=missing)
+            self.sync()
+            self._remove_old_snapshots(self.snapshot_version)
+            logger.info(f"Face index compacted into snapshot v{version} ({len(ids)} encodings)")
+            return True
+    
+    def save_model(self):
+        """Persisting the shared index means compacting it"""
+        try:
+            self.compact()
+            return True
+        except Exception as e:
+            logger.error(f"Failed to compact shared face index: {str(e)}")
+            return False
+    
+    def reload_model(self):
+        """Publish the model file on disk (e.g. a promoted re-encoding index) as the shared index"""
+        if not super().reload_model():
+            return False
+        self.load_encodings(self.face_encodings, self.voter_ids, self.partitions if '' not in self.partitions else None)
+        return True
+    
+    # ---------- reads ----------
+    
+    def find_similar_faces(self, query_encoding, k=None, state=None, constituency=None):
+        """
+        Exact cosine search over the mapped snapshot plus applied deltas.
+        With state/constituency filters only the matching partitions are scanned.
+        """
+        if k is None:
+            k = self.k_neighbors
+        
+        self._sync_if_due()
+        view = self._view
+        filtered = bool(state or constituency)
+        
+        try:
+            query = self._normalize(query_encoding)
+            candidates = []  # (similarity, voter_id)
+            
+            if view.vectors is not None and len(view.voter_ids):
+                rows = select_partition_rows(view.groups, state, constituency) if filtered else None
+                for idx, similarity in self._scan_snapshot(view, query, k, rows):
+                    candidates.append((similarity, str(view.voter_ids[idx])))
+            
+            if view.delta_vectors is not None:
+                rows = np.arange(len(view.delta_ids))
+                if filtered:
+                    rows = np.array([i for i in rows if partition_matches(view.delta_partitions[i], state, constituency)],
+                                    dtype=np.int64)
+                if len(rows):
+                    scores = view.delta_vectors[rows] @ query
+                    for idx in top_k_indices(scores, k):
+                        candidates.append((float(scores[idx]), view.delta_ids[rows[idx]]))
+            
+            candidates.sort(key=lambda c: c[0], reverse=True)
+            results = []
+            for similarity, voter_id in candidates[:k]:
+                results.append({
+                    'voter_id': voter_id,
+                    'distance': 1 - similarity,
+                    'similarity': similarity,
+                    'is_match': similarity > self.threshold,
+                    'rank': len(results) + 1
+                })
+            return results
+        except Exception as e:
+            logger.error(f"Shared index search failed: {str(e)}")
+            return []
+    
+    def _shard_count(self, rows: int) -> int:
+        return max(1, min(FACE_INDEX_SHARDS, rows // FACE_INDEX_SHARD_MIN_ROWS))
+    
+    def _scan_snapshot(self, view: SharedIndexView, query: np.ndarray, k: int, rows=None) -> List[Tuple[int, float]]:
+        """
+        Scatter-gather exact scan of the snapshot: the rows (or the selected
+        row subset) are split into contiguous shards scanned in parallel, and
+        each shard returns only its own top-k. Shards read the same memory
+        map, and numpy releases the GIL inside the matrix product.
+        """
+        total = len(view.voter_ids) if rows is None else len(rows)
+        
+        def scan(start, stop):
+            if rows is None:
+                scores = view.vectors[start:stop] @ query
+                removed = view.removed_mask[start:stop] if view.removed_mask is not None else None
+            else:
+                selected = rows[start:stop]
+                scores = view.vectors[selected] @ query
+                removed = view.removed_mask[selected] if view.removed_mask is not None else None
+            if removed is not None:
+                scores[removed] = -np.inf
+            top = top_k_indices(scores, k)
+            positions = top + start if rows is None else rows[start:stop][top]
+            return list(zip(positions.tolist(), scores[top].tolist()))
+        
+        shards = self._shard_count(total)
+        if shards == 1:
+            return scan(0, total)
+        
+        bounds = np.linspace(0, total, shards + 1, dtype=np.int64)
+        futures = [self._shard_pool().submit(scan, int(start), int(stop))
+                   for start, stop in zip(bounds[:-1], bounds[1:])]
+        merged = []
+        for future in futures:
+            merged.extend(future.result())
+        return merged
+    
+    def _shard_pool(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(max_workers=FACE_INDEX_SHARDS, thread_name_prefix='face-shard')
+        return self._pool
+    
+    def get_statistics(self):
+        view = self._view
+        snapshot_size = len(view.voter_ids) if view.voter_ids is not None else 0
+        removed = int(view.removed_mask.sum()) if view.removed_mask is not None else 0
+        return {
+            'total_encodings': snapshot_size - removed + len(view.delta_ids),
+            'snapshot_encodings': snapshot_size,
+            'delta_encodings': len(view.delta_ids),
+            'removed_voters': len(self._removed),
+            'late_versions': len(self._late),
+            'partitions': len(set(view.groups or {}) | set(view.delta_partitions)),
+            'index_version': self.version,
+            'snapshot_version': self.snapshot_version,
+            'search_shards': self._shard_count(snapshot_size),
+            'model_trained': view.vectors is not None or view.delta_vectors is not None,
+            'threshold': self.threshold,
+            'distance_metric': self.distance_metric,
+            'index_mode': 'shared',
+            'index_dir': self.index_dir
+        }
+
 class HybridFaceRecognitionService:
     """
     Hybrid face recognition service combining:
@@ -818,12 +1625,12 @@ class HybridFaceRecognitionService:
     4. Ensemble voting for final decisions
     """
     
-    def __init__(self, knn_model_path='data/face_knn_model.pkl'):
+    def __init__(self, knn_model_path='data/face_knn_model.pkl', knn_service=None):
         # Initialize multi-method face service
         self.face_service = MultiMethodFaceService()
         
         # Initialize KNN service
-        self.knn_service = KNNFaceService(knn_model_path)
+        self.knn_service = knn_service or KNNFaceService(knn_model_path)
         
         # Configuration
         self.config = {
@@ -852,19 +1659,76 @@ class HybridFaceRecognitionService:
         
         logger.info("HybridFaceRecognitionService initialized")
     
+    def _record_timings(self, operation: str, timer: StageTimer, result: FaceRecognitionResult,
+                        voter_id: str = None) -> FaceRecognitionResult:
+        """Attach stage timings to the result and feed the metrics registry"""
+        result.stage_timings = timer.as_dict()
+        record_face_timings(
+            operation,
+            timer,
+            voter_id=voter_id,
+            outcome=result.method,
+            total_seconds=result.processing_time or None
+        )
+        return result
+
+    def _run_cached(self, operation: str, voter_id: str, image_data: str, pipeline) -> FaceRecognitionResult:
+        """Run a pipeline unless the frame is a replay or a near-identical retry"""
+        timer = StageTimer()
+        with timer.stage('fingerprint'):
+            fingerprint = face_frame_cache.fingerprint(self.face_service, image_data)
+        
+        if fingerprint:
+            replay = face_frame_cache.check_replay(fingerprint, voter_id, operation)
+            if replay:
+                logger.warning(f"Replayed frame submitted for {operation} by voter {voter_id}: {replay}")
+                result = FaceRecognitionResult(
+                    is_match=False,
+                    confidence=0.0,
+                    method="replay_check",
+                    processing_time=timer.total(),
+                    details={
+                        'error': 'This exact image was already submitted earlier. Please capture a new photo.',
+                        'suspicious_replay': True,
+                        **replay
+                    },
+                    quality_score=0.0
+                )
+                return self._record_timings(operation, timer, result, voter_id)
+            
+            cached = face_frame_cache.get(operation, voter_id, fingerprint)
+            if cached:
+                cached.processing_time = timer.total()
+                return self._record_timings(f'{operation}_cached', timer, cached, voter_id)
+        
+        result = pipeline(voter_id, image_data, timer)
+        
+        # Errors may be transient, everything else is deterministic for the frame
+        if fingerprint and result.method != "error":
+            face_frame_cache.put(operation, voter_id, fingerprint, result)
+        if fingerprint and result.is_match:
+            face_frame_cache.mark_accepted(operation, fingerprint)
+        
+        return self._record_timings(operation, timer, result, voter_id)
+    
     def register_face(self, voter_id: str, image_data: str) -> FaceRecognitionResult:
         """
         Register a new face with comprehensive duplicate checking
         """
+        return self._run_cached('register', voter_id, image_data, self._register_face)
+
+    def _register_face(self, voter_id: str, image_data: str, timer: StageTimer) -> FaceRecognitionResult:
         start_time = time.time()
         
         try:
             # Step 1: Process image
-            image_array = self.face_service.base64_to_image(image_data)
-            image_array = self.face_service.preprocess_image(image_array)
+            with timer.stage('decode'):
+                image_array = self.face_service.base64_to_image(image_data)
+            with timer.stage('preprocess'):
+                image_array = self.face_service.preprocess_image(image_array)
             
             # Step 2: Validate face
-            is_valid, validation_message = self.face_service.validate_face_image(image_array)
+            is_valid, validation_message = self.face_service.validate_face_image(image_array, timer)
             if not is_valid:
                 return FaceRecognitionResult(
                     is_match=False,
@@ -876,7 +1740,7 @@ class HybridFaceRecognitionService:
                 )
             
             # Step 3: Detect face with multiple methods
-            detected_faces = self.face_service.detect_faces_multi_method(image_array)
+            detected_faces = self.face_service.detect_faces_multi_method(image_array, timer)
             if not detected_faces:
                 return FaceRecognitionResult(
                     is_match=False,
@@ -887,10 +1751,11 @@ class HybridFaceRecognitionService:
                     quality_score=0.0
                 )
             
-            face_bbox = detected_faces[0]['bbox']
+            face_bbox = tuple(int(v) for v in detected_faces[0]['bbox'])
             
             # Step 4: Calculate quality score
-            quality_score = self.face_service.calculate_face_quality_score(image_array, face_bbox)
+            with timer.stage('quality'):
+                quality_score = self.face_service.calculate_face_quality_score(image_array, face_bbox)
             if quality_score < self.config['quality_threshold']:
                 return FaceRecognitionResult(
                     is_match=False,
@@ -906,7 +1771,7 @@ class HybridFaceRecognitionService:
                 )
             
             # Step 5: Extract encodings with multiple methods
-            encodings = self.face_service.extract_face_encoding_multi_method(image_array, face_bbox)
+            encodings = self.face_service.extract_face_encoding_multi_method(image_array, face_bbox, timer)
             
             if not encodings or len(encodings) < self.config['min_encoding_methods']:
                 return FaceRecognitionResult(
@@ -925,7 +1790,8 @@ class HybridFaceRecognitionService:
             primary_encoding = encodings.get('ensemble') or list(encodings.values())[0]
             
             # Step 6: KNN duplicate check (FAST)
-            duplicate_check = self.knn_service.find_duplicate(primary_encoding)
+            with timer.stage('index_search'):
+                duplicate_check = self.knn_service.find_duplicate(primary_encoding)
             
             if duplicate_check['is_duplicate'] and duplicate_check['similarity'] > 0.80:
                 # High confidence duplicate
@@ -947,7 +1813,8 @@ class HybridFaceRecognitionService:
                 )
             
             # Step 7: Add to KNN for future searches
-            knn_success = self.knn_service.add_face_encoding(primary_encoding, voter_id)
+            with timer.stage('persistence'):
+                knn_success = self.knn_service.add_face_encoding(primary_encoding, voter_id)
             
             # Step 8: Prepare result
             total_time = time.time() - start_time
@@ -970,9 +1837,11 @@ class HybridFaceRecognitionService:
                     'knn_indexed': knn_success,
                     'quality_score': quality_score,
                     'face_detection_method': detected_faces[0]['method'],
-                    'detection_confidence': detected_faces[0]['confidence']
+                    'detection_confidence': detected_faces[0]['confidence'],
+                    'face_bbox': list(face_bbox)
                 },
-                quality_score=quality_score
+                quality_score=quality_score,
+                encodings=encodings
             )
             
         except Exception as e:
@@ -990,15 +1859,54 @@ class HybridFaceRecognitionService:
         """
         Verify face against registered voter using hybrid approach
         """
+        return self._run_cached('verify', voter_id, image_data, self._verify_face)
+
+    def _verify_face(self, voter_id: str, image_data: str, timer: StageTimer) -> FaceRecognitionResult:
         start_time = time.time()
         
         try:
             # Step 1: Process image
-            image_array = self.face_service.base64_to_image(image_data)
-            image_array = self.face_service.preprocess_image(image_array)
+            with timer.stage('decode'):
+                image_array = self.face_service.base64_to_image(image_data)
+            with timer.stage('preprocess'):
+                image_array = self.face_service.preprocess_image(image_array)
+            
+            return self._verify_image(voter_id, image_array, timer, start_time)
             
-            # Step 2: Detect face
-            detected_faces = self.face_service.detect_faces_multi_method(image_array)
+        except Exception as e:
+            logger.error(f"Verification error: {str(e)}")
+            return FaceRecognitionResult(
+                is_match=False,
+                confidence=0.0,
+                method="error",
+                processing_time=time.time() - start_time,
+                details={'error': str(e)},
+                quality_score=0.0
+            )
+    
+    def verify_frame(self, voter_id: str, image_array: np.ndarray, roi_bbox: Tuple = None) -> FaceRecognitionResult:
+        """
+        Verify an already decoded frame from a stream. When roi_bbox is given
+        detection runs only around it, falling back to the full frame.
+        """
+        timer = StageTimer()
+        start_time = time.time()
+        
+        with timer.stage('preprocess'):
+            image_array = self.face_service.preprocess_image(image_array)
+        result = self._verify_image(voter_id, image_array, timer, start_time, roi_bbox)
+        return self._record_timings('verify_stream', timer, result, voter_id)
+    
+    def _verify_image(self, voter_id: str, image_array: np.ndarray, timer: StageTimer,
+                      start_time: float, roi_bbox: Tuple = None) -> FaceRecognitionResult:
+        try:
+            # Step 2: Detect face, near the previous bbox first when we have one
+            detected_faces = []
+            if roi_bbox is not None:
+                detected_faces = self.face_service.detect_faces_in_roi(image_array, roi_bbox, timer=timer)
+            roi_hit = bool(detected_faces)
+            if not detected_faces:
+                detected_faces = self.face_service.detect_faces_multi_method(image_array, timer)
             if not detected_faces:
                 return FaceRecognitionResult(
                     is_match=False,
@@ -1009,10 +1917,10 @@ class HybridFaceRecognitionService:
                     quality_score=0.0
                 )
             
-            face_bbox = detected_faces[0]['bbox']
+            face_bbox = tuple(int(v) for v in detected_faces[0]['bbox'])
             
             # Step 3: Extract encoding
-            encodings = self.face_service.extract_face_encoding_multi_method(image_array, face_bbox)
+            encodings = self.face_service.extract_face_encoding_multi_method(image_array, face_bbox, timer)
             if not encodings:
                 return FaceRecognitionResult(
                     is_match=False,
@@ -1026,7 +1934,8 @@ class HybridFaceRecognitionService:
             primary_encoding = encodings.get('ensemble') or list(encodings.values())[0]
             
             # Step 4: KNN verification (FAST)
-            knn_result = self.knn_service.verify_face(primary_encoding, voter_id)
+            with timer.stage('index_search'):
+                knn_result = self.knn_service.verify_face(primary_encoding, voter_id)
             
             # Step 5: Calculate similarity with all available encodings
             similarities = []
@@ -1044,7 +1953,8 @@ class HybridFaceRecognitionService:
             is_match = avg_similarity > self.config['verification_threshold']
             
             # Calculate quality
-            quality_score = self.face_service.calculate_face_quality_score(image_array, face_bbox)
+            with timer.stage('quality'):
+                quality_score = self.face_service.calculate_face_quality_score(image_array, face_bbox)
             
             total_time = time.time() - start_time
             self.stats['total_operations'] += 1
@@ -1064,6 +1974,8 @@ class HybridFaceRecognitionService:
                     'threshold': self.config['verification_threshold'],
                     'knn_result': knn_result,
                     'face_detection_method': detected_faces[0]['method'],
+                    'face_bbox': list(face_bbox),
+                    'roi_reused': roi_hit,
                     'quality_score': quality_score
                 },
                 quality_score=quality_score
@@ -1080,18 +1992,22 @@ class HybridFaceRecognitionService:
                 quality_score=0.0
             )
     
-    def find_similar_faces(self, image_data: str, k: int = 5) -> List[Dict]:
-        """Find similar faces in the database"""
+    def find_similar_faces(self, image_data: str, k: int = 5, state: str = None,
+                           constituency: str = None) -> List[Dict]:
+        """Find similar faces in the database, optionally only within a state/constituency"""
+        timer = StageTimer()
         try:
-            image_array = self.face_service.base64_to_image(image_data)
-            image_array = self.face_service.preprocess_image(image_array)
+            with timer.stage('decode'):
+                image_array = self.face_service.base64_to_image(image_data)
+            with timer.stage('preprocess'):
+                image_array = self.face_service.preprocess_image(image_array)
             
-            detected_faces = self.face_service.detect_faces_multi_method(image_array)
+            detected_faces = self.face_service.detect_faces_multi_method(image_array, timer)
             if not detected_faces:
                 return []
             
             face_bbox = detected_faces[0]['bbox']
-            encodings = self.face_service.extract_face_encoding_multi_method(image_array, face_bbox)
+            encodings = self.face_service.extract_face_encoding_multi_method(image_array, face_bbox, timer)
             
             if not encodings:
                 return []
@@ -1099,18 +2015,25 @@ class HybridFaceRecognitionService:
             primary_encoding = encodings.get('ensemble') or list(encodings.values())[0]
             
             # Use KNN for fast similarity search
-            similar_faces = self.knn_service.find_similar_faces(primary_encoding, k)
+            with timer.stage('index_search'):
+                similar_faces = self.knn_service.find_similar_faces(
+                    primary_encoding, k, state=state, constituency=constituency
+                )
             
             return similar_faces
             
         except Exception as e:
             logger.error(f"Find similar faces error: {str(e)}")
             return []
+        finally:
+            record_face_timings('search', timer)
     
     def get_system_stats(self) -> Dict:
         """Get system statistics"""
         return {
             **self.stats,
+            'stage_latency': face_metrics.snapshot(),
+            'frame_cache': face_frame_cache.get_statistics(),
             'knn_stats': self.knn_service.get_statistics(),
             'config': self.config,
             'available_methods': self.face_service.methods_available
@@ -1119,16 +2042,13 @@ class HybridFaceRecognitionService:
     def reindex_knn_from_database(self, face_encodings_data: List[Dict]):
         """Reindex KNN from database face encodings"""
         try:
-            # Clear existing data
-            self.knn_service.face_encodings = []
-            self.knn_service.voter_ids = []
-            
-            added_count = 0
-            for data in face_encodings_data:
-                if 'voter_id' in data and 'encoding' in data:
-                    success = self.knn_service.add_face_encoding(data['encoding'], data['voter_id'])
-                    if success:
-                        added_count += 1
+            # Load everything in one pass and retrain once instead of per encoding
+            valid = [d for d in face_encodings_data if 'voter_id' in d and 'encoding' in d]
+            added_count = self.knn_service.load_encodings(
+                [d['encoding'] for d in valid],
+                [d['voter_id'] for d in valid]
+            )
+            self.knn_service.save_model()
             
             logger.info(f"KNN reindexed with {added_count} face encodings")
             return added_count
@@ -1137,10 +2057,17 @@ class HybridFaceRecognitionService:
             logger.error(f"Reindex error: {str(e)}")
             return 0
 
+def create_knn_service(model_path='data/face_knn_model.pkl'):
+    """KNN service for the configured FACE_INDEX_MODE"""
+    if FACE_INDEX_MODE == 'shared':
+        return SharedKNNFaceService(model_path)
+    return KNNFaceService(model_path)
+
 # Global instances for easy import
 multi_face_service = MultiMethodFaceService()
-knn_face_service = KNNFaceService()
-hybrid_face_service = HybridFaceRecognitionService()
+knn_face_service = create_knn_service()
+# Share one index per process so registrations and searches see the same data
+hybrid_face_service = HybridFaceRecognitionService(knn_service=knn_face_service)
 
 # For backward compatibility
 face_service = multi_face_service
\ No newline at end of file
@@ -0,0 +1,234 @@
+# smart_app/backend/services/face_reencoding_service.py
+import os
+import uuid
+import shutil
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from smart_app.backend.mongo_models import FaceEncoding, ReencodingJob, unpack_encoding
+from smart_app.backend.services.face_recognition_service import (
+    MultiMethodFaceService,
+    KNNFaceService,
+    multi_face_service
+)
+
+logger = logging.getLogger(__name__)
+
+# Face service used inside pool worker processes (one per process)
+_worker_face_service = None
+
+
+def _init_worker():
+    """Create the face service once per worker process"""
+    global _worker_face_service
+    _worker_face_service = MultiMethodFaceService()
+
+
+def _encode_enrollment_image(task: Tuple) -> Tuple:
+    """Compute one method's encoding for a stored enrollment image
+
+    Runs inside a pool worker. Returns (doc_id, encoding, error).
+    """
+    doc_id, image_path, face_bbox, method = task
+    try:
+        with open(image_path, 'rb') as f:
+            image_array = _worker_face_service.bytes_to_image(f.read())
+        image_array = _worker_face_service.preprocess_image(image_array)
+
+        if not face_bbox:
+            faces = _worker_face_service.detect_faces_multi_method(image_array)
+            if not faces:
+                return doc_id, None, 'No face detected'
+            face_bbox = faces[0]['bbox']
+
+        if method == 'ensemble':
+            # Same combination the live index stores for new registrations
+            encodings = _worker_face_service.extract_face_encoding_multi_method(image_array, tuple(face_bbox))
+            encoding = encodings.get('ensemble')
+        else:
+            encoding = _worker_face_service.extract_face_encoding(image_array, tuple(face_bbox), method)
+        if encoding is None:
+            return doc_id, None, 'Encoding failed'
+        return doc_id, encoding, None
+    except Exception as e:
+        return doc_id, None, str(e)
+
+
+class FaceReencodingJob:
+    """
+    Resumable job that re-computes one encoding method (or the ensemble of all
+    available ones) for every enrolled face.
+
+    Stored enrollment images are streamed from the face_encodings collection in
+    _id order, encoded on a process pool and written back with bulk updates.
+    The cursor position is checkpointed after every batch so an interrupted job
+    continues where it stopped. The method's KNN index is built next to the live
+    one and swapped in with an atomic rename once every record is processed.
+    """
+
+    def __init__(self, method: str, batch_size: int = 64, workers: Optional[int] = None,
+                 index_dir: str = 'data', promote: bool = False):
+        query_encoder = multi_face_service.get_query_encoder()
+        if promote and method != query_encoder:
+            # The live index must hold vectors from the same embedding space as the queries
+            raise ValueError(f"Cannot promote {method} index: live searches query with {query_encoder}")
+        self.method = method
+        self.batch_size = batch_size
+        self.workers = workers or os.cpu_count() or 1
+        self.index_dir = index_dir
+        self.promote = promote
+        self.owner = str(uuid.uuid4())
+        self.job = None
+
+    @property
+    def index_path(self) -> str:
+        return os.path.join(self.index_dir, f'face_knn_{self.method}.pkl')
+
+    def _stream_batches(self, last_id):
+        """Yield batches of face encoding documents after the checkpoint"""
+        query = {
+            "is_active": True,
+            "image_metadata.image_path": {"$exists": True}
+        }
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+
+        cursor = FaceEncoding.get_collection().find(
+            query,
+            {"_id": 1, "voter_id": 1, "image_metadata": 1}
+        ).sort("_id", 1).batch_size(self.batch_size)
+
+        batch = []
+        for doc in cursor:
+            batch.append(doc)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _encode_batch(self, pool, batch: List[Dict]) -> Tuple[Dict, int, int]:
+        tasks = []
+        skipped = 0
+        for doc in batch:
+            metadata = doc.get('image_metadata') or {}
+            image_path = metadata.get('image_path')
+            if not image_path or not os.path.exists(image_path):
+                skipped += 1
+                continue
+            tasks.append((doc['_id'], image_path, metadata.get('face_bbox'), self.method))
+
+        encodings = {}
+        failed = 0
+        for doc_id, encoding, error in pool.map(_encode_enrollment_image, tasks):
+            if error:
+                failed += 1
+                logger.warning(f"Re-encoding failed for {doc_id}: {error}")
+            else:
+                encodings[doc_id] = encoding
+        return encodings, skipped, failed
+
+    def _build_index(self) -> int:
+        """Build the method's index from stored encodings and swap it in"""
+        encodings = []
+        voter_ids = []
+        cursor = FaceEncoding.get_collection().find(
+            {"is_active": True, f"encoding_data.{self.method}": {"$exists": True}},
+            {"voter_id": 1, f"encoding_data.{self.method}": 1}
+        ).batch_size(1000)
+        for doc in cursor:
+            encodings.append(unpack_encoding(doc['encoding_data'][self.method]))
+            voter_ids.append(doc['voter_id'])
+
+        staging_path = self.index_path.replace('.pkl', '.building.pkl')
+        staging = KNNFaceService(staging_path)
+        count = staging.load_encodings(encodings, voter_ids)
+        if not staging.save_model():
+            raise RuntimeError("Failed to save staging KNN index")
+
+        # Atomic rename so readers only ever see a complete index file
+        os.replace(staging_path, self.index_path)
+        os.replace(
+            staging_path.replace('.pkl', '.joblib'),
+            self.index_path.replace('.pkl', '.joblib')
+        )
+        logger.info(f"Swapped in {self.method} KNN index with {count} encodings")
+        return count
+
+    def _promote_index(self, live_service: KNNFaceService):
+        """Make the method's index the primary one used for searches"""
+        for ext in ('.pkl', '.joblib'):
+            source = self.index_path.replace('.pkl', ext)
+            target = live_service.model_path.replace('.pkl', ext)
+            promoted = target + '.promoting'
+            shutil.copyfile(source, promoted)
+            os.replace(promoted, target)
+        live_service.reload_model()
+
+    def run(self, live_service: Optional[KNNFaceService] = None) -> Dict:
+        """Run (or resume) the job to completion"""
+        if self.method not in multi_face_service.get_index_methods():
+            raise ValueError(f"Encoding method not available: {self.method}")
+
+        # Records must use the dict layout before per-method fields can be set
+        FaceEncoding.migrate_to_hybrid_format()
+
+        self.job = ReencodingJob.start_or_resume(self.method, self.owner)
+        if self.job is None:
+            raise RuntimeError(f"A re-encoding job for {self.method} is running in another process")
+        job_id = self.job['job_id']
+        last_id = self.job.get('last_id')
+        logger.info(f"Re-encoding job {job_id} for {self.method} starting after {last_id}")
+
+        try:
+            with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker) as pool:
+                for batch in self._stream_batches(last_id):
+                    encodings, skipped, failed = self._encode_batch(pool, batch)
+                    FaceEncoding.bulk_add_encoding_method(self.method, encodings)
+                    last_id = batch[-1]['_id']
+                    result = ReencodingJob.checkpoint(
+                        job_id, last_id,
+                        processed=len(encodings), skipped=skipped, failed=failed, owner=self.owner
+                    )
+                    if not result.matched_count:
+                        raise RuntimeError(f"Re-encoding job {job_id} was taken over by another process")
+
+            index_size = self._build_index()
+            if self.promote and live_service is not None:
+                self._promote_index(live_service)
+
+            ReencodingJob.finish(job_id, owner=self.owner, index_path=self.index_path, index_size=index_size)
+            return ReencodingJob.find_one({"job_id": job_id})
+        except Exception as e:
+            logger.error(f"Re-encoding job {job_id} interrupted: {str(e)}")
+            ReencodingJob.finish(job_id, status="interrupted", owner=self.owner, error=str(e))
+            raise
+
+
+# Only one re-encoding job runs per process at a time
+_job_lock = threading.Lock()
+
+
+def start_reencoding_job(app, method: str, live_service: Optional[KNNFaceService] = None,
+                         **job_options) -> bool:
+    """Run a re-encoding job on a background thread. Returns False if one is already running.
+
+    Raises ValueError for options that cannot work (e.g. promoting a method live searches do not use).
+    """
+    job = FaceReencodingJob(method, **job_options)
+    if not _job_lock.acquire(blocking=False):
+        return False
+
+    def _run():
+        try:
+            with app.app_context():
+                job.run(live_service)
+        except Exception as e:
+            logger.error(f"Background re-encoding failed: {str(e)}")
+        finally:
+            _job_lock.release()
+
+    threading.Thread(target=_run, name=f'face-reencode-{method}', daemon=True).start()
+    return True
@@ -0,0 +1,144 @@
+# smart_app/backend/services/face_stream_service.py
+import time
+import logging
+import threading
+from typing import Dict, Optional
+
+from smart_app.backend.services.face_recognition_service import hybrid_face_service
+
+logger = logging.getLogger(__name__)
+
+
+class FaceVerificationStream:
+    """
+    State of one streaming face verification. Frames are verified one at a
+    time; the bbox of the last detected face is reused as a region of interest
+    for the next frame, and the stream is accepted after `required_matches`
+    consecutive matches (or one frame above `instant_accept`).
+    """
+
+    def __init__(self, voter_id: str, required_matches: int = 2, instant_accept: float = 0.90,
+                 max_frames: int = 20, max_seconds: float = 15.0, max_frame_bytes: int = 256 * 1024,
+                 service=None):
+        self.voter_id = voter_id
+        self.required_matches = max(1, required_matches)
+        self.instant_accept = instant_accept
+        self.max_frames = max_frames
+        self.max_seconds = max_seconds
+        self.max_frame_bytes = max_frame_bytes
+        self.service = service or hybrid_face_service
+
+        self.started_at = time.time()
+        self.frames = 0
+        self.consecutive_matches = 0
+        self.last_bbox = None
+        self.best_result = None
+        self.status = 'active'  # active, accepted, rejected
+        self._lock = threading.Lock()
+
+    def elapsed(self) -> float:
+        return time.time() - self.started_at
+
+    def _budget_exhausted(self) -> Optional[str]:
+        if self.frames >= self.max_frames:
+            return 'Frame budget exhausted'
+        if self.elapsed() >= self.max_seconds:
+            return 'Time budget exhausted'
+        return None
+
+    def process_frame(self, frame_bytes: bytes) -> Dict:
+        """Verify one JPEG frame and return the updated stream state"""
+        if self.status != 'active':
+            return self._state(message='Verification already finished')
+
+        # Frames arriving while the previous one is still being matched are dropped
+        if not self._lock.acquire(blocking=False):
+            return self._state(dropped=True, message='Frame dropped, still processing previous frame')
+
+        try:
+            reason = self._budget_exhausted()
+            if reason:
+                self.status = 'rejected'
+                return self._state(message=reason)
+
+            if not frame_bytes or len(frame_bytes) > self.max_frame_bytes:
+                return self._state(dropped=True, message='Frame missing or too large')
+
+            self.frames += 1
+            image_array = self.service.face_service.bytes_to_image(frame_bytes)
+            result = self.service.verify_frame(self.voter_id, image_array, self.last_bbox)
+            details = result.details or {}
+
+            # Keep the ROI only while a face is being tracked
+            self.last_bbox = details.get('face_bbox')
+
+            if result.is_match:
+                self.consecutive_matches += 1
+                if self.best_result is None or result.confidence > self.best_result.confidence:
+                    self.best_result = result
+            else:
+                self.consecutive_matches = 0
+
+            if result.is_match and (self.consecutive_matches >= self.required_matches
+                                    or result.confidence >= self.instant_accept):
+                self.status = 'accepted'
+                return self._state(result=result, message='Face verification successful')
+
+            reason = self._budget_exhausted()
+            if reason:
+                self.status = 'rejected'
+                return self._state(result=result, message=reason)
+
+            return self._state(result=result, message=details.get('error') or 'Keep looking at the camera')
+
+        except Exception as e:
+            logger.error(f"Stream frame error for voter {self.voter_id}: {str(e)}")
+            return self._state(message='Could not process frame')
+        finally:
+            self._lock.release()
+
+    def _state(self, result=None, dropped: bool = False, message: str = None) -> Dict:
+        state = {
+            'status': self.status,
+            'frames': self.frames,
+            'consecutive_matches': self.consecutive_matches,
+            'required_matches': self.required_matches,
+            'elapsed': round(self.elapsed(), 3),
+            'dropped': dropped,
+            'message': message
+        }
+        if result is not None:
+            state.update({
+                'is_match': result.is_match,
+                'confidence': round(float(result.confidence), 4),
+                'quality_score': round(float(result.quality_score), 4),
+                'processing_time': result.processing_time,
+                'roi_reused': (result.details or {}).get('roi_reused', False)
+            })
+        return state
+
+
+class FaceStreamRegistry:
+    """Active verification streams keyed by Socket.IO session id"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._streams = {}
+
+    def start(self, sid: str, voter_id: str, **options) -> FaceVerificationStream:
+        stream = FaceVerificationStream(voter_id, **options)
+        with self._lock:
+            self._streams[sid] = stream
+        return stream
+
+    def get(self, sid: str) -> Optional[FaceVerificationStream]:
+        with self._lock:
+            return self._streams.get(sid)
+
+    def end(self, sid: str) -> Optional[FaceVerificationStream]:
+        with self._lock:
+            return self._streams.pop(sid, None)
+
+
+# Global registry for easy import
+face_streams = FaceStreamRegistry()
@@ -0,0 +1,157 @@
+# smart_app/backend/services/loaders.py
+"""
+Batched relation loading (DataLoader pattern).
+
+Routes that resolve a relation per row (the election and candidate of every
+vote, the vote count of every election) queue the keys first and read the
+results afterwards; each loader resolves everything queued with a single $in
+query (or one $group aggregation for counts). Loaders live on flask.g, so a
+key loaded once is served from memory for the rest of the request; writes to
+the collection clear them along with the identity map.
+
+    elections = get_loader(Election, 'election_id')
+    elections.add_many(vote['election_id'] for vote in votes)
+    for vote in votes:
+        election = elections.get(vote['election_id'])
+"""
+import logging
+from typing import Dict, Iterable, Optional
+
+from flask import g, has_request_context
+
+logger = logging.getLogger(__name__)
+
+
+def _freeze(value):
+    """Hashable form of a projection or match document, for the loader registry"""
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+class BatchLoader:
+    """Documents of one model keyed by a field, fetched with one $in query per batch"""
+
+    def __init__(self, model, field: str, projection: Optional[Dict] = None):
+        self.model = model
+        self.field = field
+        self.projection = projection
+        self._pending = set()
+        self._cache = {}
+
+    def add(self, key):
+        """Queue a key for the next batch"""
+        if key is not None and key not in self._cache:
+            self._pending.add(key)
+
+    def add_many(self, keys: Iterable):
+        for key in keys:
+            self.add(key)
+
+    def _dispatch(self):
+        if not self._pending:
+            return
+        keys, self._pending = list(self._pending), set()
+        self._cache.update(self.model.find_many_cached(self.field, keys, self.projection))
+
+    def get(self, key):
+        """Document for key (None if it does not exist); resolves everything queued so far"""
+        if key is None:
+            return None
+        if key not in self._cache:
+            self._pending.add(key)
+            self._dispatch()
+        return self._cache.get(key)
+
+    def load_many(self, keys: Iterable) -> Dict:
+        """{key: document or None} for all keys"""
+        keys = list(keys)
+        self.add_many(keys)
+        self._dispatch()
+        return {key: self._cache.get(key) for key in keys if key is not None}
+
+    def clear(self):
+        self._pending = set()
+        self._cache = {}
+
+
+class CountLoader:
+    """Per-key document counts (e.g. votes per election) from one $group aggregation"""
+
+    def __init__(self, model, field: str, match: Optional[Dict] = None):
+        self.model = model
+        self.field = field
+        self.match = match or {}
+        self._pending = set()
+        self._cache = {}
+
+    def add(self, key):
+        if key is not None and key not in self._cache:
+            self._pending.add(key)
+
+    def add_many(self, keys: Iterable):
+        for key in keys:
+            self.add(key)
+
+    def _dispatch(self):
+        if not self._pending:
+            return
+        keys, self._pending = list(self._pending), set()
+        pipeline = [
+            {"$match": {**self.match, self.field: {"$in": keys}}},
+            {"$group": {"_id": f"${self.field}", "count": {"$sum": 1}}}
+        ]
+        counts = {row['_id']: row['count'] for row in self.model.aggregate(pipeline)}
+        for key in keys:
+            self._cache[key] = counts.get(key, 0)
+
+    def get(self, key) -> int:
+        if key is None:
+            return 0
+        if key not in self._cache:
+            self._pending.add(key)
+            self._dispatch()
+        return self._cache.get(key, 0)
+
+    def load_many(self, keys: Iterable) -> Dict:
+        keys = list(keys)
+        self.add_many(keys)
+        self._dispatch()
+        return {key: self._cache.get(key, 0) for key in keys if key is not None}
+
+    def clear(self):
+        self._pending = set()
+        self._cache = {}
+
+
+def _registry() -> Optional[Dict]:
+    if not has_request_context():
+        return None
+    loaders = g.get('loaders')
+    if loaders is None:
+        loaders = g.loaders = {}
+    return loaders
+
+
+def get_loader(model, field: str, projection: Optional[Dict] = None) -> BatchLoader:
+    """The request's loader for model documents keyed by field (a fresh one outside a request)"""
+    loaders = _registry()
+    if loaders is None:
+        return BatchLoader(model, field, projection)
+    key = ('docs', model.collection_name, field, _freeze(projection))
+    if key not in loaders:
+        loaders[key] = BatchLoader(model, field, projection)
+    return loaders[key]
+
+
+def get_count_loader(model, field: str, match: Optional[Dict] = None) -> CountLoader:
+    """The request's loader for per-key counts of model documents"""
+    loaders = _registry()
+    if loaders is None:
+        return CountLoader(model, field, match)
+    key = ('count', model.collection_name, field, _freeze(match))
+    if key not in loaders:
+        loaders[key] = CountLoader(model, field, match)
+    return loaders[key]
@@ -0,0 +1,210 @@
+# smart_app/backend/services/pool_monitor.py
+"""
+MongoClient pool profiles and connection pool telemetry.
+
+`client_options` turns the configured pool profile (MONGO_POOL_PROFILES /
+MONGO_POOL_PROFILE) into MongoClient keyword arguments. The pymongo
+ConnectionPoolListener records, per server, how long threads waited to check
+out a connection, how many connections are open and in use, and why checkouts
+failed, so pool sizes for the threading Socket.IO worker can be chosen from
+measurements rather than guesses.
+"""
+import time
+import logging
+import threading
+from typing import Dict
+
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+# Checkout wait histogram bucket upper bounds in milliseconds
+WAIT_BUCKETS_MS = [0.1, 0.5, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 5000, float('inf')]
+
+# Profile keys that are passed to MongoClient as-is
+POOL_OPTIONS = ('maxPoolSize', 'minPoolSize', 'maxIdleTimeMS', 'waitQueueTimeoutMS', 'maxConnecting')
+
+
+def _address(event) -> str:
+    host, port = event.address
+    return f"{host}:{port}"
+
+
+class PoolStats:
+    """Counters for one server's connection pool"""
+
+    def __init__(self):
+        self.open = 0
+        self.checked_out = 0
+        self.max_open = 0
+        self.max_checked_out = 0
+        self.created = 0
+        self.closed = 0
+        self.checkouts = 0
+        self.failures = {}            # reason -> count
+        self.cleared = 0
+        self.wait_total_ms = 0.0
+        self.wait_max_ms = 0.0
+        self.wait_buckets = [0] * len(WAIT_BUCKETS_MS)
+
+    def record_wait(self, wait_ms: float):
+        self.wait_total_ms += wait_ms
+        self.wait_max_ms = max(self.wait_max_ms, wait_ms)
+        for i, bound in enumerate(WAIT_BUCKETS_MS):
+            if wait_ms <= bound:
+                self.wait_buckets[i] += 1
+                break
+
+    def as_dict(self) -> Dict:
+        attempts = self.checkouts + sum(self.failures.values())
+        return {
+            'open_connections': self.open,
+            'checked_out': self.checked_out,
+            'max_open_connections': self.max_open,
+            'max_checked_out': self.max_checked_out,
+            'connections_created': self.created,
+            'connections_closed': self.closed,
+            'checkouts': self.checkouts,
+            'checkout_failures': dict(self.failures),
+            'pool_cleared': self.cleared,
+            'wait_ms': {
+                'avg': round(self.wait_total_ms / attempts, 3) if attempts else 0.0,
+                'max': round(self.wait_max_ms, 3),
+                'buckets': {
+                    ('+Inf' if bound == float('inf') else str(bound)): count
+                    for bound, count in zip(WAIT_BUCKETS_MS, self.wait_buckets)
+                }
+            }
+        }
+
+
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+    """Feeds pool events into per-server PoolStats"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._pools = {}
+
+    def _stats(self, event) -> PoolStats:
+        address = _address(event)
+        if address not in self._pools:
+            self._pools[address] = PoolStats()
+        return self._pools[address]
+
+    def _wait_ms(self, event) -> float:
+        # Checkout events are published on the thread that asked for the connection
+        started = getattr(self._local, 'checkout_started', None)
+        self._local.checkout_started = None
+        return (time.perf_counter() - started) * 1000 if started is not None else 0.0
+
+    def pool_created(self, event):
+        with self._lock:
+            self._stats(event)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self._stats(event).cleared += 1
+        logger.warning(f"MongoDB connection pool cleared for {_address(event)}")
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        with self._lock:
+            stats = self._stats(event)
+            stats.created += 1
+            stats.open += 1
+            stats.max_open = max(stats.max_open, stats.open)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            stats = self._stats(event)
+            stats.closed += 1
+            stats.open = max(0, stats.open - 1)
+
+    def connection_check_out_started(self, event):
+        self._local.checkout_started = time.perf_counter()
+
+    def connection_check_out_failed(self, event):
+        wait_ms = self._wait_ms(event)
+        reason = str(getattr(event, 'reason', 'unknown'))
+        with self._lock:
+            stats = self._stats(event)
+            stats.failures[reason] = stats.failures.get(reason, 0) + 1
+            stats.record_wait(wait_ms)
+        logger.warning(f"MongoDB connection checkout failed on {_address(event)} after {wait_ms:.1f} ms: {reason}")
+
+    def connection_checked_out(self, event):
+        wait_ms = self._wait_ms(event)
+        with self._lock:
+            stats = self._stats(event)
+            stats.checkouts += 1
+            stats.checked_out += 1
+            stats.max_checked_out = max(stats.max_checked_out, stats.checked_out)
+            stats.record_wait(wait_ms)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            stats = self._stats(event)
+            stats.checked_out = max(0, stats.checked_out - 1)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {address: stats.as_dict() for address, stats in self._pools.items()}
+
+    def reset(self):
+        """Reset counters and histograms; open/in-use gauges are kept"""
+        with self._lock:
+            for address, stats in self._pools.items():
+                fresh = PoolStats()
+                fresh.open = fresh.max_open = stats.open
+                fresh.checked_out = fresh.max_checked_out = stats.checked_out
+                self._pools[address] = fresh
+
+
+class PoolMonitor:
+    """Pool profile selection and the pool listener for the app's MongoClient"""
+
+    def __init__(self):
+        self.listener = PoolMetricsListener()
+        self.profile = 'default'
+        self.options = {}
+
+    def client_options(self, config) -> Dict:
+        """MongoClient keyword arguments for the configured profile"""
+        profiles = config.get('MONGO_POOL_PROFILES', {})
+        self.profile = config.get('MONGO_POOL_PROFILE', 'default')
+        if self.profile not in profiles:
+            logger.warning(f"Unknown MongoDB pool profile {self.profile!r}, using driver defaults")
+            profile = {}
+        else:
+            profile = profiles[self.profile]
+
+        options = {key: profile[key] for key in POOL_OPTIONS if profile.get(key) is not None}
+        compressors = config.get('MONGO_COMPRESSORS') or profile.get('compressors')
+        if compressors:
+            # zstd and snappy need the zstandard / python-snappy packages; pymongo skips them otherwise
+            options['compressors'] = compressors if isinstance(compressors, str) else ','.join(compressors)
+        self.options = options
+        return options
+
+    def snapshot(self) -> Dict:
+        return {
+            'profile': self.profile,
+            'options': self.options,
+            'pools': self.listener.snapshot()
+        }
+
+    def reset(self):
+        self.listener.reset()
+
+
+# Global instance for easy import
+pool_monitor = PoolMonitor()
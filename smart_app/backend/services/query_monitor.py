@@ -0,0 +1,252 @@
+# smart_app/backend/services/query_monitor.py
+"""
+Per-request MongoDB query accounting.
+
+A pymongo CommandListener attributes every command to the trackers active on
+the issuing thread: the tracker of the current Flask request (opened in
+before_request) and any `assert_query_budget` blocks. At the end of a request
+the totals are checked against the route's query budget, repeated commands
+against the same collection are reported as a likely N+1, and in development
+the totals are returned in X-Mongo-* response headers.
+
+    with assert_query_budget(5):
+        Voter.find_by_voter_id('AB123456')
+"""
+import time
+import logging
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from flask import g, request
+from pymongo import monitoring
+
+from smart_app.backend.mongo_models import invalidate_identity_map
+
+logger = logging.getLogger(__name__)
+
+# Handshake and session housekeeping are not application queries
+IGNORED_COMMANDS = {'hello', 'ismaster', 'isMaster', 'ping', 'endSessions', 'saslStart',
+                    'saslContinue', 'buildInfo', 'getLastError'}
+# Commands that change documents; they drop the request's identity map entries
+WRITE_COMMANDS = {'insert', 'update', 'delete', 'findAndModify'}
+
+_local = threading.local()
+
+
+def _active_trackers():
+    trackers = getattr(_local, 'trackers', None)
+    if trackers is None:
+        trackers = _local.trackers = []
+    return trackers
+
+
+def _documents_returned(command_name: str, reply) -> int:
+    """Number of documents in a command reply"""
+    cursor = reply.get('cursor')
+    if isinstance(cursor, dict):
+        return len(cursor.get('firstBatch') or cursor.get('nextBatch') or [])
+    if command_name == 'findAndModify':
+        return 1 if reply.get('value') else 0
+    if command_name == 'distinct':
+        return len(reply.get('values') or [])
+    return 0
+
+
+class QueryTracker:
+    """Commands, durations and documents returned within one request or block"""
+
+    def __init__(self, route: Optional[str] = None):
+        self.route = route
+        self.count = 0
+        self.duration_ms = 0.0
+        self.documents = 0
+        self.commands = Counter()   # command name -> count
+        self.shapes = Counter()     # (command name, collection) -> count
+        self.started_at = time.perf_counter()
+
+    def record(self, command_name: str, collection: Optional[str], duration_ms: float, documents: int):
+        self.count += 1
+        self.duration_ms += duration_ms
+        self.documents += documents
+        self.commands[command_name] += 1
+        self.shapes[(command_name, collection)] += 1
+
+    def repeated_queries(self, threshold: int):
+        """Command/collection pairs issued at least `threshold` times"""
+        return {f"{name} {collection}": count
+                for (name, collection), count in self.shapes.items()
+                if collection and count >= threshold}
+
+    def as_dict(self) -> Dict:
+        return {
+            'route': self.route,
+            'queries': self.count,
+            'duration_ms': round(self.duration_ms, 3),
+            'documents': self.documents,
+            'commands': dict(self.commands)
+        }
+
+
+class QueryCounterListener(monitoring.CommandListener):
+    """Feeds command events to the trackers of the issuing thread"""
+
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        if event.command_name in WRITE_COMMANDS and isinstance(collection, str):
+            # Catches writes that bypass MongoBase (get_collection().update_one(...))
+            invalidate_identity_map(collection)
+        if event.command_name in IGNORED_COMMANDS or not _active_trackers():
+            return
+        if event.command_name == 'getMore':
+            collection = event.command.get('collection')
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = (
+                collection if isinstance(collection, str) else None
+            )
+
+    def succeeded(self, event):
+        self._finish(event, _documents_returned(event.command_name, event.reply or {}))
+
+    def failed(self, event):
+        self._finish(event, 0)
+
+    def _finish(self, event, documents: int):
+        with self._lock:
+            key = (event.connection_id, event.request_id)
+            if key not in self._pending:
+                return
+            collection = self._pending.pop(key)
+        duration_ms = event.duration_micros / 1000.0
+        for tracker in _active_trackers():
+            tracker.record(event.command_name, collection, duration_ms, documents)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryMonitor:
+    """Flask integration: per-request trackers, budgets and route totals"""
+
+    def __init__(self):
+        self.listener = QueryCounterListener()
+        self.default_budget = 50
+        self.budgets = {}
+        self.n_plus_one_threshold = 10
+        self.add_headers = False
+        self._lock = threading.Lock()
+        self._routes = {}
+
+    def init_app(self, app):
+        self.default_budget = app.config.get('MONGO_QUERY_BUDGET', self.default_budget)
+        self.budgets = app.config.get('MONGO_QUERY_BUDGETS', {})
+        self.n_plus_one_threshold = app.config.get('MONGO_N_PLUS_ONE_THRESHOLD', self.n_plus_one_threshold)
+        self.add_headers = app.config.get('MONGO_QUERY_HEADERS', app.config.get('DEBUG', False))
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+
+    def budget_for(self, route: Optional[str]) -> int:
+        return self.budgets.get(route, self.default_budget)
+
+    def _before_request(self):
+        tracker = QueryTracker(request.endpoint)
+        g.mongo_queries = tracker
+        _active_trackers().append(tracker)
+
+    def _after_request(self, response):
+        tracker = g.get('mongo_queries')
+        if tracker is None:
+            return response
+
+        budget = self.budget_for(tracker.route)
+        if tracker.count > budget:
+            logger.warning(
+                f"Query budget exceeded on {tracker.route}: {tracker.count} queries "
+                f"(budget {budget}), {tracker.duration_ms:.1f} ms, {tracker.documents} documents"
+            )
+        repeated = tracker.repeated_queries(self.n_plus_one_threshold)
+        if repeated:
+            logger.warning(f"Possible N+1 queries on {tracker.route}: {repeated}")
+
+        self._record_route(tracker, budget)
+
+        if self.add_headers:
+            response.headers['X-Mongo-Queries'] = str(tracker.count)
+            response.headers['X-Mongo-Query-Time-Ms'] = f"{tracker.duration_ms:.1f}"
+            response.headers['X-Mongo-Documents'] = str(tracker.documents)
+        return response
+
+    def _teardown_request(self, error=None):
+        tracker = g.get('mongo_queries')
+        trackers = _active_trackers()
+        if tracker is not None and tracker in trackers:
+            trackers.remove(tracker)
+
+    def _record_route(self, tracker: QueryTracker, budget: int):
+        with self._lock:
+            totals = self._routes.setdefault(tracker.route, {
+                'requests': 0, 'queries': 0, 'max_queries': 0,
+                'duration_ms': 0.0, 'documents': 0, 'over_budget': 0
+            })
+            totals['requests'] += 1
+            totals['queries'] += tracker.count
+            totals['max_queries'] = max(totals['max_queries'], tracker.count)
+            totals['duration_ms'] += tracker.duration_ms
+            totals['documents'] += tracker.documents
+            totals['over_budget'] += 1 if tracker.count > budget else 0
+
+    def snapshot(self) -> Dict:
+        """Per-route totals since start (or the last reset)"""
+        with self._lock:
+            return {
+                route: {
+                    **totals,
+                    'duration_ms': round(totals['duration_ms'], 3),
+                    'avg_queries': round(totals['queries'] / totals['requests'], 2),
+                    'budget': self.budget_for(route)
+                }
+                for route, totals in self._routes.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._routes = {}
+
+
+@contextmanager
+def track_queries(route: Optional[str] = None):
+    """Count the queries issued by the current thread inside the block"""
+    tracker = QueryTracker(route)
+    trackers = _active_trackers()
+    trackers.append(tracker)
+    try:
+        yield tracker
+    finally:
+        trackers.remove(tracker)
+
+
+@contextmanager
+def assert_query_budget(max_queries: int, max_documents: Optional[int] = None):
+    """Fail with QueryBudgetExceeded if the block issues more queries (or returns more documents)"""
+    with track_queries() as tracker:
+        yield tracker
+    if tracker.count > max_queries:
+        raise QueryBudgetExceeded(
+            f"Expected at most {max_queries} queries, got {tracker.count}: {dict(tracker.shapes)}"
+        )
+    if max_documents is not None and tracker.documents > max_documents:
+        raise QueryBudgetExceeded(
+            f"Expected at most {max_documents} documents, got {tracker.documents}"
+        )
+
+
+# Global instance for easy import
+query_monitor = QueryMonitor()
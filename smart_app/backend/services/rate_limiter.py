@@ -0,0 +1,56 @@
+# smart_app/backend/services/rate_limiter.py
+import os
+import time
+import threading
+from collections import OrderedDict
+
+# Sustained face quality probes per second per client, and the burst allowed on top
+FACE_PROBE_RATE = float(os.getenv('FACE_PROBE_RATE', 5))
+FACE_PROBE_BURST = float(os.getenv('FACE_PROBE_BURST', 10))
+RATE_LIMITER_MAX_KEYS = 10000
+
+
+class RateLimiter:
+    """
+    In-process token bucket per client key. Each key refills at `rate` tokens
+    per second up to `burst`; a call is allowed when a whole token is left.
+    Limits are per worker process. The least recently used keys are dropped
+    beyond max_keys, which only resets their bucket to full.
+    """
+
+    def __init__(self, rate: float, burst: float, max_keys: int = RATE_LIMITER_MAX_KEYS):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()   # key -> (tokens, updated_at), least recently used first
+        self.stats = {'allowed': 0, 'limited': 0}
+
+    def allow(self, key: str) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated_at) * self.rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            self.stats['allowed' if allowed else 'limited'] += 1
+            return allowed
+
+    def retry_after(self, key: str) -> float:
+        """Seconds until `key` has a whole token again"""
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (self.burst, time.monotonic()))
+        tokens = min(self.burst, tokens + (time.monotonic() - updated_at) * self.rate)
+        return max(0.0, (1 - tokens) / self.rate) if self.rate else float('inf')
+
+    def get_statistics(self) -> dict:
+        with self._lock:
+            return {**self.stats, 'tracked_keys': len(self._buckets), 'rate': self.rate, 'burst': self.burst}
+
+
+# Shared by the HTTP and Socket.IO quality probes, keyed by client address
+face_probe_limiter = RateLimiter(FACE_PROBE_RATE, FACE_PROBE_BURST)
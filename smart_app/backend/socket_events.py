@@ -1,8 +1,10 @@
 import logging
 from flask_socketio import emit, join_room, leave_room
-from flask import request
+from flask import request, current_app
 from datetime import datetime, timedelta
 from smart_app.backend.mongo_models import Voter, Admin
+from smart_app.backend.services.face_stream_service import face_streams
+from smart_app.backend.services.rate_limiter import face_probe_limiter
 
 logger = logging.getLogger(__name__)
 
@@ -159,6 +161,7 @@ def register_socket_events(socketio):
     def handle_disconnect(reason=None):
         """Handle client disconnection"""
         try:
+            face_streams.end(request.sid)
             client_data = connected_clients.pop(request.sid, None)
             if client_data:
                 user_type = client_data.get('type')
@@ -394,6 +397,143 @@ def register_socket_events(socketio):
         except Exception as e:
             logger.error(f"Voting heartbeat error: {str(e)}")
 
+    @socketio.on('face_verify_start')
+    def handle_face_verify_start(data=None):
+        """Start a streaming face verification for the connected voter"""
+        try:
+            data = data or {}
+            client_data = connected_clients.get(request.sid)
+            if not client_data or client_data.get('type') != 'voter':
+                safe_emit('face_verify_result', {'success': False, 'message': 'Voter connection required'})
+                return
+            
+            voter_id = client_data.get('voter_id')
+            
+            # The temporary token from the credentials step must belong to this voter
+            from smart_app.backend.routes.auth import verify_token
+            payload = verify_token(data.get('token') or client_data.get('auth_token') or '')
+            if not payload or payload.get('voter_id') != voter_id:
+                safe_emit('face_verify_result', {'success': False, 'message': 'Invalid or expired token'})
+                return
+            
+            voter = Voter.find_by_voter_id(voter_id)
+            if not voter or not voter.get('face_verified') or not voter.get('face_encoding_id'):
+                safe_emit('face_verify_result', {
+                    'success': False,
+                    'message': 'Face biometrics not registered. Please complete registration first.'
+                })
+                return
+            
+            config = current_app.config
+            stream = face_streams.start(
+                request.sid,
+                voter_id,
+                required_matches=config.get('FACE_STREAM_REQUIRED_MATCHES', 2),
+                instant_accept=config.get('FACE_STREAM_INSTANT_ACCEPT', 0.90),
+                max_frames=config.get('FACE_STREAM_MAX_FRAMES', 20),
+                max_seconds=config.get('FACE_STREAM_MAX_SECONDS', 15),
+                max_frame_bytes=config.get('FACE_STREAM_MAX_FRAME_BYTES', 256 * 1024)
+            )
+            
+            safe_emit('face_verify_ready', {
+                'voter_id': voter_id,
+                'required_matches': stream.required_matches,
+                'max_frames': stream.max_frames,
+                'max_seconds': stream.max_seconds,
+                'max_frame_bytes': stream.max_frame_bytes,
+                'timestamp': datetime.utcnow().isoformat()
+            })
+            
+            logger.info(f"Streaming face verification started for voter {voter_id}")
+            
+        except Exception as e:
+            logger.error(f"Face verify start error: {str(e)}")
+            safe_emit('face_verify_result', {'success': False, 'message': 'Failed to start face verification'})
+
+    @socketio.on('face_verify_frame')
+    def handle_face_verify_frame(data):
+        """Verify one binary JPEG frame of an active stream"""
+        try:
+            stream = face_streams.get(request.sid)
+            if not stream:
+                safe_emit('face_verify_result', {'success': False, 'message': 'No active face verification'})
+                return
+            
+            # Accept a raw binary attachment or {'frame': <bytes>}
+            frame = data.get('frame') if isinstance(data, dict) else data
+            state = stream.process_frame(bytes(frame) if frame else b'')
+            
+            if state['status'] == 'active':
+                safe_emit('face_verify_progress', state)
+                return
+            
+            face_streams.end(request.sid)
+            
+            if state['status'] == 'accepted':
+                voter = Voter.find_by_voter_id(stream.voter_id)
+                from smart_app.backend.routes.auth import complete_face_login
+                voter_data, final_token = complete_face_login(
+                    voter,
+                    stream.best_result,
+                    request.remote_addr,
+                    action="face_verified_stream"
+                )
+                safe_emit('face_verify_result', {
+                    **state,
+                    'success': True,
+                    'voter_data': voter_data,
+                    'token': final_token,
+                    'auth_token': final_token
+                })
+                logger.info(f"Streaming face verification accepted for voter {stream.voter_id} "
+                            f"after {state['frames']} frames")
+            else:
+                safe_emit('face_verify_result', {**state, 'success': False})
+                logger.info(f"Streaming face verification rejected for voter {stream.voter_id}: {state['message']}")
+            
+        except Exception as e:
+            logger.error(f"Face verify frame error: {str(e)}")
+            face_streams.end(request.sid)
+            safe_emit('face_verify_result', {'success': False, 'message': 'Face verification failed. Please try again.'})
+
+    @socketio.on('face_verify_cancel')
+    def handle_face_verify_cancel(data=None):
+        """Cancel the active streaming face verification"""
+        try:
+            if face_streams.end(request.sid):
+                safe_emit('face_verify_result', {'success': False, 'status': 'cancelled', 'message': 'Verification cancelled'})
+        except Exception as e:
+            logger.error(f"Face verify cancel error: {str(e)}")
+
+    @socketio.on('face_quality_probe')
+    def handle_face_quality_probe(data):
+        """Answer a binary capture frame with live quality guidance"""
+        try:
+            if request.sid not in connected_clients:
+                return
+            # Same per-address budget as the HTTP probe, so reconnecting does not reset it
+            if not face_probe_limiter.allow(f"ip:{request.remote_addr}"):
+                safe_emit('face_quality', {'success': False, 'rate_limited': True,
+                                           'message': 'Too many quality probes, slow down'})
+                return
+            
+            frame = data.get('frame') if isinstance(data, dict) else data
+            if not frame:
+                safe_emit('face_quality', {'success': False, 'message': 'Frame required'})
+                return
+            
+            from smart_app.backend.services.face_recognition_service import hybrid_face_service
+            probe = hybrid_face_service.face_service.probe_face_quality(
+                bytes(frame),
+                quality_threshold=hybrid_face_service.config['quality_threshold']
+            )
+            safe_emit('face_quality', {'success': True, **probe})
+            
+        except ValueError as e:
+            safe_emit('face_quality', {'success': False, 'message': str(e)})
+        except Exception as e:
+            logger.error(f"Face quality probe error: {str(e)}")
+
     # Authentication helper functions
     def validate_auth_token(voter_id, token):
         """Validate voter authentication token"""
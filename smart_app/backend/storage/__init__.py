@@ -0,0 +1,41 @@
+# smart_app/backend/storage/__init__.py
+"""
+Storage backend selection.
+
+STORAGE_BACKEND=mongo (default) connects Flask-PyMongo as before.
+STORAGE_BACKEND=memory puts an in-process MemoryClient behind `mongo.cx` /
+`mongo.db`, so models, routes and services run unchanged without a mongod;
+command listeners in `event_listeners` are fed by it as well.
+Benchmarks and load tests use it to measure application-layer CPU apart from
+database latency. Data lives only as long as the process.
+"""
+import logging
+
+from smart_app.backend.extensions import mongo
+from smart_app.backend.storage.memory import MemoryClient
+
+logger = logging.getLogger(__name__)
+
+STORAGE_BACKENDS = ('mongo', 'memory')
+
+
+def init_storage(app, **client_options):
+    """Connect the configured backend; client_options go to MongoClient"""
+    backend = app.config.get('STORAGE_BACKEND', 'mongo')
+    if backend not in STORAGE_BACKENDS:
+        raise ValueError(f"Unknown STORAGE_BACKEND {backend!r}, expected one of {STORAGE_BACKENDS}")
+
+    if backend == 'memory':
+        mongo.cx = MemoryClient(event_listeners=client_options.get('event_listeners'))
+        mongo.db = mongo.cx[app.config.get('MONGO_DB_NAME', 'smart_voting_system')]
+        logger.warning("Using in-memory storage backend; data is not persisted")
+    else:
+        mongo.init_app(app, **client_options)
+
+    app.extensions['storage_backend'] = backend
+    return backend
+
+
+def get_database():
+    """The active database (pymongo Database or MemoryDatabase)"""
+    return mongo.db
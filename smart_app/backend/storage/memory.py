@@ -0,0 +1,1316 @@
+# smart_app/backend/storage/memory.py
+"""
+In-memory storage engine with the pymongo Collection API subset the models use.
+
+Documents live in per-collection dicts keyed by _id and are deep-copied in and
+out, like BSON encoding would. One lock per database serialises writes and
+reads, so it is safe under the threading Socket.IO worker. Filters support
+equality (including array membership and dotted paths), $eq/$ne/$gt/$gte/
+$lt/$lte/$in/$nin/$exists/$regex/$not/$type/$size/$elemMatch/$all and
+$and/$or/$nor; updates support $set/$unset/$inc/$mul/$min/$max/$push/
+$addToSet/$pull/$setOnInsert/$currentDate; aggregation supports $match,
+$group, $lookup, $unwind, $sort, $limit, $skip, $project, $addFields, $count
+and $bucket with the expression operators used in the routes. Equality
+lookups on the first field of a declared index use a hash index and unique
+indexes are enforced, so per-request latency reflects the application rather
+than full scans. Anything else raises OperationFailure.
+
+Command listeners passed as event_listeners (pymongo.monitoring.CommandListener)
+get started/succeeded/failed events for each operation, named after the
+command pymongo would send (find, aggregate, insert, update, findAndModify,
+...), so query accounting works the same as against a server.
+with_options(read_preference=...) returns a view of the same data whose
+reads carry $readPreference, so read routing can be observed without a
+replica set.
+"""
+import copy
+import itertools
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from bson import ObjectId
+from pymongo import ReturnDocument, IndexModel, ASCENDING, monitoring
+from pymongo.read_preferences import ReadPreference
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from pymongo.operations import InsertOne, UpdateOne, UpdateMany, ReplaceOne, DeleteOne, DeleteMany
+from pymongo.results import (
+    InsertOneResult, InsertManyResult, UpdateResult, DeleteResult, BulkWriteResult
+)
+
+_MISSING = object()
+
+# Commands that honour the collection's read preference
+_READ_COMMANDS = {'find', 'aggregate', 'distinct', 'count'}
+
+# Filter operators that give an index scan bounds on the field
+_BOUNDED_OPERATORS = {'$eq', '$in', '$gt', '$gte', '$lt', '$lte', '$all', '$elemMatch'}
+
+# Sort order across types, following BSON comparison order
+_TYPE_ORDER = {type(None): 1, int: 2, float: 2, str: 3, dict: 4, list: 5, bytes: 6,
+               ObjectId: 7, bool: 8, datetime: 9}
+
+_TYPE_NAMES = {
+    'double': (float,), 'string': (str,), 'object': (dict,), 'array': (list,),
+    'binData': (bytes,), 'objectId': (ObjectId,), 'bool': (bool,), 'date': (datetime,),
+    'null': (type(None),), 'int': (int,), 'long': (int,), 'number': (int, float)
+}
+
+
+def _sort_key(value):
+    if value is _MISSING:
+        value = None
+    rank = _TYPE_ORDER.get(type(value), 10)
+    if isinstance(value, (dict, list)):
+        return (rank, repr(value))
+    return (rank, value)
+
+
+def _get(doc, path):
+    """Value at a dotted path, or _MISSING; array elements are searched for nested paths"""
+    value = doc
+    for part in path.split('.'):
+        if isinstance(value, dict):
+            value = value.get(part, _MISSING)
+        elif isinstance(value, list):
+            if part.isdigit():
+                index = int(part)
+                value = value[index] if index < len(value) else _MISSING
+            else:
+                values = [item.get(part, _MISSING) for item in value if isinstance(item, dict)]
+                values = [v for v in values if v is not _MISSING]
+                value = values if values else _MISSING
+        else:
+            return _MISSING
+        if value is _MISSING:
+            return _MISSING
+    return value
+
+
+def _equal(a, b):
+    """BSON equality: like ==, except that booleans never equal numbers"""
+    if isinstance(a, bool) or isinstance(b, bool):
+        return type(a) is type(b) and a == b
+    if isinstance(a, dict) and isinstance(b, dict):
+        return a.keys() == b.keys() and all(_equal(a[k], b[k]) for k in a)
+    if isinstance(a, list) and isinstance(b, list):
+        return len(a) == len(b) and all(_equal(x, y) for x, y in zip(a, b))
+    return a == b
+
+
+def _candidates(value):
+    """Values a filter condition is tested against (an array and each of its elements)"""
+    if isinstance(value, list):
+        return [value] + value
+    return [value]
+
+
+def _compare(a, b, op):
+    if a is _MISSING:
+        a = None
+    try:
+        if op == '$gt':
+            return a > b
+        if op == '$gte':
+            return a >= b
+        if op == '$lt':
+            return a < b
+        return a <= b
+    except TypeError:
+        # Different BSON types never match range operators
+        return False
+
+
+def _regex(pattern, options=''):
+    if isinstance(pattern, re.Pattern):
+        return pattern
+    flags = 0
+    for option in options or '':
+        flags |= {'i': re.IGNORECASE, 'm': re.MULTILINE, 's': re.DOTALL, 'x': re.VERBOSE}.get(option, 0)
+    return re.compile(pattern, flags)
+
+
+def _is_operator_dict(value):
+    return isinstance(value, dict) and value and all(str(k).startswith('$') for k in value)
+
+
+def _match_condition(value, condition):
+    """Does the value at a path satisfy condition (a literal or an operator document)?"""
+    if not _is_operator_dict(condition):
+        if isinstance(condition, re.Pattern):
+            return any(isinstance(v, str) and condition.search(v) for v in _candidates(value))
+        if condition is None:
+            return value is _MISSING or None in _candidates(value)
+        return value is not _MISSING and any(_equal(v, condition) for v in _candidates(value))
+
+    for op, arg in condition.items():
+        if op == '$eq':
+            if not _match_condition(value, arg):
+                return False
+        elif op == '$ne':
+            if _match_condition(value, arg):
+                return False
+        elif op in ('$gt', '$gte', '$lt', '$lte'):
+            if value is _MISSING or not any(_compare(v, arg, op) for v in _candidates(value)):
+                return False
+        elif op == '$in':
+            if not any(_match_condition(value, item) for item in arg):
+                return False
+        elif op == '$nin':
+            if any(_match_condition(value, item) for item in arg):
+                return False
+        elif op == '$exists':
+            if (value is not _MISSING) != bool(arg):
+                return False
+        elif op == '$regex':
+            pattern = _regex(arg, condition.get('$options'))
+            if not any(isinstance(v, str) and pattern.search(v) for v in _candidates(value)):
+                return False
+        elif op == '$options':
+            continue
+        elif op == '$not':
+            if _match_condition(value, arg):
+                return False
+        elif op == '$type':
+            names = arg if isinstance(arg, list) else [arg]
+            types = tuple(t for name in names for t in _TYPE_NAMES.get(name, ()))
+            if value is _MISSING or not isinstance(value, types) or \
+                    (isinstance(value, bool) and bool not in types):
+                return False
+        elif op == '$size':
+            if not isinstance(value, list) or len(value) != arg:
+                return False
+        elif op == '$all':
+            # An $and of the conditions, so a scalar matches a one-element $all
+            if not arg or not all(_match_condition(value, item) for item in arg):
+                return False
+        elif op == '$elemMatch':
+            if not isinstance(value, list):
+                return False
+            if _is_operator_dict(arg):
+                if not any(_match_condition(item, arg) for item in value):
+                    return False
+            elif not any(isinstance(item, dict) and match(item, arg) for item in value):
+                return False
+        else:
+            raise OperationFailure(f"Unsupported query operator in memory storage: {op}")
+    return True
+
+
+def match(doc, query):
+    """True if doc satisfies the filter document"""
+    for key, condition in (query or {}).items():
+        if key == '$and':
+            if not all(match(doc, q) for q in condition):
+                return False
+        elif key == '$or':
+            if not any(match(doc, q) for q in condition):
+                return False
+        elif key == '$nor':
+            if any(match(doc, q) for q in condition):
+                return False
+        elif key == '$expr':
+            if not evaluate(condition, doc):
+                return False
+        elif not _match_condition(_get(doc, key), condition):
+            return False
+    return True
+
+
+def project(doc, projection):
+    """Apply an inclusion or exclusion projection (doc must be the caller's own copy)"""
+    if not projection:
+        return doc
+    include_id = projection.get('_id', 1)
+    fields = {k: v for k, v in projection.items() if k != '_id'}
+    inclusion = any(v for v in fields.values())
+
+    if inclusion:
+        result = {}
+        if include_id and '_id' in doc:
+            result['_id'] = doc['_id']
+        for path, spec in fields.items():
+            if not spec:
+                continue
+            if not isinstance(spec, (int, bool)):
+                result[path] = evaluate(spec, doc)
+                continue
+            value = _get(doc, path)
+            if value is _MISSING:
+                continue
+            target = result
+            parts = path.split('.')
+            for part in parts[:-1]:
+                target = target.setdefault(part, {})
+            target[parts[-1]] = value
+        return result
+
+    result = doc
+    for path in fields:
+        _unset(result, path)
+    if not include_id:
+        result.pop('_id', None)
+    return result
+
+
+# ---------------------------------------------------------------- updates
+
+def _parent(doc, path, create=True):
+    parts = path.split('.')
+    target = doc
+    for part in parts[:-1]:
+        if part not in target or not isinstance(target[part], dict):
+            if not create:
+                return None, parts[-1]
+            target[part] = {}
+        target = target[part]
+    return target, parts[-1]
+
+
+def _set(doc, path, value):
+    target, key = _parent(doc, path)
+    target[key] = value
+
+
+def _unset(doc, path):
+    target, key = _parent(doc, path, create=False)
+    if target is not None:
+        target.pop(key, None)
+
+
+def _number(value, path):
+    if value is _MISSING or value is None:
+        return 0
+    if not isinstance(value, (int, float)) or isinstance(value, bool):
+        raise OperationFailure(f"Cannot apply arithmetic to non-numeric field {path}")
+    return value
+
+
+def apply_update(doc, update, is_insert=False):
+    """Apply an update document in place"""
+    if not any(str(k).startswith('$') for k in update):
+        _id = doc.get('_id')
+        doc.clear()
+        doc.update(copy.deepcopy(update))
+        if _id is not None:
+            doc['_id'] = _id
+        return
+
+    for op, fields in update.items():
+        for path, arg in fields.items():
+            current = _get(doc, path)
+            if op == '$set':
+                _set(doc, path, copy.deepcopy(arg))
+            elif op == '$setOnInsert':
+                if is_insert:
+                    _set(doc, path, copy.deepcopy(arg))
+            elif op == '$unset':
+                _unset(doc, path)
+            elif op == '$inc':
+                _set(doc, path, _number(current, path) + arg)
+            elif op == '$mul':
+                _set(doc, path, _number(current, path) * arg)
+            elif op == '$min':
+                if current is _MISSING or _compare(arg, current, '$lt'):
+                    _set(doc, path, arg)
+            elif op == '$max':
+                if current is _MISSING or _compare(arg, current, '$gt'):
+                    _set(doc, path, arg)
+            elif op == '$currentDate':
+                _set(doc, path, datetime.utcnow())
+            elif op in ('$push', '$addToSet'):
+                items = arg['$each'] if isinstance(arg, dict) and '$each' in arg else [arg]
+                array = [] if current is _MISSING or current is None else current
+                if not isinstance(array, list):
+                    raise OperationFailure(f"Cannot apply {op} to non-array field {path}")
+                array = list(array)
+                for item in items:
+                    if op == '$push' or not any(_equal(item, existing) for existing in array):
+                        array.append(copy.deepcopy(item))
+                _set(doc, path, array)
+            elif op == '$pull':
+                if isinstance(current, list):
+                    if isinstance(arg, dict):
+                        kept = [item for item in current if not (
+                            _match_condition(item, arg) if _is_operator_dict(arg)
+                            else isinstance(item, dict) and match(item, arg))]
+                    else:
+                        kept = [item for item in current if not _equal(item, arg)]
+                    _set(doc, path, kept)
+            else:
+                raise OperationFailure(f"Unsupported update operator in memory storage: {op}")
+
+
+def _upsert_seed(query):
+    """Fields an upsert copies from the filter (top-level equalities)"""
+    seed = {}
+    for key, condition in (query or {}).items():
+        if key.startswith('$'):
+            continue
+        if _is_operator_dict(condition):
+            if '$eq' in condition:
+                _set(seed, key, copy.deepcopy(condition['$eq']))
+        else:
+            _set(seed, key, copy.deepcopy(condition))
+    return seed
+
+
+# ------------------------------------------------------------- expressions
+
+def _to_millis(value):
+    if isinstance(value, datetime):
+        return value.timestamp() * 1000
+    return value
+
+
+def evaluate(expression, doc, variables=None):
+    """Evaluate an aggregation expression against doc"""
+    if isinstance(expression, str) and expression.startswith('$$'):
+        name, _, path = expression[2:].partition('.')
+        base = doc if name in ('ROOT', 'CURRENT') else (variables or {}).get(name, _MISSING)
+        value = _get(base, path) if path and base is not _MISSING else base
+        return None if value is _MISSING else value
+    if isinstance(expression, str) and expression.startswith('$'):
+        value = _get(doc, expression[1:])
+        return None if value is _MISSING else value
+    if isinstance(expression, list):
+        return [evaluate(item, doc, variables) for item in expression]
+    if not isinstance(expression, dict):
+        return expression
+    if not _is_operator_dict(expression):
+        return {key: evaluate(value, doc, variables) for key, value in expression.items()}
+
+    (op, arg), = expression.items()
+    if op == '$literal':
+        return arg
+    if op == '$cond':
+        if isinstance(arg, dict):
+            condition, then, otherwise = arg['if'], arg['then'], arg['else']
+        else:
+            condition, then, otherwise = arg
+        return evaluate(then if evaluate(condition, doc, variables) else otherwise, doc, variables)
+    if op == '$ifNull':
+        for item in arg:
+            value = evaluate(item, doc, variables)
+            if value is not None:
+                return value
+        return None
+    if op == '$regexMatch':
+        value = evaluate(arg['input'], doc, variables)
+        return isinstance(value, str) and bool(_regex(arg['regex'], arg.get('options')).search(value))
+    if op == '$dateToString':
+        value = evaluate(arg['date'], doc, variables)
+        if not isinstance(value, datetime):
+            return arg.get('onNull')
+        return value.strftime(arg.get('format', '%Y-%m-%dT%H:%M:%S.%LZ').replace('%L', f"{value.microsecond // 1000:03d}"))
+
+    values = evaluate(arg, doc, variables)
+    args = values if isinstance(arg, list) else [values]
+    if op in ('$hour', '$minute', '$year', '$month', '$dayOfMonth', '$dayOfWeek'):
+        value = args[0]
+        if not isinstance(value, datetime):
+            return None
+        if op == '$dayOfWeek':
+            return value.isoweekday() % 7 + 1
+        return getattr(value, {'$dayOfMonth': 'day'}.get(op, op[1:]))
+    if op == '$concat':
+        return None if any(a is None for a in args) else ''.join(str(a) for a in args)
+    if op == '$substrCP':
+        text, start, length = args
+        text = text or ''
+        start = max(0, len(text) + start) if start < 0 else start
+        return text[start:start + length]
+    if op in ('$toLower', '$toUpper'):
+        return (args[0] or '').lower() if op == '$toLower' else (args[0] or '').upper()
+    if op == '$toString':
+        return None if args[0] is None else str(args[0])
+    if op == '$size':
+        return len(args[0] or [])
+    if op == '$add':
+        if any(isinstance(a, datetime) for a in args):
+            base = next(a for a in args if isinstance(a, datetime))
+            return base + timedelta(milliseconds=sum(a for a in args if not isinstance(a, datetime)))
+        return sum(a or 0 for a in args)
+    if op == '$subtract':
+        a, b = args
+        if isinstance(a, datetime) and isinstance(b, datetime):
+            return (a - b).total_seconds() * 1000
+        if a is None or b is None:
+            return None
+        try:
+            return _to_millis(a) - _to_millis(b)
+        except TypeError:
+            return None
+    if op == '$multiply':
+        result = 1
+        for a in args:
+            if a is None:
+                return None
+            result *= a
+        return result
+    if op == '$divide':
+        a, b = args
+        return None if a is None or b in (None, 0) else a / b
+    if op == '$round':
+        value, places = (args + [0])[:2]
+        return None if value is None else round(value, places)
+    if op in ('$eq', '$ne', '$gt', '$gte', '$lt', '$lte'):
+        a, b = args
+        if op == '$eq':
+            return a == b
+        if op == '$ne':
+            return a != b
+        return _compare(a, b, op)
+    if op == '$in':
+        return args[0] in (args[1] or [])
+    if op == '$and':
+        return all(args)
+    if op == '$or':
+        return any(args)
+    if op == '$not':
+        return not args[0]
+    if op == '$max':
+        present = [a for a in (args[0] if len(args) == 1 and isinstance(args[0], list) else args) if a is not None]
+        return max(present, key=_sort_key) if present else None
+    if op == '$min':
+        present = [a for a in (args[0] if len(args) == 1 and isinstance(args[0], list) else args) if a is not None]
+        return min(present, key=_sort_key) if present else None
+    raise OperationFailure(f"Unsupported expression operator in memory storage: {op}")
+
+
+class _Accumulator:
+    def __init__(self, op, expression):
+        self.op = op
+        self.expression = expression
+        self.values = []
+
+    def add(self, doc):
+        if self.op == '$count':
+            self.values.append(1)
+        else:
+            self.values.append(evaluate(self.expression, doc))
+
+    def result(self):
+        op, values = self.op, self.values
+        numbers = [v for v in values if isinstance(v, (int, float)) and not isinstance(v, bool)]
+        if op in ('$sum', '$count'):
+            return sum(numbers)
+        if op == '$avg':
+            return sum(numbers) / len(numbers) if numbers else None
+        present = [v for v in values if v is not None]
+        if op == '$min':
+            return min(present, key=_sort_key) if present else None
+        if op == '$max':
+            return max(present, key=_sort_key) if present else None
+        if op == '$first':
+            return values[0] if values else None
+        if op == '$last':
+            return values[-1] if values else None
+        if op == '$push':
+            return values
+        if op == '$addToSet':
+            unique = []
+            for value in values:
+                if value not in unique:
+                    unique.append(value)
+            return unique
+        raise OperationFailure(f"Unsupported accumulator in memory storage: {op}")
+
+
+def _group(docs, spec):
+    groups = OrderedDict()
+    for doc in docs:
+        key = evaluate(spec['_id'], doc)
+        hashable = repr(key)
+        if hashable not in groups:
+            groups[hashable] = (key, {
+                field: _Accumulator(*next(iter(acc.items())))
+                for field, acc in spec.items() if field != '_id'
+            })
+        for accumulator in groups[hashable][1].values():
+            accumulator.add(doc)
+    return [
+        {'_id': key, **{field: acc.result() for field, acc in accumulators.items()}}
+        for key, accumulators in groups.values()
+    ]
+
+
+def _sort(docs, spec):
+    items = list(spec.items()) if isinstance(spec, dict) else list(spec)
+    docs = list(docs)
+    # Stable sorts applied from the least significant key
+    for field, direction in reversed(items):
+        docs.sort(key=lambda d: _sort_key(_get(d, field)), reverse=direction == -1)
+    return docs
+
+
+def _unwind(docs, spec):
+    if isinstance(spec, str):
+        spec = {'path': spec}
+    path = spec['path'][1:]
+    preserve = spec.get('preserveNullAndEmptyArrays', False)
+    index_field = spec.get('includeArrayIndex')
+    for doc in docs:
+        value = _get(doc, path)
+        if isinstance(value, list) and value:
+            for i, item in enumerate(value):
+                unwound = copy.copy(doc)
+                _set(unwound, path, item)
+                if index_field:
+                    unwound[index_field] = i
+                yield unwound
+        elif isinstance(value, list) or value is _MISSING or value is None:
+            if preserve:
+                unwound = copy.copy(doc)
+                if isinstance(value, list):
+                    # An empty array is dropped from the output, null is kept
+                    unwound = copy.deepcopy(doc)
+                    _unset(unwound, path)
+                if index_field:
+                    unwound[index_field] = None
+                yield unwound
+        else:
+            unwound = copy.copy(doc)
+            if index_field:
+                unwound[index_field] = None
+            yield unwound
+
+
+def _bucket(docs, spec):
+    boundaries = spec['boundaries']
+    output = spec.get('output') or {'count': {'$sum': 1}}
+    buckets = OrderedDict()
+    for doc in docs:
+        value = evaluate(spec['groupBy'], doc)
+        key = spec.get('default', _MISSING)
+        for lower, upper in zip(boundaries, boundaries[1:]):
+            if value is not None and _compare(value, lower, '$gte') and _compare(value, upper, '$lt'):
+                key = lower
+                break
+        if key is _MISSING:
+            raise OperationFailure("$bucket value outside boundaries and no default")
+        buckets.setdefault(repr(key), (key, []))[1].append(doc)
+    order = {repr(b): i for i, b in enumerate(boundaries)}
+    results = []
+    for hashable, (key, members) in sorted(buckets.items(), key=lambda item: order.get(item[0], len(order))):
+        group = _group(members, {'_id': None, **output})[0]
+        group['_id'] = key
+        results.append(group)
+    return results
+
+
+# ------------------------------------------------------------- collections
+
+def _implies(query, partial_filter):
+    """Whether every document matching query also matches partial_filter (equality and $in cases)"""
+    for field, condition in partial_filter.items():
+        if field.startswith('$') or field not in query:
+            return False
+        value = query[field]
+        if value == condition:
+            continue
+        if _is_operator_dict(value):
+            if set(value) != {'$in'}:
+                return False
+            values = value['$in']
+        else:
+            values = [value]
+        if not all(match({field: v}, {field: condition}) for v in values):
+            return False
+    return True
+
+
+def _bulk_command(operation):
+    """The write command pymongo sends a bulk operation as"""
+    if isinstance(operation, InsertOne):
+        return 'insert'
+    if isinstance(operation, (UpdateOne, UpdateMany, ReplaceOne)):
+        return 'update'
+    if isinstance(operation, (DeleteOne, DeleteMany)):
+        return 'delete'
+    return None
+
+
+class MemoryCursor:
+    """Lazy find()/aggregate() result supporting the cursor methods the code uses"""
+
+    def __init__(self, loader, planner=None):
+        self._loader = loader
+        self._planner = planner
+        self._sort = None
+        self._skip = 0
+        self._limit = 0
+        self._results = None
+
+    def sort(self, key_or_list, direction=None):
+        if isinstance(key_or_list, str):
+            self._sort = [(key_or_list, direction or ASCENDING)]
+        else:
+            self._sort = list(key_or_list.items()) if isinstance(key_or_list, dict) else list(key_or_list)
+        return self
+
+    def skip(self, count):
+        self._skip = count
+        return self
+
+    def limit(self, count):
+        self._limit = count
+        return self
+
+    def batch_size(self, size):
+        return self
+
+    def hint(self, index):
+        return self
+
+    def explain(self):
+        plan = self._planner(self._sort) if self._planner else {'stage': 'COLLSCAN'}
+        return {'queryPlanner': {'winningPlan': plan}}
+
+    def _materialize(self):
+        if self._results is None:
+            self._results = iter(self._loader(self._sort, self._skip, self._limit))
+        return self._results
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._materialize())
+
+    def next(self):
+        return self.__next__()
+
+    def to_list(self, length=None):
+        return list(self) if length is None else [doc for _, doc in zip(range(length), self)]
+
+    def close(self):
+        self._results = iter(())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class MemoryCollection:
+    """A collection held in memory; see the module docstring for supported operations"""
+
+    def __init__(self, database, name):
+        self.database = database
+        self.name = name
+        self.full_name = f"{database.name}.{name}"
+        self._docs = OrderedDict()       # _id -> document
+        self._order = {}                 # _id -> insertion number, for natural order
+        self._insert_numbers = itertools.count(1)
+        self._read_preference = ReadPreference.PRIMARY
+        self._indexes = {'_id_': {'key': [('_id', ASCENDING)], 'v': 2}}
+        self._hash = {}                  # field -> {value: set(_id)}
+        self._unhashed = {}              # field -> set(_id) whose value could not be hashed
+        self._lock = database._lock
+
+    @contextmanager
+    def _command(self, command_name, **command):
+        """Report one operation to the client's command listeners; the body fills in the reply"""
+        reply = {'ok': 1.0}
+        client = self.database.client
+        if not client._listeners:
+            yield reply
+            return
+        command = {command_name: self.name, **command}
+        if command_name in _READ_COMMANDS and self._read_preference.mode:
+            command['$readPreference'] = self._read_preference.document
+        event = client._started(self.database.name, command_name, command)
+        try:
+            yield reply
+        except Exception as e:
+            client._failed(event, e)
+            raise
+        client._succeeded(event, reply)
+
+    # -- options and metadata
+
+    def with_options(self, read_preference=None, **kwargs):
+        """A view of the same documents and indexes with another read preference"""
+        view = copy.copy(self)
+        if read_preference is not None:
+            view._read_preference = read_preference
+        return view
+
+    @property
+    def read_preference(self):
+        return self._read_preference
+
+    def index_information(self):
+        with self._lock:
+            return copy.deepcopy(self._indexes)
+
+    def create_index(self, keys, **kwargs):
+        return self.create_indexes([IndexModel(keys, **kwargs)])[0]
+
+    def create_indexes(self, indexes):
+        names = []
+        with self._command('createIndexes'), self._lock:
+            for index in indexes:
+                document = dict(index.document)
+                keys = list(document.pop('key').items())
+                name = document.pop('name')
+                info = {'key': keys, 'v': 2, **document}
+                if info.get('unique'):
+                    self._check_unique_existing(keys, info)
+                self._indexes[name] = info
+                self._build_hash(keys[0][0])
+                names.append(name)
+        return names
+
+    def drop_index(self, name):
+        with self._lock:
+            self._indexes.pop(name, None)
+            fields = {info['key'][0][0] for info in self._indexes.values()}
+            for field in list(self._hash):
+                if field not in fields:
+                    self._hash.pop(field)
+                    self._unhashed.pop(field, None)
+
+    def estimated_document_count(self, **kwargs):
+        with self._command('count') as reply:
+            reply['n'] = len(self._docs)
+        return reply['n']
+
+    # -- hash and unique indexes
+
+    def _build_hash(self, field):
+        if field in self._hash or field == '_id':
+            return
+        self._hash[field] = {}
+        self._unhashed[field] = set()
+        for doc in self._docs.values():
+            self._hash_add(field, doc)
+
+    @staticmethod
+    def _hash_values(doc, field):
+        value = _get(doc, field)
+        if value is _MISSING:
+            return [None], False
+        if isinstance(value, list):
+            # Elements are indexed; whole-array equality falls back to matching
+            return value, True
+        return [value], False
+
+    def _hash_add(self, field, doc):
+        values, is_array = self._hash_values(doc, field)
+        if is_array:
+            self._unhashed[field].add(doc['_id'])
+        for value in values:
+            try:
+                self._hash[field].setdefault(value, set()).add(doc['_id'])
+            except TypeError:
+                self._unhashed[field].add(doc['_id'])
+
+    def _hash_remove(self, field, doc):
+        self._unhashed[field].discard(doc['_id'])
+        for value in self._hash_values(doc, field)[0]:
+            try:
+                ids = self._hash[field].get(value)
+            except TypeError:
+                continue
+            if ids:
+                ids.discard(doc['_id'])
+                if not ids:
+                    del self._hash[field][value]
+
+    def _index_doc(self, doc):
+        for field in self._hash:
+            self._hash_add(field, doc)
+
+    def _unindex_doc(self, doc):
+        for field in self._hash:
+            self._hash_remove(field, doc)
+
+    @staticmethod
+    def _key_values(value):
+        """Index keys of one field: each element of an array (an empty array is one key), else the value"""
+        if value is _MISSING:
+            return [None]
+        if isinstance(value, list):
+            return value or [[]]
+        return [value]
+
+    def _unique_keys(self, doc, keys, info):
+        """The keys doc has in a unique index (one per array element), or an empty set if it is not indexed"""
+        if info.get('partialFilterExpression') and not match(doc, info['partialFilterExpression']):
+            return set()
+        values = [_get(doc, field) for field, _ in keys]
+        if info.get('sparse') and all(v is _MISSING for v in values):
+            return set()
+        return {repr(list(combination)) for combination in
+                itertools.product(*(self._key_values(value) for value in values))}
+
+    def _check_unique(self, doc, ignore_id=None):
+        """Raise DuplicateKeyError if doc collides with another document on a unique index"""
+        for name, info in self._indexes.items():
+            if name == '_id_' or not info.get('unique'):
+                continue
+            keys = info['key']
+            doc_keys = self._unique_keys(doc, keys, info)
+            if not doc_keys:
+                continue
+            first = self._key_values(_get(doc, keys[0][0]))
+            for other in self._scan({keys[0][0]: {'$in': first}}):
+                if other['_id'] in (doc.get('_id'), ignore_id):
+                    continue
+                shared = doc_keys & self._unique_keys(other, keys, info)
+                if shared:
+                    raise DuplicateKeyError(
+                        f"E11000 duplicate key error collection: {self.full_name} index: {name} "
+                        f"dup key: {min(shared)}", 11000
+                    )
+
+    def _check_unique_existing(self, keys, info):
+        seen = set()
+        for doc in self._docs.values():
+            doc_keys = self._unique_keys(doc, keys, info)
+            if doc_keys & seen:
+                raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.full_name} "
+                                        f"dup key: {min(doc_keys & seen)}", 11000)
+            seen |= doc_keys
+
+    # -- reads
+
+    def _plan(self, query, sort):
+        """
+        The winning plan explain() reports. Like mongod, an index is usable when
+        the filter bounds its leading key (equality, $in or a range) or the sort
+        starts with it; execution itself only narrows through the hash indexes.
+        Partial indexes count only when the filter implies their expression.
+        """
+        leading = {}
+        with self._lock:
+            for info in self._indexes.values():
+                partial = info.get('partialFilterExpression')
+                if not partial or _implies(query or {}, partial):
+                    leading.setdefault(info['key'][0][0], info['key'])
+        field = None
+        for name, condition in (query or {}).items():
+            if name in leading and (not _is_operator_dict(condition) or set(condition) & _BOUNDED_OPERATORS):
+                field = name
+                break
+        if field is None and sort and sort[0][0] in leading:
+            field = sort[0][0]
+        if field is None:
+            return {'stage': 'COLLSCAN'}
+        return {'stage': 'FETCH', 'inputStage': {'stage': 'IXSCAN', 'keyPattern': dict(leading[field])}}
+
+    def _scan(self, query):
+        """Documents matching query (natural order), narrowed through a hash index when the filter allows"""
+        query = query or {}
+        if '_id' in query and not _is_operator_dict(query['_id']):
+            doc = self._docs.get(query['_id'])
+            return [doc] if doc is not None and match(doc, query) else []
+        for field, condition in query.items():
+            if field not in self._hash:
+                continue
+            if _is_operator_dict(condition):
+                if set(condition) - {'$in', '$eq'}:
+                    continue
+                values = condition['$in'] if '$in' in condition else [condition['$eq']]
+            elif isinstance(condition, (dict, list, re.Pattern)):
+                continue
+            else:
+                values = [condition]
+            try:
+                ids = set()
+                for value in values:
+                    ids |= self._hash[field].get(value, set())
+            except TypeError:
+                continue
+            ids |= self._unhashed[field]
+            docs = (self._docs[_id] for _id in sorted(ids, key=self._order.__getitem__))
+            return [doc for doc in docs if match(doc, query)]
+        return [doc for doc in self._docs.values() if match(doc, query)]
+
+    def find(self, filter=None, projection=None, skip=0, limit=0, sort=None, **kwargs):
+        def load(sort_spec, skip_count, limit_count):
+            with self._command('find', filter=filter or {}) as reply, self._lock:
+                docs = self._scan(filter)
+                if sort_spec:
+                    docs = _sort(docs, sort_spec)
+                if skip_count:
+                    docs = docs[skip_count:]
+                if limit_count:
+                    docs = docs[:abs(limit_count)]
+                docs = [project(copy.deepcopy(doc), projection) for doc in docs]
+                reply['cursor'] = {'firstBatch': docs, 'id': 0, 'ns': self.full_name}
+            return docs
+        cursor = MemoryCursor(load, lambda sort_spec: self._plan(filter, sort_spec))
+        if sort:
+            cursor.sort(sort)
+        return cursor.skip(skip).limit(limit)
+
+    def find_one(self, filter=None, projection=None, *args, **kwargs):
+        if filter is not None and not isinstance(filter, dict):
+            filter = {'_id': filter}
+        for doc in self.find(filter, projection, limit=1, sort=kwargs.get('sort')):
+            return doc
+        return None
+
+    def count_documents(self, filter, **kwargs):
+        # pymongo sends count_documents as a $match/$group aggregate
+        with self._command('aggregate', pipeline=[{'$match': filter}]) as reply, self._lock:
+            count = len(self._scan(filter))
+            skip, limit = kwargs.get('skip', 0), kwargs.get('limit', 0)
+            count = max(0, count - skip)
+            count = min(count, limit) if limit else count
+            reply['cursor'] = {'firstBatch': [{'n': count}] if count else [], 'id': 0, 'ns': self.full_name}
+        return count
+
+    def distinct(self, key, filter=None, **kwargs):
+        values = []
+        with self._command('distinct', key=key, query=filter or {}) as reply, self._lock:
+            for doc in self._scan(filter):
+                value = _get(doc, key)
+                for item in (value if isinstance(value, list) else [value]):
+                    if item is not _MISSING and item not in values:
+                        values.append(copy.deepcopy(item))
+            reply['values'] = values
+        return values
+
+    # -- writes
+
+    def _insert(self, document):
+        doc = copy.deepcopy(document)
+        if '_id' not in doc:
+            doc['_id'] = document['_id'] = ObjectId()
+        if doc['_id'] in self._docs:
+            raise DuplicateKeyError(
+                f"E11000 duplicate key error collection: {self.full_name} index: _id_ dup key: {doc['_id']!r}", 11000
+            )
+        self._check_unique(doc)
+        self._docs[doc['_id']] = doc
+        self._order[doc['_id']] = next(self._insert_numbers)
+        self._index_doc(doc)
+        return doc['_id']
+
+    def insert_one(self, document, **kwargs):
+        with self._command('insert'), self._lock:
+            return InsertOneResult(self._insert(document), True)
+
+    def insert_many(self, documents, ordered=True, **kwargs):
+        inserted, errors = [], []
+        with self._command('insert'), self._lock:
+            for index, document in enumerate(documents):
+                try:
+                    inserted.append(self._insert(document))
+                except DuplicateKeyError as e:
+                    errors.append({'index': index, 'code': 11000, 'errmsg': str(e), 'op': document})
+                    if ordered:
+                        break
+        if errors:
+            raise BulkWriteError({'writeErrors': errors, 'writeConcernErrors': [], 'nInserted': len(inserted),
+                                  'nUpserted': 0, 'nMatched': 0, 'nModified': 0, 'nRemoved': 0, 'upserted': []})
+        return InsertManyResult(inserted, True)
+
+    def _replace_doc(self, old, new):
+        self._unindex_doc(old)
+        try:
+            self._check_unique(new, ignore_id=old['_id'])
+        except DuplicateKeyError:
+            self._index_doc(old)
+            raise
+        self._docs[old['_id']] = new
+        self._index_doc(new)
+
+    def _update(self, filter, update, upsert, many, sort=None):
+        """(matched, modified, upserted _id, updated document before and after)"""
+        docs = self._scan(filter)
+        if sort:
+            docs = _sort(docs, sort)
+        if not many:
+            docs = docs[:1]
+        if not docs:
+            if not upsert:
+                return 0, 0, None, None, None
+            doc = _upsert_seed(filter)
+            apply_update(doc, update, is_insert=True)
+            if '_id' not in doc:
+                doc['_id'] = ObjectId()
+            self._insert(doc)
+            return 0, 0, doc['_id'], None, self._docs[doc['_id']]
+
+        modified = 0
+        before = after = None
+        for doc in docs:
+            updated = copy.deepcopy(doc)
+            apply_update(updated, update)
+            if updated != doc:
+                self._replace_doc(doc, updated)
+                modified += 1
+            before, after = doc, self._docs[doc['_id']]
+        return len(docs), modified, None, before, after
+
+    def _update_result(self, matched, modified, upserted_id):
+        raw = {'n': matched + (1 if upserted_id is not None else 0), 'nModified': modified, 'ok': 1.0,
+               'updatedExisting': matched > 0}
+        if upserted_id is not None:
+            raw['upserted'] = upserted_id
+        return UpdateResult(raw, True)
+
+    def update_one(self, filter, update, upsert=False, **kwargs):
+        with self._command('update'), self._lock:
+            matched, modified, upserted_id, _, _ = self._update(filter, update, upsert, False, kwargs.get('sort'))
+        return self._update_result(matched, modified, upserted_id)
+
+    def update_many(self, filter, update, upsert=False, **kwargs):
+        with self._command('update'), self._lock:
+            matched, modified, upserted_id, _, _ = self._update(filter, update, upsert, True)
+        return self._update_result(matched, modified, upserted_id)
+
+    def replace_one(self, filter, replacement, upsert=False, **kwargs):
+        return self.update_one(filter, replacement, upsert=upsert)
+
+    def find_one_and_update(self, filter, update, projection=None, sort=None, upsert=False,
+                            return_document=ReturnDocument.BEFORE, **kwargs):
+        with self._command('findAndModify') as reply, self._lock:
+            _, _, _, before, after = self._update(filter, update, upsert, False, sort)
+            doc = after if return_document == ReturnDocument.AFTER else before
+            reply['value'] = project(copy.deepcopy(doc), projection) if doc is not None else None
+        return reply['value']
+
+    def _delete(self, filter, many):
+        docs = self._scan(filter)
+        if not many:
+            docs = docs[:1]
+        for doc in docs:
+            self._unindex_doc(doc)
+            del self._docs[doc['_id']]
+            del self._order[doc['_id']]
+        return len(docs)
+
+    def delete_one(self, filter, **kwargs):
+        with self._command('delete'), self._lock:
+            return DeleteResult({'n': self._delete(filter, False), 'ok': 1.0}, True)
+
+    def delete_many(self, filter, **kwargs):
+        with self._command('delete'), self._lock:
+            return DeleteResult({'n': self._delete(filter, True), 'ok': 1.0}, True)
+
+    def find_one_and_delete(self, filter, projection=None, **kwargs):
+        with self._command('findAndModify') as reply, self._lock:
+            docs = self._scan(filter)[:1]
+            reply['value'] = None
+            if docs:
+                self._delete({'_id': docs[0]['_id']}, False)
+                reply['value'] = project(copy.deepcopy(docs[0]), projection)
+        return reply['value']
+
+    def bulk_write(self, requests, ordered=True, **kwargs):
+        result = {'writeErrors': [], 'writeConcernErrors': [], 'nInserted': 0, 'nUpserted': 0,
+                  'nMatched': 0, 'nModified': 0, 'nRemoved': 0, 'upserted': []}
+        # Like pymongo, each run of consecutive operations of one kind is one command
+        runs = itertools.groupby(enumerate(requests), key=lambda item: _bulk_command(item[1]))
+        with self._lock:
+            for command_name, run in runs:
+                with self._command(command_name):
+                    for index, operation in run:
+                        try:
+                            self._bulk_apply(index, operation, result)
+                        except DuplicateKeyError as e:
+                            result['writeErrors'].append({'index': index, 'code': 11000, 'errmsg': str(e)})
+                            if ordered:
+                                break
+                if ordered and result['writeErrors']:
+                    break
+        if result['writeErrors']:
+            raise BulkWriteError(result)
+        return BulkWriteResult(result, True)
+
+    def _bulk_apply(self, index, operation, result):
+        if isinstance(operation, InsertOne):
+            self._insert(operation._doc)
+            result['nInserted'] += 1
+        elif isinstance(operation, (UpdateOne, UpdateMany, ReplaceOne)):
+            matched, modified, upserted_id, _, _ = self._update(
+                operation._filter, operation._doc, operation._upsert,
+                isinstance(operation, UpdateMany)
+            )
+            result['nMatched'] += matched
+            result['nModified'] += modified
+            if upserted_id is not None:
+                result['nUpserted'] += 1
+                result['upserted'].append({'index': index, '_id': upserted_id})
+        elif isinstance(operation, (DeleteOne, DeleteMany)):
+            result['nRemoved'] += self._delete(operation._filter, isinstance(operation, DeleteMany))
+        else:
+            raise OperationFailure(f"Unsupported bulk operation: {type(operation).__name__}")
+
+    # -- aggregation
+
+    def aggregate(self, pipeline, **kwargs):
+        pipeline = list(pipeline)
+        with self._command('aggregate', pipeline=list(pipeline)) as reply, self._lock:
+            # Leading $match stages can use the hash indexes
+            query = {}
+            while pipeline and '$match' in pipeline[0] and not set(pipeline[0]['$match']) & set(query):
+                query.update(pipeline.pop(0)['$match'])
+            docs = [copy.deepcopy(doc) for doc in self._scan(query)]
+            results = self._run_pipeline(docs, pipeline)
+            reply['cursor'] = {'firstBatch': results, 'id': 0, 'ns': self.full_name}
+        return MemoryCursor(lambda *_: results)
+
+    def _run_pipeline(self, docs, pipeline):
+        for stage in pipeline:
+            (name, spec), = stage.items()
+            if name == '$match':
+                docs = [doc for doc in docs if match(doc, spec)]
+            elif name == '$group':
+                docs = _group(docs, spec)
+            elif name == '$sort':
+                docs = _sort(docs, spec)
+            elif name == '$limit':
+                docs = list(docs)[:spec]
+            elif name == '$skip':
+                docs = list(docs)[spec:]
+            elif name == '$project':
+                docs = [project(doc, spec) for doc in docs]
+            elif name in ('$addFields', '$set'):
+                for doc in docs:
+                    for field, expression in spec.items():
+                        _set(doc, field, evaluate(expression, doc))
+            elif name == '$unset':
+                for doc in docs:
+                    for field in ([spec] if isinstance(spec, str) else spec):
+                        _unset(doc, field)
+            elif name == '$unwind':
+                docs = list(_unwind(docs, spec))
+            elif name == '$lookup':
+                if 'localField' not in spec:
+                    raise OperationFailure("Only localField/foreignField $lookup is supported in memory storage")
+                foreign = self.database[spec['from']]
+                for doc in docs:
+                    local = _get(doc, spec['localField'])
+                    values = local if isinstance(local, list) else [None if local is _MISSING else local]
+                    doc[spec['as']] = [copy.deepcopy(other) for other in
+                                       foreign._scan({spec['foreignField']: {'$in': values}})]
+            elif name == '$count':
+                docs = [{spec: len(docs)}] if docs else []
+            elif name == '$bucket':
+                docs = _bucket(docs, spec)
+            elif name == '$sample':
+                docs = random.sample(list(docs), min(spec['size'], len(docs)))
+            else:
+                raise OperationFailure(f"Unsupported aggregation stage in memory storage: {name}")
+        return list(docs)
+
+    def drop(self):
+        self.database.drop_collection(self.name)
+
+
+class MemoryDatabase:
+    """Database of MemoryCollections, created on first use like MongoDB"""
+
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+        self._lock = threading.RLock()
+        self._collections = {}
+
+    def __getitem__(self, name):
+        with self._lock:
+            if name not in self._collections:
+                self._collections[name] = MemoryCollection(self, name)
+            return self._collections[name]
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return self[name]
+
+    def get_collection(self, name, **kwargs):
+        return self[name].with_options(**kwargs)
+
+    def list_collection_names(self, **kwargs):
+        with self._lock:
+            return list(self._collections)
+
+    def create_collection(self, name, **kwargs):
+        return self[name]
+
+    def drop_collection(self, name):
+        with self._lock:
+            self._collections.pop(name if isinstance(name, str) else name.name, None)
+
+    def command(self, command, value=None, **kwargs):
+        name = command if isinstance(command, str) else next(iter(command))
+        if name == 'ping':
+            return {'ok': 1.0}
+        if name == 'dbstats':
+            objects = sum(len(c._docs) for c in self._collections.values())
+            return {'db': self.name, 'collections': len(self._collections), 'objects': objects,
+                    'dataSize': 0, 'storageSize': 0, 'indexes': sum(len(c._indexes) for c in self._collections.values()),
+                    'ok': 1.0}
+        if name == 'collstats':
+            collection = self[value]
+            return {'ns': collection.full_name, 'count': len(collection._docs), 'size': 0,
+                    'storageSize': 0, 'nindexes': len(collection._indexes), 'ok': 1.0}
+        raise OperationFailure(f"Unsupported command in memory storage: {name}")
+
+
+class MemoryClient:
+    """Stand-in for MongoClient holding MemoryDatabases"""
+
+    def __init__(self, *args, event_listeners=None, **kwargs):
+        self._lock = threading.Lock()
+        self._databases = {}
+        # Pool and server listeners have nothing to observe here
+        self._listeners = [listener for listener in (event_listeners or [])
+                           if isinstance(listener, monitoring.CommandListener)]
+        self._request_ids = itertools.count(1)
+
+    # -- command monitoring
+
+    def _started(self, database_name, command_name, command):
+        request_id = next(self._request_ids)
+        event = SimpleNamespace(command_name=command_name, database_name=database_name,
+                                request_id=request_id, operation_id=request_id,
+                                connection_id=('memory', 0), started_at=time.perf_counter())
+        for listener in self._listeners:
+            listener.started(SimpleNamespace(**vars(event), command=command))
+        return event
+
+    def _finished(self, event):
+        return dict(vars(event), duration_micros=int((time.perf_counter() - event.started_at) * 1e6))
+
+    def _succeeded(self, event, reply):
+        finished = self._finished(event)
+        for listener in self._listeners:
+            listener.succeeded(SimpleNamespace(**finished, reply=reply))
+
+    def _failed(self, event, error):
+        finished = self._finished(event)
+        for listener in self._listeners:
+            listener.failed(SimpleNamespace(**finished, failure={'ok': 0.0, 'errmsg': str(error)}))
+
+    def __getitem__(self, name):
+        with self._lock:
+            if name not in self._databases:
+                self._databases[name] = MemoryDatabase(self, name)
+            return self._databases[name]
+
+    def get_database(self, name, **kwargs):
+        return self[name]
+
+    def list_database_names(self):
+        return list(self._databases)
+
+    def drop_database(self, name):
+        with self._lock:
+            self._databases.pop(name if isinstance(name, str) else name.name, None)
+
+    def close(self):
+        pass
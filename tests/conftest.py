@@ -0,0 +1,83 @@
+# tests/conftest.py
+"""
+Shared fixtures. Tests run against the in-memory storage backend
+(STORAGE_BACKEND=memory), so no mongod is needed; each test gets a fresh
+database. The query monitor listens to it, so assert_query_budget counts the
+commands a test issues as it would against a server.
+
+Tests taking `server_db` also run against a real server when MONGO_TEST_URI
+is set (a replica set URI exercises read routing) and are skipped otherwise.
+"""
+import os
+import uuid
+
+import pytest
+from flask import Flask
+from pymongo import MongoClient, monitoring
+
+from smart_app.backend.extensions import mongo
+from smart_app.backend.services.query_monitor import query_monitor
+from smart_app.backend.storage import init_storage
+
+
+class CommandRecorder(monitoring.CommandListener):
+    """Keeps the commands sent, for asserting on what reached the server"""
+
+    def __init__(self):
+        self.commands = []
+
+    def started(self, event):
+        self.commands.append((event.command_name, event.command))
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+    def named(self, *names):
+        return [command for name, command in self.commands if name in names]
+
+    def clear(self):
+        self.commands = []
+
+
+@pytest.fixture
+def commands():
+    return CommandRecorder()
+
+
+@pytest.fixture
+def app(commands):
+    """A bare Flask app on a fresh in-memory database"""
+    app = Flask(__name__)
+    app.config.update(TESTING=True, STORAGE_BACKEND='memory', MONGO_DB_NAME='smart_voting_test')
+    init_storage(app, event_listeners=[query_monitor.listener, commands])
+    return app
+
+
+@pytest.fixture
+def request_ctx(app):
+    """Run the test inside a request, so the per-request identity map is active"""
+    with app.test_request_context():
+        yield
+
+
+@pytest.fixture
+def db(app):
+    return mongo.db
+
+
+@pytest.fixture
+def server_db(commands):
+    """A scratch database on MONGO_TEST_URI, dropped afterwards"""
+    uri = os.getenv('MONGO_TEST_URI')
+    if not uri:
+        pytest.skip('MONGO_TEST_URI is not set')
+    client = MongoClient(uri, serverSelectionTimeoutMS=5000, event_listeners=[commands])
+    name = f"smart_voting_test_{uuid.uuid4().hex[:8]}"
+    try:
+        yield client[name]
+    finally:
+        client.drop_database(name)
+        client.close()
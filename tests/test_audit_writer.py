@@ -0,0 +1,50 @@
+# tests/test_audit_writer.py
+"""Write-behind audit log buffer: lazy start and per-process writer threads"""
+import pytest
+
+from smart_app.backend.mongo_models import AuditLog
+from smart_app.backend.services.audit_writer import AuditLogWriter
+
+
+@pytest.fixture
+def writer(app, monkeypatch):
+    writer = AuditLogWriter(flush_interval_ms=20)
+    monkeypatch.setattr(AuditLog, 'writer', None)
+    writer.init_app(app)
+    yield writer
+    writer.stop()
+
+
+def record(i):
+    return {'action': 'login', 'user_id': f'V{i}', 'user_type': 'voter', 'details': {}}
+
+
+def test_thread_starts_on_first_submit(writer, db):
+    assert AuditLog.writer is writer
+    assert not writer.get_statistics()['running']
+
+    assert writer.submit(record(1))
+    assert writer.get_statistics()['running']
+    writer.flush()
+    assert db.audit_logs.count_documents({}) == 1
+
+
+def test_forked_worker_starts_its_own_thread(writer, db, monkeypatch):
+    writer.submit(record(1))
+    writer.flush()
+    parent_thread = writer._thread
+    # fork() only copies the calling thread: the child sees the thread object but it never runs
+    writer._stop.set()
+    parent_thread.join()
+    writer._queue.put_nowait(record(2))
+
+    monkeypatch.setattr('smart_app.backend.services.audit_writer.os.getpid', lambda: writer._pid + 1)
+    assert writer.submit(record(3))
+
+    stats = writer.get_statistics()
+    assert writer._thread is not parent_thread
+    assert stats['running']
+    # The parent's pending record is left to the parent
+    assert stats['enqueued'] == 1
+    writer.flush()
+    assert sorted(d['user_id'] for d in db.audit_logs.find({})) == ['V1', 'V3']
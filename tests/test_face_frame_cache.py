@@ -0,0 +1,89 @@
+# tests/test_face_frame_cache.py
+"""Replay detection in the face frame cache: retry window, replay window and per-operation scope"""
+from types import SimpleNamespace
+
+import pytest
+
+from smart_app.backend.services import face_frame_cache as frame_cache_module
+from smart_app.backend.services.face_frame_cache import FaceFrameCache, FrameFingerprint
+
+TTL = 30.0
+WINDOW = 3600.0
+FRAME = FrameFingerprint(dhash=0b1011, digest='a' * 64)
+OTHER_FRAME = FrameFingerprint(dhash=0b1011, digest='b' * 64)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(frame_cache_module, 'time', SimpleNamespace(time=lambda: clock.now))
+    return clock
+
+
+@pytest.fixture
+def cache(clock):
+    return FaceFrameCache(ttl=TTL, replay_window=WINDOW)
+
+
+def test_first_submission_is_not_a_replay(cache):
+    assert cache.check_replay(FRAME, 'V1', 'verify') is None
+    assert cache.check_replay(OTHER_FRAME, 'V1', 'verify') is None
+
+
+def test_rejected_frame_can_be_resubmitted_by_the_same_voter(cache, clock):
+    cache.check_replay(FRAME, 'V1', 'verify')
+    clock.now += TTL + 1
+    assert cache.check_replay(FRAME, 'V1', 'verify') is None
+    clock.now += WINDOW - 1
+    assert cache.check_replay(FRAME, 'V1', 'verify') is None
+
+
+def test_accepted_frame_is_a_retry_within_the_ttl(cache, clock):
+    cache.check_replay(FRAME, 'V1', 'verify')
+    cache.mark_accepted('verify', FRAME)
+    clock.now += TTL
+    assert cache.check_replay(FRAME, 'V1', 'verify') is None
+
+
+def test_accepted_frame_reused_after_the_ttl_is_a_replay(cache, clock):
+    cache.check_replay(FRAME, 'V1', 'verify')
+    clock.now += 10
+    cache.mark_accepted('verify', FRAME)
+    # The retry window runs from acceptance, not from the first submission
+    clock.now += TTL
+    assert cache.check_replay(FRAME, 'V1', 'verify') is None
+    clock.now += 0.5
+    replay = cache.check_replay(FRAME, 'V1', 'verify')
+    assert replay == {'first_seen_seconds_ago': TTL + 0.5, 'same_voter': True, 'previously_accepted': True}
+    assert cache.get_statistics()['replays'] == 1
+
+
+def test_frame_from_another_voter_is_a_replay(cache, clock):
+    cache.check_replay(FRAME, 'V1', 'register')
+    replay = cache.check_replay(FRAME, 'V2', 'register')
+    assert replay['same_voter'] is False
+    assert replay['previously_accepted'] is False
+
+
+def test_digests_are_scoped_per_operation(cache, clock):
+    cache.check_replay(FRAME, 'V1', 'register')
+    cache.mark_accepted('register', FRAME)
+    clock.now += TTL + 1
+    assert cache.check_replay(FRAME, 'V1', 'verify') is None
+    assert cache.check_replay(FRAME, 'V2', 'stream') is None
+    assert cache.check_replay(FRAME, 'V1', 'register') is not None
+
+
+def test_mark_accepted_ignores_unknown_frames(cache):
+    cache.mark_accepted('verify', FRAME)
+    assert cache.check_replay(FRAME, 'V1', 'verify') is None
+
+
+def test_digests_expire_after_the_replay_window(cache, clock):
+    cache.check_replay(FRAME, 'V1', 'verify')
+    cache.mark_accepted('verify', FRAME)
+    clock.now += WINDOW
+    assert cache.check_replay(FRAME, 'V2', 'verify') is not None
+    clock.now += 1
+    assert cache.check_replay(FRAME, 'V2', 'verify') is None
+    assert cache.get_statistics()['tracked_digests'] == 1
@@ -0,0 +1,38 @@
+# tests/test_face_reencoding.py
+"""Re-encoding job options and the admin-only job endpoints"""
+import pytest
+
+from smart_app.backend.services.face_recognition_service import multi_face_service
+from smart_app.backend.services.face_reencoding_service import FaceReencodingJob
+
+
+def use_encoders(monkeypatch, encoders):
+    monkeypatch.setattr(multi_face_service, 'get_available_encoders', lambda: list(encoders))
+
+
+def test_ensemble_can_be_promoted_with_several_encoders(monkeypatch):
+    use_encoders(monkeypatch, ['face_recognition', 'dlib'])
+
+    assert multi_face_service.get_query_encoder() == 'ensemble'
+    assert multi_face_service.get_index_methods() == ['face_recognition', 'dlib', 'ensemble']
+    assert FaceReencodingJob('ensemble', promote=True).promote
+    # A single encoder's vectors are not in the space live searches query
+    with pytest.raises(ValueError):
+        FaceReencodingJob('dlib', promote=True)
+    assert not FaceReencodingJob('dlib').promote
+
+
+def test_single_encoder_is_promotable(monkeypatch):
+    use_encoders(monkeypatch, ['dlib'])
+
+    assert multi_face_service.get_index_methods() == ['dlib']
+    assert FaceReencodingJob('dlib', promote=True).promote
+
+
+@pytest.mark.parametrize('path', ['/api/register/knn/reencode', '/api/register/knn/migrate-encodings'])
+def test_job_endpoints_require_admin(app, path):
+    from smart_app.backend.routes.register import register_bp
+    app.register_blueprint(register_bp, url_prefix='/api/register')
+
+    response = app.test_client().post(path, json={'method': 'dlib'})
+    assert response.status_code == 401
@@ -0,0 +1,26 @@
+# tests/test_id_allocator.py
+"""Block-reserved IDs: timestamped IDs carry the time they were issued"""
+from datetime import datetime
+from types import SimpleNamespace
+
+from smart_app.backend import mongo_models
+from smart_app.backend.mongo_models import IdAllocator, timestamped_id_formatter
+
+
+def id_time(new_id, prefix='ELECT'):
+    return datetime.strptime(new_id[len(prefix):len(prefix) + 14], '%Y%m%d%H%M%S')
+
+
+def test_ids_from_one_block_carry_their_issue_time(app, monkeypatch):
+    clock = SimpleNamespace(now=100.0)
+    monkeypatch.setattr(mongo_models, 'time', SimpleNamespace(monotonic=lambda: clock.now))
+    allocator = IdAllocator('election_id', timestamped_id_formatter('ELECT', 4))
+
+    with app.app_context():
+        first = allocator.next_id()
+        clock.now += 45
+        second = allocator.next_id()
+
+    assert (first[-4:], second[-4:]) == ('0000', '0001')
+    assert (id_time(second) - id_time(first)).total_seconds() in (45, 46)
+    assert abs((id_time(first) - datetime.utcnow()).total_seconds()) < 5
@@ -0,0 +1,37 @@
+# tests/test_indexes.py
+"""Index manifest: bootstrap creates every declared index and no declared query shape scans a collection"""
+import pytest
+
+from smart_app.backend.create_mongo_collections import create_collections
+from smart_app.backend.indexes import assert_no_collscans, find_collscans, index_manifest, reconcile_indexes
+
+
+def test_declared_query_shapes_use_an_index(app, db):
+    create_collections(app)
+
+    assert_no_collscans(db, min_documents=0)
+    assert reconcile_indexes(db) == {'created': [], 'extras': [], 'conflicts': [], 'dropped': [], 'failed': []}
+
+
+def test_missing_index_is_reported(app, db):
+    create_collections(app)
+    db.votes.insert_many([{'vote_id': f'V{i}', 'election_id': 'E1', 'voter_id': f'AB{i:06d}'} for i in range(3)])
+    [election_index] = [name for name, info in db.votes.index_information().items()
+                        if info['key'][0][0] == 'election_id']
+    db.votes.drop_index(election_index)
+
+    # Collections below the size threshold are not checked
+    assert find_collscans(db, min_documents=4) == []
+    with pytest.raises(AssertionError, match=r"Vote \{'election_id'"):
+        assert_no_collscans(db, min_documents=3)
+    assert reconcile_indexes(db)['created'] == [f'votes.{election_index}']
+    assert_no_collscans(db, min_documents=0)
+
+
+def test_extra_indexes_are_reported_not_dropped(app, db):
+    create_collections(app)
+    db.votes.create_index('ip_address')
+
+    assert reconcile_indexes(db)['extras'] == ['votes.ip_address_1']
+    assert 'ip_address_1' in db.votes.index_information()
+    assert set(index_manifest()) <= set(db.list_collection_names())
@@ -0,0 +1,307 @@
+# tests/test_memory_storage.py
+"""
+The in-memory engine against MongoDB semantics. Expected values are what a
+mongod returns; every case also runs against a real server when
+MONGO_TEST_URI is set, so a divergence shows up as one backend failing.
+"""
+import re
+from datetime import datetime
+
+import pytest
+from pymongo import ReturnDocument, InsertOne, UpdateOne, DeleteMany, ReplaceOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+
+from smart_app.backend.storage.memory import MemoryDatabase
+
+DOCS = [
+    {'n': 1, 'name': 'asha', 'age': 30, 'active': True, 'tags': ['a', 'b'],
+     'address': {'city': 'hyd', 'pin': '500001'}, 'scores': [{'k': 'x', 'v': 5}, {'k': 'y', 'v': 9}]},
+    {'n': 2, 'name': 'Ravi', 'age': 45, 'active': False, 'tags': ['b'],
+     'address': {'city': 'blr'}, 'scores': [{'k': 'x', 'v': 2}]},
+    {'n': 3, 'name': 'meena', 'age': None, 'active': 1, 'tags': [], 'scores': []},
+    {'n': 4, 'name': 'john', 'age': '30', 'tags': 'a'},
+    {'n': 5, 'name': 'zoe'},
+]
+
+
+@pytest.fixture(params=['memory', 'server'])
+def store(request):
+    if request.param == 'server':
+        return request.getfixturevalue('server_db')
+    return request.getfixturevalue('db')
+
+
+@pytest.fixture
+def items(store):
+    store.items.insert_many([dict(doc) for doc in DOCS])
+    return store.items
+
+
+def numbers(docs):
+    return sorted(doc['n'] for doc in docs)
+
+
+def strip_id(doc):
+    return {k: v for k, v in doc.items() if k != '_id'}
+
+
+@pytest.mark.parametrize('query, expected', [
+    ({'tags': 'a'}, [1, 4]),
+    ({'tags': ['a', 'b']}, [1]),
+    ({'address.city': 'hyd'}, [1]),
+    ({'address': {'city': 'blr'}}, [2]),
+    ({'scores.v': {'$gt': 8}}, [1]),
+    ({'scores.0.k': 'x'}, [1, 2]),
+    ({'age': None}, [3, 5]),
+    ({'age': {'$ne': None}}, [1, 2, 4]),
+    ({'age': {'$exists': False}}, [5]),
+    ({'age': {'$gt': 25}}, [1, 2]),
+    ({'age': {'$gte': '3'}}, [4]),
+    ({'age': {'$in': [30, None]}}, [1, 3, 5]),
+    ({'age': {'$nin': [30, None]}}, [2, 4]),
+    ({'age': {'$not': {'$gt': 40}}}, [1, 3, 4, 5]),
+    ({'age': {'$type': 'string'}}, [4]),
+    ({'age': {'$type': 'number'}}, [1, 2]),
+    ({'age': {'$type': 'null'}}, [3]),
+    ({'active': True}, [1]),
+    ({'active': 1}, [3]),
+    ({'active': {'$in': [False, 1]}}, [2, 3]),
+    ({'name': {'$regex': '^r', '$options': 'i'}}, [2]),
+    ({'name': re.compile('^m')}, [3]),
+    ({'tags': {'$size': 2}}, [1]),
+    ({'tags': {'$size': 0}}, [3]),
+    ({'tags': {'$all': ['a', 'b']}}, [1]),
+    ({'tags': {'$all': ['a']}}, [1, 4]),
+    ({'scores': {'$elemMatch': {'k': 'x', 'v': {'$gt': 3}}}}, [1]),
+    ({'$or': [{'age': 45}, {'name': 'zoe'}]}, [2, 5]),
+    ({'$nor': [{'tags': 'a'}, {'age': None}]}, [2]),
+    ({'$and': [{'age': {'$gte': 30}}, {'age': {'$lt': 45}}]}, [1]),
+    ({'$expr': {'$gt': [{'$size': {'$ifNull': ['$scores', []]}}, 1]}}, [1]),
+])
+def test_filters(items, query, expected):
+    assert numbers(items.find(query)) == expected
+    assert items.count_documents(query) == len(expected)
+
+
+@pytest.mark.parametrize('projection, expected', [
+    ({'name': 1, '_id': 0}, {'name': 'asha'}),
+    ({'address.city': 1, '_id': 0}, {'address': {'city': 'hyd'}}),
+    ({'address': 0, 'scores': 0, 'tags': 0, 'active': 0, '_id': 0}, {'n': 1, 'name': 'asha', 'age': 30}),
+])
+def test_projections(items, projection, expected):
+    assert items.find_one({'n': 1}, projection) == expected
+    assert set(items.find_one({'n': 1}, {'name': 1})) == {'_id', 'name'}
+
+
+def test_sort_skip_limit(items):
+    # null and missing sort together, before numbers, before strings
+    assert [d['n'] for d in items.find({}, sort=[('age', 1), ('n', 1)])] == [3, 5, 1, 2, 4]
+    assert [d['n'] for d in items.find({}, sort=[('age', -1), ('n', 1)])] == [4, 2, 1, 3, 5]
+    assert [d['n'] for d in items.find({}).sort('n', -1).skip(1).limit(2)] == [4, 3]
+    assert items.count_documents({'tags': 'b'}, skip=1) == 1
+    assert items.count_documents({}, limit=2) == 2
+
+
+def test_distinct(items):
+    assert sorted(items.distinct('tags')) == ['a', 'b']
+    assert sorted(items.distinct('address.city', {'n': {'$lte': 2}})) == ['blr', 'hyd']
+
+
+@pytest.mark.parametrize('update, field, expected', [
+    ({'$set': {'address.geo.lat': 1.5}}, 'address', {'city': 'hyd', 'pin': '500001', 'geo': {'lat': 1.5}}),
+    ({'$unset': {'address.pin': ''}}, 'address', {'city': 'hyd'}),
+    ({'$inc': {'visits': 2}}, 'visits', 2),
+    ({'$mul': {'age': 2}}, 'age', 60),
+    ({'$mul': {'missing': 2}}, 'missing', 0),
+    ({'$min': {'age': 20}}, 'age', 20),
+    ({'$max': {'age': 10}}, 'age', 30),
+    ({'$push': {'tags': {'$each': ['c', 'a']}}}, 'tags', ['a', 'b', 'c', 'a']),
+    ({'$push': {'new': 'x'}}, 'new', ['x']),
+    ({'$addToSet': {'tags': {'$each': ['a', 'e']}}}, 'tags', ['a', 'b', 'e']),
+    ({'$pull': {'scores': {'v': {'$lt': 6}}}}, 'scores', [{'k': 'y', 'v': 9}]),
+    ({'$pull': {'tags': {'$in': ['a', 'z']}}}, 'tags', ['b']),
+    ({'$pull': {'tags': 'b'}}, 'tags', ['a']),
+])
+def test_update_operators(items, update, field, expected):
+    result = items.update_one({'n': 1}, update)
+    assert (result.matched_count, result.modified_count) == (1, 1 if update != {'$max': {'age': 10}} else 0)
+    assert items.find_one({'n': 1})[field] == expected
+
+
+def test_update_results(items):
+    assert items.update_one({'n': 1}, {'$set': {'name': 'asha'}}).modified_count == 0
+    result = items.update_many({'tags': 'b'}, {'$set': {'flag': True}})
+    assert (result.matched_count, result.modified_count) == (2, 2)
+    assert items.update_one({'n': 99}, {'$set': {'x': 1}}).matched_count == 0
+
+    items.update_one({'n': 2}, {'$currentDate': {'seen': True}})
+    assert isinstance(items.find_one({'n': 2})['seen'], datetime)
+
+    items.replace_one({'n': 1}, {'n': 1, 'name': 'only'})
+    assert strip_id(items.find_one({'n': 1})) == {'n': 1, 'name': 'only'}
+
+
+def test_upserts(items):
+    result = items.update_one({'n': 9, 'age': {'$gt': 5}}, {'$set': {'name': 'new'}, '$setOnInsert': {'created': 1}},
+                              upsert=True)
+    assert result.upserted_id is not None
+    assert strip_id(items.find_one({'_id': result.upserted_id})) == {'n': 9, 'name': 'new', 'created': 1}
+
+    result = items.update_one({'n': 9}, {'$set': {'name': 'again'}, '$setOnInsert': {'created': 2}}, upsert=True)
+    assert (result.matched_count, result.upserted_id) == (1, None)
+    assert items.find_one({'n': 9})['created'] == 1
+
+    upserted = items.find_one_and_update({'n': 10}, {'$inc': {'hits': 1}}, upsert=True,
+                                         return_document=ReturnDocument.AFTER, projection={'_id': 0})
+    assert upserted == {'n': 10, 'hits': 1}
+
+
+def test_find_one_and_modify(items):
+    before = items.find_one_and_update({'tags': 'b'}, {'$set': {'name': 'x'}}, sort=[('n', -1)],
+                                       projection={'_id': 0, 'n': 1, 'name': 1})
+    assert before == {'n': 2, 'name': 'Ravi'}
+    after = items.find_one_and_update({'n': 2}, {'$set': {'name': 'y'}}, return_document=ReturnDocument.AFTER)
+    assert after['name'] == 'y'
+    assert items.find_one_and_update({'n': 99}, {'$set': {'name': 'z'}}) is None
+
+    deleted = items.find_one_and_delete({'tags': 'b'}, sort=[('n', 1)])
+    assert deleted['n'] == 1
+    assert items.delete_many({'age': None}).deleted_count == 2
+    assert items.delete_one({}).deleted_count == 1
+    assert numbers(items.find()) == [4]
+
+
+def test_unique_indexes(store):
+    people = store.people
+    people.create_index('email', unique=True)
+    people.insert_one({'email': 'a@x.in'})
+    with pytest.raises(DuplicateKeyError):
+        people.insert_one({'email': 'a@x.in'})
+    # A missing field is indexed as null
+    people.insert_one({'name': 'no email'})
+    with pytest.raises(DuplicateKeyError):
+        people.insert_one({'name': 'no email either'})
+
+    people.insert_one({'email': 'b@x.in'})
+    with pytest.raises(DuplicateKeyError):
+        people.update_one({'email': 'b@x.in'}, {'$set': {'email': 'a@x.in'}})
+    assert people.count_documents({'email': 'b@x.in'}) == 1
+
+
+def test_unique_index_options(store):
+    sparse = store.sparse_people
+    sparse.create_index('phone', unique=True, sparse=True)
+    sparse.insert_many([{'name': 'a'}, {'name': 'b'}])
+
+    partial = store.partial_people
+    partial.create_index('national_id', unique=True, partialFilterExpression={'national_id': {'$type': 'string'}})
+    partial.insert_many([{'name': 'a'}, {'name': 'b', 'national_id': None}, {'national_id': '1'}])
+    with pytest.raises(DuplicateKeyError):
+        partial.insert_one({'national_id': '1'})
+
+    compound = store.ballots
+    compound.create_index([('election_id', 1), ('voter_id', 1)], unique=True)
+    compound.insert_many([{'election_id': 'E1', 'voter_id': 'V1'}, {'election_id': 'E1', 'voter_id': 'V2'}])
+    with pytest.raises(DuplicateKeyError):
+        compound.insert_one({'election_id': 'E1', 'voter_id': 'V1'})
+
+    # Array fields are indexed per element
+    aliases = store.aliases
+    aliases.create_index('names', unique=True)
+    aliases.insert_one({'names': ['a', 'b']})
+    with pytest.raises(DuplicateKeyError):
+        aliases.insert_one({'names': ['b', 'c']})
+    aliases.insert_one({'names': ['c', 'c']})
+
+    store.dupes.insert_many([{'k': 1}, {'k': 1}])
+    with pytest.raises(DuplicateKeyError):
+        store.dupes.create_index('k', unique=True)
+
+
+def test_insert_many_ordering(store):
+    with pytest.raises(BulkWriteError) as ordered:
+        store.ordered.insert_many([{'_id': 1}, {'_id': 1}, {'_id': 2}])
+    assert ordered.value.details['nInserted'] == 1
+    assert store.ordered.count_documents({}) == 1
+
+    with pytest.raises(BulkWriteError) as unordered:
+        store.unordered.insert_many([{'_id': 1}, {'_id': 1}, {'_id': 2}], ordered=False)
+    assert unordered.value.details['nInserted'] == 2
+    assert [error['index'] for error in unordered.value.details['writeErrors']] == [1]
+
+
+def test_bulk_write(items):
+    result = items.bulk_write([
+        InsertOne({'n': 6}),
+        UpdateOne({'n': 1}, {'$set': {'name': 'A'}}),
+        UpdateOne({'n': 7}, {'$set': {'name': 'new'}}, upsert=True),
+        ReplaceOne({'n': 2}, {'n': 2}),
+        DeleteMany({'age': None}),
+    ])
+    assert (result.inserted_count, result.matched_count, result.modified_count) == (1, 2, 2)
+    assert (result.upserted_count, list(result.upserted_ids), result.deleted_count) == (1, [2], 5)
+    assert numbers(items.find()) == [1, 4]
+
+
+def test_group_and_accumulators(items):
+    [totals] = items.aggregate([
+        {'$match': {'age': {'$type': 'number'}}},
+        {'$group': {'_id': None, 'total': {'$sum': '$age'}, 'avg': {'$avg': '$age'},
+                    'count': {'$sum': 1}, 'names': {'$push': '$name'}, 'oldest': {'$max': '$age'}}},
+    ])
+    assert strip_id(totals) == {'total': 75, 'avg': 37.5, 'count': 2, 'names': ['asha', 'Ravi'], 'oldest': 45}
+
+    by_tag = list(items.aggregate([
+        {'$unwind': '$tags'},
+        {'$group': {'_id': '$tags', 'count': {'$sum': 1}, 'who': {'$addToSet': '$n'}}},
+        {'$sort': {'_id': 1}},
+    ]))
+    assert [(g['_id'], g['count'], sorted(g['who'])) for g in by_tag] == [('a', 2, [1, 4]), ('b', 2, [1, 2])]
+
+
+def test_unwind(items):
+    assert len(list(items.aggregate([{'$unwind': '$tags'}]))) == 4
+    preserved = list(items.aggregate([{'$unwind': {'path': '$tags', 'preserveNullAndEmptyArrays': True}},
+                                      {'$sort': {'n': 1}}]))
+    assert [d['n'] for d in preserved] == [1, 1, 2, 3, 4, 5]
+    assert 'tags' not in preserved[3] and 'tags' not in preserved[5]
+
+
+def test_lookup_project_and_count(store, items):
+    store.votes.insert_many([{'voter': 1, 'e': 'E1'}, {'voter': 1, 'e': 'E2'}, {'voter': 2, 'e': 'E1'}])
+
+    joined = list(items.aggregate([
+        {'$match': {'n': {'$lte': 3}}},
+        {'$lookup': {'from': 'votes', 'localField': 'n', 'foreignField': 'voter', 'as': 'votes'}},
+        {'$project': {'_id': 0, 'n': 1, 'voted': {'$size': '$votes'},
+                      'label': {'$concat': [{'$toUpper': '$name'}, '-', {'$toString': '$n'}]},
+                      'adult': {'$cond': [{'$gte': ['$age', 18]}, 'yes', 'no']}}},
+        {'$sort': {'n': 1}},
+    ]))
+    assert joined == [
+        {'n': 1, 'voted': 2, 'label': 'ASHA-1', 'adult': 'yes'},
+        {'n': 2, 'voted': 1, 'label': 'RAVI-2', 'adult': 'yes'},
+        {'n': 3, 'voted': 0, 'label': 'MEENA-3', 'adult': 'no'},
+    ]
+    assert list(items.aggregate([{'$match': {'n': {'$gt': 3}}}, {'$count': 'total'}])) == [{'total': 2}]
+    assert list(items.aggregate([{'$match': {'n': 99}}, {'$count': 'total'}])) == []
+
+
+def test_bucket(items):
+    buckets = list(items.aggregate([
+        {'$match': {'n': {'$lte': 3}}},
+        {'$bucket': {'groupBy': '$age', 'boundaries': [0, 40, 100], 'default': 'unknown',
+                     'output': {'count': {'$sum': 1}}}},
+    ]))
+    assert buckets == [{'_id': 0, 'count': 1}, {'_id': 40, 'count': 1}, {'_id': 'unknown', 'count': 1}]
+
+
+def test_unsupported_operations_fail_loudly(db):
+    assert isinstance(db, MemoryDatabase)
+    db.items.insert_one({'n': 1})
+    with pytest.raises(OperationFailure):
+        list(db.items.find({'n': {'$mod': [2, 0]}}))
+    with pytest.raises(OperationFailure):
+        db.items.update_one({'n': 1}, {'$rename': {'n': 'm'}})
+    with pytest.raises(OperationFailure):
+        list(db.items.aggregate([{'$facet': {}}]))
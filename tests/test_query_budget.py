@@ -0,0 +1,72 @@
+# tests/test_query_budget.py
+"""Query budgets: listings resolve their per-election lookups in a fixed number of queries"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from smart_app.backend.mongo_models import Vote
+from smart_app.backend.routes import dashboard
+from smart_app.backend.services.query_monitor import QueryBudgetExceeded, assert_query_budget, track_queries
+
+VOTER = {'voter_id': 'AB123456'}
+
+
+def seed_elections(db, count, status, voting_start, voting_end):
+    now = datetime.utcnow()
+    for i in range(count):
+        election_id = f'E{status}{i}'
+        db.elections.insert_one({
+            'election_id': election_id, 'title': f'Election {i}', 'election_type': 'general',
+            'status': status, 'is_active': True, 'constituency': 'Hyderabad',
+            'voting_start': now + voting_start, 'voting_end': now + voting_end,
+        })
+        db.candidates.insert_many([{'candidate_id': f'{election_id}C{c}', 'election_id': election_id}
+                                   for c in range(3)])
+        if i % 2 == 0:
+            db.votes.insert_one({'vote_id': f'{election_id}V', 'voter_id': VOTER['voter_id'],
+                                 'election_id': election_id, 'is_verified': True,
+                                 'vote_timestamp': now})
+
+
+def test_budget_counts_queries_and_documents(db, request_ctx):
+    db.votes.insert_many([{'vote_id': f'V{i}', 'voter_id': 'X', 'is_verified': True} for i in range(3)])
+
+    with track_queries() as tracker:
+        Vote.count({'voter_id': 'X'})
+        list(db.votes.find({'voter_id': 'X'}))
+    assert tracker.count == 2
+    assert tracker.commands == {'aggregate': 1, 'find': 1}
+    assert tracker.documents == 4
+
+    with pytest.raises(QueryBudgetExceeded):
+        with assert_query_budget(1):
+            list(db.votes.find({}))
+            list(db.votes.find({}))
+    with pytest.raises(QueryBudgetExceeded):
+        with assert_query_budget(1, max_documents=2):
+            list(db.votes.find({}))
+
+
+@pytest.mark.parametrize('elections', [2, 8])
+def test_active_elections_query_count_does_not_grow_with_elections(db, request_ctx, elections):
+    seed_elections(db, elections, 'active', timedelta(hours=-1), timedelta(hours=1))
+
+    # listing, voter's votes, candidate counts, vote counts, plus the debug walk
+    with assert_query_budget(5):
+        listed = dashboard.get_active_elections(VOTER)
+
+    assert len(listed) == elections
+    assert sum(e['has_voted'] for e in listed) == (elections + 1) // 2
+    assert all(e['candidates_count'] == 3 for e in listed)
+    assert sum(e['total_votes'] for e in listed) == (elections + 1) // 2
+
+
+@pytest.mark.parametrize('elections', [2, 8])
+def test_past_elections_query_count_does_not_grow_with_elections(db, request_ctx, elections):
+    seed_elections(db, elections, 'completed', timedelta(days=-2), timedelta(days=-1))
+
+    with assert_query_budget(2):
+        listed = dashboard.get_past_elections(VOTER)
+
+    assert len(listed) == elections
+    assert sum(e['voted'] for e in listed) == (elections + 1) // 2
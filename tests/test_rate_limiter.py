@@ -0,0 +1,63 @@
+# tests/test_rate_limiter.py
+"""Per-client token buckets and the rate-limited face quality probe"""
+from types import SimpleNamespace
+
+import pytest
+
+from smart_app.backend.services import rate_limiter as rate_limiter_module
+from smart_app.backend.services.rate_limiter import RateLimiter
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(rate_limiter_module, 'time', SimpleNamespace(monotonic=lambda: clock.now))
+    return clock
+
+
+def test_burst_then_refill(clock):
+    limiter = RateLimiter(rate=2, burst=3)
+
+    assert [limiter.allow('a') for _ in range(4)] == [True, True, True, False]
+    assert limiter.allow('b')
+    assert limiter.retry_after('a') == pytest.approx(0.5)
+    clock.now += 0.5
+    assert limiter.allow('a')
+    assert not limiter.allow('a')
+    clock.now += 10
+    assert [limiter.allow('a') for _ in range(4)] == [True, True, True, False]
+    assert limiter.get_statistics()['limited'] == 3
+
+
+def test_least_recently_used_keys_are_dropped(clock):
+    limiter = RateLimiter(rate=1, burst=1, max_keys=2)
+    limiter.allow('a')
+    limiter.allow('b')
+    limiter.allow('a')
+    limiter.allow('c')
+
+    assert limiter.get_statistics()['tracked_keys'] == 2
+    # 'b' was dropped, so its bucket starts full again
+    assert limiter.allow('b')
+    assert not limiter.allow('c')
+
+
+def test_quality_probe_is_rate_limited_per_client(app, clock, monkeypatch):
+    from smart_app.backend.routes import register
+    app.register_blueprint(register.register_bp, url_prefix='/api/register')
+    probes = []
+    monkeypatch.setattr(register, 'face_probe_limiter', RateLimiter(rate=1, burst=2))
+    monkeypatch.setattr(register.multi_face_service, 'probe_face_quality',
+                        lambda image_bytes, quality_threshold: probes.append(image_bytes) or {'face_detected': True})
+    client = app.test_client()
+
+    def probe(addr='10.0.0.1'):
+        return client.post('/api/register/face/quality-probe', data=b'jpeg', content_type='image/jpeg',
+                           environ_base={'REMOTE_ADDR': addr})
+
+    assert [probe().status_code for _ in range(2)] == [200, 200]
+    limited = probe()
+    assert limited.status_code == 429
+    assert limited.headers['Retry-After'] == '1'
+    assert probe('10.0.0.2').status_code == 200
+    assert len(probes) == 3
@@ -0,0 +1,111 @@
+# tests/test_read_preferences.py
+"""Read routing: model defaults, reads_from() blocks and reporting reads sent to secondaries"""
+import pytest
+from pymongo import MongoClient
+from pymongo.read_preferences import Nearest, Primary, Secondary, SecondaryPreferred
+
+from smart_app.backend.extensions import mongo
+from smart_app.backend.mongo_models import (
+    Election, Vote, reads_from, reporting_read_preference, reporting_reads,
+)
+from smart_app.backend.routes import dashboard
+from smart_app.backend.services.query_monitor import track_queries
+
+REPORTING = {'mode': 'secondaryPreferred', 'maxStalenessSeconds': 120}
+
+
+@pytest.fixture(params=['memory', 'pymongo'])
+def backend(request, app, monkeypatch):
+    """The memory engine, or a pymongo Database that is never connected"""
+    if request.param == 'pymongo':
+        client = MongoClient('mongodb://localhost:27017/?replicaSet=rs0', connect=False)
+        monkeypatch.setattr(mongo, 'db', client['smart_voting_test'])
+        yield request.param
+        client.close()
+    else:
+        yield request.param
+
+
+def test_read_preference_precedence(app, backend, monkeypatch):
+    assert Vote.get_collection().read_preference == Primary()
+
+    monkeypatch.setattr(Vote, 'READ_PREFERENCE', Nearest())
+    assert Vote.get_collection().read_preference == Nearest()
+    assert Election.get_collection().read_preference == Primary()
+
+    with reads_from(Secondary()):
+        assert Vote.get_collection().read_preference == Secondary()
+        assert Election.get_collection().read_preference == Secondary()
+        assert Vote.get_collection(read_preference=Primary()).read_preference == Primary()
+        with reads_from(SecondaryPreferred()):
+            assert Election.get_collection().read_preference == SecondaryPreferred()
+        assert Election.get_collection().read_preference == Secondary()
+    assert Vote.get_collection().read_preference == Nearest()
+    assert Election.get_collection().read_preference == Primary()
+
+
+def test_reporting_read_preference_follows_config(app):
+    with app.app_context():
+        assert reporting_read_preference() == SecondaryPreferred(max_staleness=120)
+        app.config.update(MONGO_REPORTING_READ_PREFERENCE='secondary', MONGO_REPORTING_MAX_STALENESS=90)
+        assert reporting_read_preference() == Secondary(max_staleness=90)
+        app.config['MONGO_REPORTING_READ_PREFERENCE'] = 'primary'
+        assert reporting_read_preference() == Primary()
+        app.config['MONGO_REPORTING_READ_PREFERENCE'] = 'unknown'
+        assert reporting_read_preference() == SecondaryPreferred(max_staleness=90)
+
+
+def test_reporting_reads_send_reads_to_secondaries(db, request_ctx, commands):
+    db.votes.insert_one({'vote_id': 'V1', 'voter_id': 'AB123456', 'election_id': 'E1', 'is_verified': True})
+    commands.clear()
+
+    analytics = dashboard.get_voter_analytics('AB123456')
+
+    assert analytics['votes_cast'] == 1
+    reads = commands.named('find', 'aggregate', 'distinct', 'count')
+    assert reads
+    assert all(command.get('$readPreference') == REPORTING for command in reads)
+
+
+def test_writes_in_a_reporting_block_go_to_the_primary(db, request_ctx, commands):
+    @reporting_reads
+    def record_and_count():
+        Vote.get_collection().insert_one({'vote_id': 'V1', 'voter_id': 'AB123456'})
+        return Vote.count({'voter_id': 'AB123456'})
+
+    assert record_and_count() == 1
+    [insert] = commands.named('insert')
+    [count] = commands.named('aggregate')
+    assert '$readPreference' not in insert
+    assert count['$readPreference'] == REPORTING
+    assert Vote.count({'voter_id': 'AB123456'}) == 1
+    assert '$readPreference' not in commands.named('aggregate')[-1]
+
+
+def test_secondary_reads_bypass_the_identity_map(db, request_ctx):
+    db.elections.insert_one({'election_id': 'E1', 'title': 'General'})
+
+    with track_queries() as primary:
+        Election.find_by_election_id('E1')
+        Election.find_by_election_id('E1')
+    with reads_from(SecondaryPreferred()), track_queries() as secondary:
+        Election.find_by_election_id('E1')
+        Election.find_by_election_id('E1')
+
+    # Reads that may be stale neither use nor fill the identity map
+    assert primary.count == 1
+    assert secondary.count == 2
+
+
+def test_reporting_reads_on_a_replica_set(server_db, commands, app, monkeypatch):
+    monkeypatch.setattr(mongo, 'db', server_db)
+    server_db.votes.insert_one({'vote_id': 'V1', 'voter_id': 'AB123456', 'is_verified': True})
+    commands.clear()
+
+    with app.app_context(), reads_from(reporting_read_preference()):
+        assert Vote.get_collection().read_preference == SecondaryPreferred(max_staleness=120)
+        Vote.count({'voter_id': 'AB123456'})
+
+    [count] = commands.named('aggregate')
+    if server_db.client.topology_description.topology_type_name == 'ReplicaSetWithPrimary':
+        assert count['$readPreference'] == REPORTING
@@ -0,0 +1,32 @@
+# tests/test_schema_migrations.py
+"""Schema bootstrap: face encodings that cannot be repacked do not block later migrations"""
+from smart_app.backend.create_mongo_collections import SCHEMA_VERSION, create_collections
+from smart_app.backend.mongo_models import (
+    ENCODING_FORMAT, ENCODING_FORMAT_INVALID, FaceEncoding, unpack_encoding,
+)
+
+
+def test_unrepacked_encodings_are_marked_invalid(app, db, monkeypatch):
+    db.face_encodings.insert_many([
+        {'encoding_id': 'FE1', 'voter_id': 'V1', 'encoding_data': [0.5, 0.25]},
+        {'encoding_id': 'FE2', 'voter_id': 'V2', 'encoding_data': ['face_recognition', 'dlib']},
+    ])
+    real_migrate = FaceEncoding.migrate_to_binary_format.__func__
+
+    def partial_migrate(cls, batch_size=500):
+        result = real_migrate(cls, batch_size)
+        # A row the run did not get to, e.g. it errored out part way
+        db.face_encodings.insert_one({'encoding_id': 'FE3', 'voter_id': 'V3', 'encoding_data': [1.0, 2.0]})
+        return result
+
+    monkeypatch.setattr(FaceEncoding, 'migrate_to_binary_format', classmethod(partial_migrate))
+
+    assert create_collections(app)['version'] == SCHEMA_VERSION
+
+    encodings = {enc['encoding_id']: enc for enc in db.face_encodings.find({})}
+    assert encodings['FE1']['encoding_format'] == ENCODING_FORMAT
+    assert list(unpack_encoding(encodings['FE1']['encoding_data'])) == [0.5, 0.25]
+    for encoding_id, legacy in (('FE2', ['face_recognition', 'dlib']), ('FE3', [1.0, 2.0])):
+        assert encodings[encoding_id]['encoding_format'] == ENCODING_FORMAT_INVALID
+        assert encodings[encoding_id]['encoding_data'] is None
+        assert encodings[encoding_id]['legacy_encoding_data'] == legacy
@@ -0,0 +1,175 @@
+# tests/test_voter_profiles.py
+"""Hot/cold voter split: profile fields live in voter_profiles, reads and writes are routed there"""
+import pytest
+
+from smart_app.backend.create_mongo_collections import create_collections
+from smart_app.backend.mongo_models import Voter, VoterProfile, VoterRecord
+
+# Fields read straight off the voters collection, bypassing VoterRecord:
+# lookup_voter_partitions (state, constituency), admin export_edge_bundle
+# (polling_station, constituency, is_active, face_verified), admin reports and
+# $lookup pipelines (state, constituency, date_of_birth, gender, created_at,
+# last_login, *_verified, registration_status), home stats, voters.py
+# (voted_elections) and face login (face_encoding_id).
+RAW_READ_FIELDS = {
+    "voter_id", "state", "constituency", "polling_station", "is_active",
+    "face_verified", "email_verified", "phone_verified", "id_verified",
+    "date_of_birth", "gender", "created_at", "last_login", "registration_status",
+    "voted_elections", "face_encoding_id",
+}
+
+
+def registration(i=1, **overrides):
+    data = {
+        'full_name': 'asha rao', 'father_name': 'ravi rao', 'gender': 'Female',
+        'date_of_birth': '1990-01-01', 'email': f'asha{i}@example.com', 'phone': f'90000000{i:02d}',
+        'address_line1': '1 Main Road', 'pincode': '500001', 'village_city': 'hyderabad',
+        'district': 'hyderabad', 'state': 'telangana', 'national_id_number': f'1234123412{i:02d}',
+        'password': 'secret123',
+    }
+    data.update(overrides)
+    return data
+
+
+def legacy_voter(db, voter_id='LEGACY01'):
+    """A voters document written before the split, profile fields inline"""
+    db.voters.insert_one({
+        'voter_id': voter_id, 'full_name': 'Old Voter', 'email': 'old@example.com', 'phone': '8000000000',
+        'state': 'Telangana', 'constituency': 'Hyderabad Constituency, Telangana', 'is_active': True,
+        'face_verified': True, 'face_encoding_id': 'FE1',
+        'father_name': 'Old Father', 'pincode': '500002', 'national_id_number': '999988887777',
+        'face_methods': ['dlib'],
+    })
+    return voter_id
+
+
+def created_voter_id(mongo_id):
+    return Voter.find_by_id(mongo_id)['voter_id']
+
+
+def test_raw_readers_only_use_hot_fields():
+    assert not RAW_READ_FIELDS & Voter.COLD_FIELDS
+
+
+def test_create_stores_profile_fields_in_voter_profiles(db, request_ctx):
+    voter_id = created_voter_id(Voter.create_voter(registration()))
+
+    hot = db.voters.find_one({'voter_id': voter_id})
+    profile = db.voter_profiles.find_one({'voter_id': voter_id})
+    assert not Voter.COLD_FIELDS & set(hot)
+    assert profile['pincode'] == '500001'
+    assert profile['national_id_number'] == '123412341201'
+    assert hot['face_encoding_id'] is None
+
+
+def test_find_loads_profile_on_first_cold_access(db, request_ctx):
+    voter_id = created_voter_id(Voter.create_voter(registration()))
+
+    voter = Voter.find_by_voter_id(voter_id)
+    assert isinstance(voter, VoterRecord)
+    assert not voter._profile_loaded
+    assert voter['email'] == 'asha1@example.com'
+    assert not voter._profile_loaded
+    assert voter['pincode'] == '500001'
+    assert voter.get('father_name') == 'Ravi Rao'
+    assert 'national_id_number' in voter
+    assert Voter.find_by_national_id('123412341201')['voter_id'] == voter_id
+    assert Voter.find_by_email('ASHA1@example.com')['pincode'] == '500001'
+
+
+def test_update_routes_cold_fields(db, request_ctx):
+    voter_id = created_voter_id(Voter.create_voter(registration()))
+
+    Voter.update_one({'voter_id': voter_id}, {'pincode': '500099', 'full_name': 'Asha R'})
+
+    assert 'pincode' not in db.voters.find_one({'voter_id': voter_id})
+    assert db.voter_profiles.find_one({'voter_id': voter_id})['pincode'] == '500099'
+    voter = Voter.find_by_voter_id(voter_id)
+    assert voter['pincode'] == '500099'
+    assert voter['full_name'] == 'Asha R'
+
+
+def test_projection_routing(db, request_ctx):
+    voter_id = created_voter_id(Voter.create_voter(registration()))
+
+    [with_cold] = Voter.find_all({'voter_id': voter_id}, projection={'full_name': 1, 'pincode': 1})
+    assert with_cold['pincode'] == '500001'
+    assert with_cold['full_name'] == 'Asha Rao'
+
+    [hot_only] = Voter.find_all({'voter_id': voter_id}, projection=Voter.AUTH_VIEW)
+    assert 'pincode' not in hot_only
+    assert not isinstance(hot_only, VoterRecord)
+
+    [excluded] = Voter.find_all({'voter_id': voter_id}, projection=Voter.PROFILE_VIEW)
+    assert excluded['pincode'] == '500001'
+    assert 'security_answer_hash' not in excluded
+    assert 'password_hash' not in excluded
+
+    assert [v['pincode'] for v in Voter.iter_all({'voter_id': voter_id}, projection={'pincode': 1})] == ['500001']
+
+
+def test_filters_on_cold_fields_are_rejected(request_ctx):
+    with pytest.raises(ValueError):
+        Voter.find_all({'pincode': '500001'})
+    with pytest.raises(ValueError):
+        Voter.count({'$or': [{'is_active': True}, {'national_id_number': '1'}]})
+    with pytest.raises(ValueError):
+        Voter.update_one({'father_name': 'x'}, {'is_active': False})
+
+
+def test_legacy_voter_before_migration(db, request_ctx):
+    voter_id = legacy_voter(db)
+
+    voter = Voter.find_by_voter_id(voter_id)
+    assert voter['pincode'] == '500002'
+    assert Voter.find_by_national_id('999988887777')['voter_id'] == voter_id
+    [projected] = Voter.find_all({'voter_id': voter_id}, projection={'pincode': 1})
+    assert projected['pincode'] == '500002'
+
+    # The first write creates the profile and drops the stale copy from voters
+    Voter.update_one({'voter_id': voter_id}, {'pincode': '500003'})
+    assert 'pincode' not in db.voters.find_one({'voter_id': voter_id})
+    assert Voter.find_by_voter_id(voter_id)['pincode'] == '500003'
+    assert Voter.find_by_voter_id(voter_id)['father_name'] == 'Old Father'
+
+
+def test_legacy_voter_after_migration(app, db):
+    voter_id = legacy_voter(db)
+    with app.app_context():
+        Voter.update_one({'voter_id': voter_id}, {'pincode': '500003'})
+
+    assert create_collections(app)['version'] >= 4
+
+    hot = db.voters.find_one({'voter_id': voter_id})
+    assert not Voter.COLD_FIELDS & set(hot)
+    assert hot['face_encoding_id'] == 'FE1'
+    profile = db.voter_profiles.find_one({'voter_id': voter_id})
+    # The value written after the split wins over the voters copy
+    assert profile['pincode'] == '500003'
+    assert profile['national_id_number'] == '999988887777'
+    assert 'face_encoding_id' not in profile
+
+    with app.test_request_context():
+        voter = Voter.find_by_voter_id(voter_id)
+        assert voter['pincode'] == '500003'
+        assert voter['face_methods'] == ['dlib']
+        [projected] = Voter.find_all({'voter_id': voter_id}, projection={'father_name': 1})
+        assert projected['father_name'] == 'Old Father'
+        assert Voter.find_by_national_id('999988887777')['voter_id'] == voter_id
+
+        Voter.update_one({'voter_id': voter_id}, {'$set': {'father_name': 'New Father'}})
+        assert Voter.find_by_voter_id(voter_id)['father_name'] == 'New Father'
+        assert VoterProfile.count({'voter_id': voter_id}) == 1
+
+
+def test_registrations_without_national_id_on_voters_do_not_collide(app, db):
+    legacy_voter(db)
+    db.voters.create_index([('national_id_number', 1)], unique=True)
+    create_collections(app)
+
+    with app.test_request_context():
+        Voter.create_voter(registration(1))
+        Voter.create_voter(registration(2))
+        with pytest.raises(ValueError):
+            Voter.create_voter(registration(3, national_id_number='999988887777'))
+    assert db.voters.count_documents({}) == 3